@@ -0,0 +1,7 @@
+"""
+Headless benchmark suite for the hot paths of pysics.
+
+Run it from the root of the repository:
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json
+"""
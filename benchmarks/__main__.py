@@ -0,0 +1,237 @@
+"""
+Run the benchmark suite and write the results as JSON.
+
+Every phase of a frame is timed on its own: building the spacial hash map
+(HashMap.generate_map), generating candidate pairs, the ball collisions
+(BallCollider.collide), the batched integrator (World.step), the per-body
+integrator (update_pos) and drawing, per body and with the batch Renderer
+(only if pygame is installed).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable
+import numpy as np
+from pysics import BallCollider, HashMap, World
+from . import scenarios
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def _time_phase(function: Callable[[], object], frames: int) -> dict[str, float]:
+    """Call function once per frame and summarize the times in seconds"""
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {
+        "mean": statistics.fmean(times),
+        "median": statistics.median(times),
+        "min": min(times),
+    }
+
+
+def _render_functions(world: World) -> dict[str, Callable[[], None]]:
+    """
+    Draw every body on an off-screen surface, one by one ("render") and with the batch
+    Renderer ("render_batch"). There is nothing to time if pygame is not installed.
+    """
+    # Keep the output clean, it might be the JSON results
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    try:
+        import pygame  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return {}
+    from pysics import CoordSys, Renderer  # pylint: disable=import-outside-toplevel
+
+    surface = pygame.Surface((1280, 720))
+    coord_sys = CoordSys(surface, world.coord_sys.x_tot, world.coord_sys.y_tot)
+    for body in world:
+        body.coord_sys = coord_sys
+
+    def render() -> None:
+        surface.fill("white")
+        for body in world:
+            body.draw(surface)  # type: ignore[attr-defined]
+
+    renderer = Renderer()
+
+    def render_batch() -> None:
+        surface.fill("white")
+        renderer.draw(surface, world)
+
+    return {"render": render, "render_batch": render_batch}
+
+
+def run_scenario(
+    name: str, world: World, frames: int, per_body_limit: int, render: bool
+) -> dict:
+    """Time every phase on one scene"""
+    grid_size = 4 * float(np.median(world.radius))
+    hasher = HashMap(grid_size, world)
+    only_balls = bool(world.is_ball.all())
+    collider = BallCollider(hasher)
+
+    # Warm up (and let the first collisions of packed scenes happen)
+    hasher.candidate_pairs(bounding_circle=True)
+    world.step()
+
+    phases = {
+        "generate_map": _time_phase(hasher.generate_map, frames),
+        "candidate_pairs": _time_phase(
+            lambda: hasher.candidate_pairs(bounding_circle=True), frames
+        ),
+    }
+    if only_balls:
+        phases["collide"] = _time_phase(collider.collide, frames)
+    phases["step"] = _time_phase(world.step, frames)
+
+    if len(world) <= per_body_limit:
+
+        def update_pos() -> None:
+            for body in world:
+                body.update_pos()
+
+        phases["update_pos"] = _time_phase(update_pos, frames)
+
+    if render:
+        for phase, render_function in _render_functions(world).items():
+            phases[phase] = _time_phase(render_function, frames)
+
+    # A full physics step: the collisions (including the broadphase) and the integration
+    physics_step = phases["step"]["median"] + phases.get(
+        "collide", phases["candidate_pairs"]
+    )["median"]
+    return {
+        "name": name,
+        "n_bodies": len(world),
+        "frames": frames,
+        "phases": phases,
+        "steps_per_sec": 1 / physics_step if physics_step > 0 else float("inf"),
+    }
+
+
+def import_time(repeat: int = 5) -> float:
+    """The median time it takes a new interpreter to run 'import pysics', in seconds"""
+    def time_python(code: str) -> float:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - start
+
+    baseline = statistics.median(time_python("pass") for _ in range(repeat))
+    return max(
+        statistics.median(time_python("import pysics") for _ in range(repeat)) - baseline, 0
+    )
+
+
+def run(sizes: list[int], frames: int, per_body_limit: int, render: bool) -> dict:
+    """Run every scenario and collect the results"""
+    results = []
+    for n in sizes:
+        results.append(
+            run_scenario("uniform", scenarios.uniform(n), frames, per_body_limit, render)
+        )
+    results.append(
+        run_scenario("billiard", scenarios.billiard(), frames, per_body_limit, render)
+    )
+    for n in sizes:
+        results.append(
+            run_scenario("dense_pile", scenarios.dense_pile(n), frames, per_body_limit, render)
+        )
+        results.append(
+            run_scenario("mixed", scenarios.mixed(n), frames, per_body_limit, render)
+        )
+
+    # Scaling curves: the median time of every phase over the number of bodies
+    scaling: dict[str, dict[str, list]] = {}
+    for result in results:
+        curve = scaling.setdefault(result["name"], {"n_bodies": [], "steps_per_sec": []})
+        curve["n_bodies"].append(result["n_bodies"])
+        curve["steps_per_sec"].append(result["steps_per_sec"])
+        for phase, times in result["phases"].items():
+            curve.setdefault(phase, []).append(times["median"])
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "import_pysics": import_time(),
+        },
+        "scenarios": results,
+        "scaling": scaling,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare the median phase times with a stored baseline. The report is printed to
+    stderr, so the JSON results on stdout stay parseable.
+
+    Returns:
+        list[str]: One line per phase which got slower by more than tolerance
+    """
+    old_results = {(r["name"], r["n_bodies"]): r for r in baseline["scenarios"]}
+    regressions = []
+    for result in results["scenarios"]:
+        old = old_results.get((result["name"], result["n_bodies"]))
+        if old is None:
+            continue
+        for phase, times in result["phases"].items():
+            if phase not in old["phases"]:
+                continue
+            ratio = times["median"] / old["phases"][phase]["median"]
+            line = f"{result['name']:>12} {result['n_bodies']:>7} {phase:>16}: {ratio:6.2f}x"
+            print(line, file=sys.stderr)
+            if ratio > 1 + tolerance:
+                regressions.append(line)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--frames", type=int, default=10, help="frames timed per phase")
+    parser.add_argument(
+        "--per-body-limit",
+        type=int,
+        default=20_000,
+        help="only time the per-body update_pos loop up to this many bodies",
+    )
+    parser.add_argument("--no-render", action="store_true", help="don't time drawing")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative slowdown that counts as a regression (default 0.1)",
+    )
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.frames, args.per_body_limit, not args.no_render)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} phase(s) got slower than the baseline", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Reproducible scenes for the benchmarks. Every scene is built from a fixed seed."""
+
+import math
+import numpy as np
+from pysics import Ball, HeadlessCoordSys, Polygon, World
+
+
+def uniform(n: int, seed: int = 0, area_per_ball: float = 900) -> World:
+    """
+    n balls at uniformly random positions with random velocities. The size of the world
+    grows with n, so the density (and the number of contacts per ball) stays the same.
+    """
+    rng = np.random.default_rng(seed)
+    height = math.sqrt(n * area_per_ball * 9 / 16)
+    coord_sys = HeadlessCoordSys(int(height * 16 / 9), int(height))
+    world = World(coord_sys, capacity=n)
+    for pos, vel, r in zip(
+        rng.uniform((0, 0), (coord_sys.x_tot, coord_sys.y_tot), (n, 2)).tolist(),
+        rng.normal(0, 2, (n, 2)).tolist(),
+        rng.uniform(2, 6, n).tolist(),
+    ):
+        Ball(coord_sys, r=r, dt=60, pos_vec=pos, vel_vec=vel, world=world)
+    return world
+
+
+def billiard(rows: int = 3) -> World:
+    """The triangular rack and the cue ball of billiard.py"""
+    coord_sys = HeadlessCoordSys()
+    world = World(coord_sys)
+    ball_radius = 10
+    spacing = 1.5
+    start_x, start_y = 800, coord_sys.y_tot // 2
+    for row in range(rows):
+        for col in range(row + 1):
+            y = start_y + (col - row / 2) * 2 * ball_radius * spacing
+            x = start_x + row * math.sqrt(3) * ball_radius * spacing
+            Ball(coord_sys, r=ball_radius, dt=120, pos_vec=(x, y), col=(0, 255, 0), world=world)
+    Ball(
+        coord_sys,
+        r=ball_radius,
+        dt=120,
+        pos_vec=(100, 360),
+        vel_vec=(10, 0),
+        col=(255, 0, 0),
+        world=world,
+    )
+    return world
+
+
+def dense_pile(n: int, seed: int = 0) -> World:
+    """n balls packed into a square, overlapping their neighbours"""
+    rng = np.random.default_rng(seed)
+    r = 5.0
+    side = math.ceil(math.sqrt(n))
+    coord_sys = HeadlessCoordSys(int(side * 2 * r * 1.5), int(side * 2 * r * 1.5))
+    world = World(coord_sys, capacity=n)
+    offset = side * r * 0.25
+    for k in range(n):
+        x = offset + (k % side) * 1.8 * r + r
+        y = offset + (k // side) * 1.8 * r + r
+        Ball(
+            coord_sys,
+            r=r,
+            dt=60,
+            pos_vec=(x, y),
+            vel_vec=tuple(rng.normal(0, 0.5, 2).tolist()),
+            world=world,
+        )
+    return world
+
+
+def mixed(n: int, seed: int = 0, polygon_share: float = 0.02) -> World:
+    """Like uniform(), but a share of the bodies are large polygons"""
+    rng = np.random.default_rng(seed)
+    world = uniform(n, seed)
+    coord_sys = world.coord_sys
+    for _ in range(max(1, int(n * polygon_share))):
+        size = rng.uniform(20, 80)
+        Polygon(
+            coord_sys,
+            60,
+            ((-size, -size), (size, -size), (size, size), (-size, size)),
+            pos_vec=tuple(rng.uniform((0, 0), (coord_sys.x_tot, coord_sys.y_tot)).tolist()),
+            world=world,
+        )
+    return world
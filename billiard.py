@@ -5,7 +5,7 @@ Billiard simulation with pysics
 
 import math
 import pygame
-from pysics import _Body, Ball, CoordSys, HashMap, BallCollider
+from pysics import Ball, CoordSys, HashMap, BallCollider, Renderer, Simulation, World
 
 # initialise pygame
 pygame.init()
@@ -21,7 +21,8 @@ FRAME_RATE: int = 120
 coord_system: CoordSys = CoordSys(screen)
 
 # define balls
-balls: list[_Body] = []
+# balls that rest for half a second fall asleep and are skipped until they are hit
+world: World = World(coord_system, sleep_threshold=0.01, sleep_steps=FRAME_RATE // 2)
 
 # Calculate positions for a triangular billiard setup
 rows: int = 3
@@ -34,36 +35,41 @@ for row in range(rows):
     for col in range(row + 1):
         y: float = start_y + (col - row / 2) * 2 * ball_radius * spacing
         x: float = start_x + row * math.sqrt(3) * ball_radius * spacing
-        balls.append(
-            Ball(
-                coord_system,
-                r=ball_radius,
-                dt=FRAME_RATE,
-                pos_vec=(x, y),
-                vel_vec=(0, 0),
-                col=(0, 255, 0),
-                m=1,
-            )
+        Ball(
+            coord_system,
+            r=ball_radius,
+            dt=FRAME_RATE,
+            pos_vec=(x, y),
+            vel_vec=(0, 0),
+            col=(0, 255, 0),
+            m=1,
+            world=world,
         )
 
-balls.append(
-    Ball(
-        coord_system,
-        r=ball_radius,
-        dt=FRAME_RATE,
-        pos_vec=(100, 360),
-        vel_vec=(10, 0),
-        col=(255, 0, 0),
-        m=1,
-    )
+Ball(
+    coord_system,
+    r=ball_radius,
+    dt=FRAME_RATE,
+    pos_vec=(100, 360),
+    vel_vec=(10, 0),
+    col=(255, 0, 0),
+    m=1,
+    # the cue ball is fast, so its path is swept to not tunnel through the other balls
+    ccd=True,
+    world=world,
 )
 
 # the hasher (and therefore the collider) need to be initialised after
-# the list of bodies is defined
-hasher: HashMap = HashMap(50, balls)
+# the world is defined
+hasher: HashMap = HashMap(50, world)
 # since we are using a BallCollider object here, we must ensure, that
-# all bodies in the list passed into the hasher are Ball objects
-ball_collider: BallCollider = BallCollider(hasher)
+# all bodies in the list passed into the hasher are Ball objects.
+# The contacts are resolved one batch after the other, so the impulse of the cue ball
+# travels through the whole rack during the break
+ball_collider: BallCollider = BallCollider(hasher, sequential=True, iterations=4)
+# the physics runs with a fixed time step, independent of the frame rate of the display
+simulation: Simulation = Simulation(world, ball_collider, rate=FRAME_RATE)
+renderer: Renderer = Renderer()
 
 while RUNNING:
     for event in pygame.event.get():
@@ -73,36 +79,35 @@ while RUNNING:
     screen.fill("white")
     coord_system.paint_borders()
 
-    # Check for collisions
-    ball_collider.collide()
-
-    for ball in balls:
-        if isinstance(ball, Ball):
-            ball.update_pos()
-            ball.draw(screen)
-
-            # draw the velocity vector to visualize the movement of the balls
-            pygame.draw.line(
-                screen,
-                (0, 0, 0),
-                coord_system.coord(ball.pos.components[0], ball.pos.components[1]),
-                coord_system.coord(
-                    ball.pos.components[0] + ball.vel.components[0],
-                    ball.pos.components[1] + ball.vel.components[1],
-                ),
-            )
-            pygame.draw.circle(
-                screen,
-                (0, 0, 0),
-                coord_system.coord(
-                    ball.pos.components[0] + ball.vel.components[0],
-                    ball.pos.components[1] + ball.vel.components[1],
-                ),
-                1,
-            )
+    # Run the collisions and physics steps for the time since the last frame
+    simulation.advance(clock.tick(FRAME_RATE) / 1000)
+
+    # Draw the balls between the last two steps, so the movement stays smooth
+    with simulation.interpolated():
+        renderer.draw(screen, world)
+
+        for ball in world:
+            if isinstance(ball, Ball):
+                # draw the velocity vector to visualize the movement of the balls
+                pygame.draw.line(
+                    screen,
+                    (0, 0, 0),
+                    coord_system.coord(ball.pos.components[0], ball.pos.components[1]),
+                    coord_system.coord(
+                        ball.pos.components[0] + ball.vel.components[0],
+                        ball.pos.components[1] + ball.vel.components[1],
+                    ),
+                )
+                pygame.draw.circle(
+                    screen,
+                    (0, 0, 0),
+                    coord_system.coord(
+                        ball.pos.components[0] + ball.vel.components[0],
+                        ball.pos.components[1] + ball.vel.components[1],
+                    ),
+                    1,
+                )
 
     pygame.display.flip()
 
-    clock.tick(FRAME_RATE)
-
 pygame.quit()
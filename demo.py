@@ -5,7 +5,17 @@ the pysics module.
 """
 
 import pygame
-from pysics import _Body, Ball, CoordSys, HashMap, BallCollider
+from pysics import (
+    Ball,
+    CoordSys,
+    HashMap,
+    BallCollider,
+    World,
+    Profiler,
+    Renderer,
+    Simulation,
+    profiling,
+)
 
 # Import necessary modules
 
@@ -24,17 +34,32 @@ FRAME_RATE: int = 60
 # Coordinate system needs to be initialized before bodies are defined
 coord_system: CoordSys = CoordSys(screen)
 
+# The world stores the state of every body in contiguous arrays
+world: World = World(coord_system)
+
 # Define bodies
-# Either, define them in the list directly, or append them later
-balls: list[_Body] = []
+# Either, create them with world=world, or add them later with world.add()
 
 # The hasher (and therefore the collider) need to be initialized after
-# the list of bodies is defined
-hasher: HashMap = HashMap(50, balls)
+# the world is defined
+hasher: HashMap = HashMap(50, world)
 # Since we are using a BallCollider object here, we must ensure that
 # all bodies in the list passed into the hasher are Ball objects
 ball_collider: BallCollider = BallCollider(hasher)
 
+# The simulation runs the collisions and the physics with a fixed time step, independent of
+# the frame rate of the display. More substeps are more accurate, but cost more.
+simulation: Simulation = Simulation(world, ball_collider, rate=FRAME_RATE, substeps=1)
+
+# The renderer draws all bodies at once, using cached sprites for the balls
+renderer: Renderer = Renderer()
+
+# Optionally measure the time spent in every phase of a frame and
+# print a summary every two seconds
+PROFILE: bool = False
+if PROFILE:
+    profiling.enable(Profiler(dump_interval=2 * FRAME_RATE))
+
 # Main loop
 while RUNNING:
     for event in pygame.event.get():
@@ -46,27 +71,30 @@ while RUNNING:
     # Paint the borders of the coordinate system
     coord_system.paint_borders()
 
-    # Check for collisions
-    ball_collider.collide()
+    # Check for collisions and update the position of every body at once, running as
+    # many fixed steps as fit into the time since the last frame
+    simulation.advance(clock.tick(FRAME_RATE) / 1000)
 
-    for ball in balls:
-        # All bodies are Ball objects for sure, this check is simply performed in order for
-        # pylint and Mypy not to scream at me
-        if isinstance(ball, Ball):
-            # Update the position of the ball
-            ball.update_pos()
-            # Draw the ball on the screen
-            ball.draw(screen)
+    # Draw between the last two steps, so the movement stays smooth
+    with profiling.phase("draw"), simulation.interpolated():
+        # Draw every body on the screen
+        renderer.draw(screen, world)
 
-            # Any per-ball calculations and drawing can be done here
+        for ball in world:
+            # All bodies are Ball objects for sure, this check is simply performed in order
+            # for pylint and Mypy not to scream at me
+            if isinstance(ball, Ball):
+                # Any per-ball calculations and drawing can be done here
+                pass
 
     # Perform any additional calculations or drawing here
 
     # Update the display
     pygame.display.flip()
 
-    # Cap the frame rate
-    clock.tick(FRAME_RATE)
+    profiler = profiling.active()
+    if profiler is not None:
+        profiler.end_frame()
 
 # Quit pygame
 pygame.quit()
@@ -1,10 +1,78 @@
 """
 pysics: a physics engine for the python library 'pygame'
+
+The physics core runs without pygame. Submodules are only imported when one of their
+names is used for the first time, so 'import pysics' itself is fast. pygame is only
+imported by pysics.render, when something is drawn.
 """
-from .body import _Body, Ball, Polygon
-from .coordinate_system import CoordSys
-from .math_core import Vec2D
-from .temp_ball_collision import BallCollider
-from .hash_map import HashMap
 
-__all__ = ["_Body", "Ball", "Polygon", "CoordSys", "Vec2D", "BallCollider", "HashMap"]
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .body import _Body, Ball, Polygon
+    from .coordinate_system import CoordSys, HeadlessCoordSys
+    from .math_core import Vec2D, Vec2DArray
+    from .temp_ball_collision import BallCollider
+    from .hash_map import HashMap
+    from .world import World
+    from .sweep_and_prune import SweepAndPrune
+    from .aabb_tree import AABBTree
+    from .profiling import Profiler
+    from .render import Renderer
+    from .simulation import Simulation
+    from .parallel import ParallelStepper
+    from .ensemble import Ensemble
+
+# Name -> submodule that defines it
+_LAZY_NAMES = {
+    "_Body": ".body",
+    "Ball": ".body",
+    "Polygon": ".body",
+    "CoordSys": ".coordinate_system",
+    "HeadlessCoordSys": ".coordinate_system",
+    "Vec2D": ".math_core",
+    "Vec2DArray": ".math_core",
+    "BallCollider": ".temp_ball_collision",
+    "HashMap": ".hash_map",
+    "World": ".world",
+    "SweepAndPrune": ".sweep_and_prune",
+    "AABBTree": ".aabb_tree",
+    "Profiler": ".profiling",
+    "Renderer": ".render",
+    "Simulation": ".simulation",
+    "ParallelStepper": ".parallel",
+    "Ensemble": ".ensemble",
+}
+
+__all__ = [
+    "_Body",
+    "Ball",
+    "Polygon",
+    "CoordSys",
+    "HeadlessCoordSys",
+    "Vec2D",
+    "Vec2DArray",
+    "BallCollider",
+    "HashMap",
+    "World",
+    "SweepAndPrune",
+    "AABBTree",
+    "Profiler",
+    "Renderer",
+    "Simulation",
+    "ParallelStepper",
+    "Ensemble",
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_NAMES:
+        value = getattr(import_module(_LAZY_NAMES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,527 @@
+"""
+Dynamic AABB tree (bounding volume hierarchy) broadphase. Every body is a leaf with a
+fattened axis aligned bounding box (AABB), so large bodies (e.g. polygons) only take up a
+single leaf instead of many grid cells. Based on the dynamic tree of Box2D.
+"""
+
+from typing import Iterator, Optional, Sequence
+import numpy as np
+from . import profiling
+from .body import _Body
+from .hash_map import bounding_circle_filter
+from .world import World, body_aabbs, body_arrays
+
+# The tree manages the fields of its nodes, and reads the arrays of the World
+# pylint: disable=protected-access
+
+
+def _overlapping(aabb1: np.ndarray, aabb2: np.ndarray) -> np.ndarray:
+    """Whether the rows of two (N, 4) arrays of AABBs overlap"""
+    return (
+        (aabb1[:, 0] <= aabb2[:, 2])
+        & (aabb2[:, 0] <= aabb1[:, 2])
+        & (aabb1[:, 1] <= aabb2[:, 3])
+        & (aabb2[:, 1] <= aabb1[:, 3])
+    )
+
+
+def _perimeter(aabb: list[float]) -> float:
+    return 2 * (aabb[2] - aabb[0] + aabb[3] - aabb[1])
+
+
+def _union(aabb1: list[float], aabb2: list[float]) -> list[float]:
+    return [
+        min(aabb1[0], aabb2[0]),
+        min(aabb1[1], aabb2[1]),
+        max(aabb1[2], aabb2[2]),
+        max(aabb1[3], aabb2[3]),
+    ]
+
+
+def _morton_codes(aabb: np.ndarray) -> np.ndarray:
+    """The position of the center of every AABB along a Z-order curve"""
+    center = (aabb[:, :2] + aabb[:, 2:]) / 2
+    low, high = center.min(axis=0), center.max(axis=0)
+    scaled = (center - low) / np.where(high > low, high - low, 1) * 0xFFFF
+    cells = scaled.astype(np.uint64)
+
+    # Spread the 16 bits of each coordinate out, so they can be interleaved
+    for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+        cells = (cells | (cells << np.uint64(shift))) & np.uint64(mask)
+    return cells[:, 0] | (cells[:, 1] << np.uint64(1))
+
+
+class AABBTree:
+    """
+    A dynamic bounding volume tree. Leaves store fattened AABBs, so bodies which move
+    a little don't change the tree. Only the bodies that leave their fattened AABB are
+    removed and inserted again, refitting and rebalancing the nodes above them.
+
+    Candidate pairs are found by querying the tree against itself, one tree level at a
+    time with array operations.
+
+    Methods:
+        update: Re-insert the bodies that left their fattened AABB
+        candidate_pairs: The indices of every pair of bodies whose bounding boxes overlap
+        pairs: Iterate over every pair of bodies whose bounding boxes overlap
+        tree_pairs: The indices of every pair of overlapping bodies of two trees
+        query: The indices of the bodies that overlap a rectangle
+    """
+
+    def __init__(self, bodies: Sequence[_Body] | World, margin: float = 5.0):
+        """
+        Args:
+            bodies (Sequence[Body]): The list of every body (or a World)
+            margin (float): How far the fattened AABBs reach past the bodies
+                on every side
+        """
+        self.bodies = bodies
+        self.margin = margin
+
+        capacity = 16
+        # Node storage: min x, min y, max x, max y of the (fattened) AABB and the tree links.
+        # Leaves have no children (-1) and store the index of their body.
+        self._aabb = np.zeros((capacity, 4))
+        self._parent = np.full(capacity, -1, dtype=np.int64)
+        self._child1 = np.full(capacity, -1, dtype=np.int64)
+        self._child2 = np.full(capacity, -1, dtype=np.int64)
+        self._height = np.zeros(capacity, dtype=np.int64)
+        self._body = np.full(capacity, -1, dtype=np.int64)
+        self._free: list[int] = list(range(capacity - 1, -1, -1))
+        self._root = -1
+        self._leaves = np.zeros(0, dtype=np.int64)  # the leaf of every body
+
+        self._world_version = -1
+        self._bodies_version = -1
+
+    def __len__(self) -> int:
+        return len(self._leaves)
+
+    @property
+    def height(self) -> int:
+        """The height of the tree (0 for a single leaf)"""
+        return int(self._height[self._root]) if self._root != -1 else 0
+
+    def _allocate(self) -> int:
+        if not self._free:
+            capacity = len(self._aabb)
+            self._aabb = np.vstack((self._aabb, np.zeros_like(self._aabb)))
+            for name in ("_parent", "_child1", "_child2", "_body"):
+                setattr(self, name, np.concatenate((getattr(self, name), np.full(capacity, -1))))
+            self._height = np.concatenate((self._height, np.zeros(capacity, dtype=np.int64)))
+            self._free = list(range(2 * capacity - 1, capacity - 1, -1))
+        node = self._free.pop()
+        self._parent[node] = -1
+        self._child1[node] = -1
+        self._child2[node] = -1
+        self._height[node] = 0
+        self._body[node] = -1
+        return node
+
+    def _refit(self, node: int) -> None:
+        """Recalculate the height and AABB of an internal node from its children"""
+        child1, child2 = int(self._child1[node]), int(self._child2[node])
+        self._height[node] = 1 + max(self._height[child1], self._height[child2])
+        self._aabb[node] = _union(self._aabb[child1].tolist(), self._aabb[child2].tolist())
+
+    def _insert_leaf(self, leaf: int) -> None:
+        if self._root == -1:
+            self._root = leaf
+            self._parent[leaf] = -1
+            return
+
+        # Find the best sibling, by descending into the child that grows the least
+        box = self._aabb[leaf].tolist()
+        index = self._root
+        while self._child1[index] != -1:
+            child1, child2 = int(self._child1[index]), int(self._child2[index])
+            area = _perimeter(self._aabb[index].tolist())
+            combined_area = _perimeter(_union(self._aabb[index].tolist(), box))
+
+            # Cost of creating a new parent for this node and the new leaf
+            cost = 2 * combined_area
+            # Minimum cost of pushing the leaf further down the tree
+            inheritance_cost = 2 * (combined_area - area)
+
+            child_costs = []
+            for child in (child1, child2):
+                child_box = self._aabb[child].tolist()
+                child_cost = _perimeter(_union(box, child_box)) + inheritance_cost
+                if self._child1[child] != -1:
+                    child_cost -= _perimeter(child_box)
+                child_costs.append(child_cost)
+
+            if cost < child_costs[0] and cost < child_costs[1]:
+                break
+            index = child1 if child_costs[0] < child_costs[1] else child2
+
+        # Create a new parent for the sibling and the leaf
+        sibling = index
+        old_parent = int(self._parent[sibling])
+        new_parent = self._allocate()
+        self._parent[new_parent] = old_parent
+        self._child1[new_parent] = sibling
+        self._child2[new_parent] = leaf
+        self._parent[sibling] = new_parent
+        self._parent[leaf] = new_parent
+        if old_parent == -1:
+            self._root = new_parent
+        elif self._child1[old_parent] == sibling:
+            self._child1[old_parent] = new_parent
+        else:
+            self._child2[old_parent] = new_parent
+
+        self._refit_ancestors(new_parent)
+
+    def _remove_leaf(self, leaf: int) -> None:
+        if leaf == self._root:
+            self._root = -1
+            return
+
+        parent = int(self._parent[leaf])
+        grand_parent = int(self._parent[parent])
+        sibling = int(
+            self._child2[parent] if self._child1[parent] == leaf else self._child1[parent]
+        )
+
+        # Replace the parent with the sibling
+        self._parent[sibling] = grand_parent
+        self._free.append(parent)
+        if grand_parent == -1:
+            self._root = sibling
+            return
+        if self._child1[grand_parent] == parent:
+            self._child1[grand_parent] = sibling
+        else:
+            self._child2[grand_parent] = sibling
+        self._refit_ancestors(grand_parent)
+
+    def _refit_ancestors(self, index: int) -> None:
+        """Balance and refit every node from index up to the root"""
+        while index != -1:
+            index = self._balance(index)
+            self._refit(index)
+            index = int(self._parent[index])
+
+    def _balance(self, a: int) -> int:
+        """
+        Rotate node a with one of its children if their heights differ by more than one
+
+        Returns:
+            int: The node that is now at the place of a
+        """
+        if self._child1[a] == -1 or self._height[a] < 2:
+            return a
+
+        b, c = int(self._child1[a]), int(self._child2[a])
+        balance = self._height[c] - self._height[b]
+        if balance > 1:
+            return self._rotate(a, c, is_child1=False)
+        if balance < -1:
+            return self._rotate(a, b, is_child1=True)
+        return a
+
+    def _rotate(self, a: int, up: int, is_child1: bool) -> int:
+        """Move the child up (of a) one level up, making a its child"""
+        f, g = int(self._child1[up]), int(self._child2[up])
+
+        # Swap a and up
+        self._child1[up] = a
+        self._parent[up] = self._parent[a]
+        self._parent[a] = up
+        parent = int(self._parent[up])
+        if parent != -1:
+            if self._child1[parent] == a:
+                self._child1[parent] = up
+            else:
+                self._child2[parent] = up
+        else:
+            self._root = up
+
+        # Keep the higher grandchild below up, give the other one to a
+        if self._height[f] > self._height[g]:
+            keep, give = f, g
+        else:
+            keep, give = g, f
+        self._child2[up] = keep
+        if is_child1:
+            self._child1[a] = give
+        else:
+            self._child2[a] = give
+        self._parent[give] = a
+        self._refit(a)
+        self._refit(up)
+        return up
+
+    def _tight_aabbs(self, bodies: Sequence[_Body] | World) -> np.ndarray:
+        return np.nan_to_num(body_aabbs(bodies), nan=0.0)
+
+    def _rebuild(self, tight: np.ndarray) -> None:
+        """
+        Build the tree of every body from scratch with array operations: the leaves are
+        sorted along a Z-order curve (Morton code) and the sorted range is split in halves
+        level by level, which gives a balanced tree.
+        """
+        n = len(tight)
+        capacity = max(16, 2 * n)
+        self._aabb = np.zeros((capacity, 4))
+        self._parent = np.full(capacity, -1, dtype=np.int64)
+        self._child1 = np.full(capacity, -1, dtype=np.int64)
+        self._child2 = np.full(capacity, -1, dtype=np.int64)
+        self._height = np.zeros(capacity, dtype=np.int64)
+        self._body = np.full(capacity, -1, dtype=np.int64)
+        self._free = list(range(capacity - 1, max(2 * n - 1, 0) - 1, -1))
+        self._leaves = np.arange(n)
+        self._aabb[:n] = tight + (-self.margin, -self.margin, self.margin, self.margin)
+        self._body[:n] = self._leaves
+        self._root = 0 if n else -1
+        if n < 2:
+            return
+
+        order = self._leaves[np.argsort(_morton_codes(tight), kind="stable")]
+
+        # Top down: split the range of leaves of every internal node in halves
+        self._root = n
+        next_node = n + 1
+        nodes, low, high = np.array([n]), np.array([0]), np.array([n])
+        levels: list[np.ndarray] = []
+        while len(nodes):
+            levels.append(nodes)
+            mid = (low + high) // 2
+            child_low = np.concatenate((low, mid))
+            child_high = np.concatenate((mid, high))
+            is_leaf = child_high - child_low == 1
+
+            children = order[child_low]
+            children[~is_leaf] = np.arange(next_node, next_node + np.count_nonzero(~is_leaf))
+            next_node += int(np.count_nonzero(~is_leaf))
+
+            self._child1[nodes] = children[: len(nodes)]
+            self._child2[nodes] = children[len(nodes) :]
+            self._parent[children] = np.concatenate((nodes, nodes))
+            nodes, low, high = children[~is_leaf], child_low[~is_leaf], child_high[~is_leaf]
+
+        # Bottom up: fit the AABBs and heights of the internal nodes
+        for nodes in reversed(levels):
+            child1, child2 = self._child1[nodes], self._child2[nodes]
+            self._height[nodes] = 1 + np.maximum(self._height[child1], self._height[child2])
+            self._aabb[nodes, :2] = np.minimum(self._aabb[child1, :2], self._aabb[child2, :2])
+            self._aabb[nodes, 2:] = np.maximum(self._aabb[child1, 2:], self._aabb[child2, 2:])
+
+    def update(self) -> np.ndarray:
+        """
+        Re-insert every body that left its fattened AABB. If bodies were added to
+        or removed from HashMap.bodies, the tree is built again.
+
+        Returns:
+            np.ndarray: The tight (not fattened) AABB of every body
+        """
+        bodies = self.bodies
+        if not len(bodies):
+            self._rebuild(np.zeros((0, 4)))
+            return np.zeros((0, 4))
+        tight = self._tight_aabbs(bodies)
+
+        if isinstance(bodies, World):
+            changed = bodies._version != self._world_version
+            self._world_version = bodies._version
+        else:
+            changed = len(bodies) != self._bodies_version
+        self._bodies_version = len(bodies)
+        if changed or len(self._leaves) != len(tight):
+            self._rebuild(tight)
+            return tight
+
+        fat = self._aabb[self._leaves]
+        escaped = np.flatnonzero(
+            (tight[:, :2] < fat[:, :2]).any(axis=1) | (tight[:, 2:] > fat[:, 2:]).any(axis=1)
+        )
+        margin = np.array((-self.margin, -self.margin, self.margin, self.margin))
+        for i in escaped.tolist():
+            leaf = int(self._leaves[i])
+            self._remove_leaf(leaf)
+            self._aabb[leaf] = tight[i] + margin
+            self._insert_leaf(leaf)
+        return tight
+
+    def _query(self, other: "AABBTree") -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find every pair of overlapping leaves of self and other, by descending both trees
+        at once. If other is self, every pair is only found once.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The leaves of self and other of every pair
+        """
+        if self._root == -1 or other._root == -1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        same_tree = other is self
+        node1 = np.array([self._root])
+        node2 = np.array([other._root])
+        found1: list[np.ndarray] = []
+        found2: list[np.ndarray] = []
+        while len(node1):
+            # A node paired with itself is a query of the subtree against itself
+            itself = (node1 == node2) if same_tree else np.zeros(len(node1), dtype=bool)
+            keep = itself | _overlapping(self._aabb[node1], other._aabb[node2])
+            node1, node2, itself = node1[keep], node2[keep], itself[keep]
+
+            leaf1 = self._child1[node1] == -1
+            leaf2 = other._child1[node2] == -1
+            found = leaf1 & leaf2 & ~itself
+            found1.append(node1[found])
+            found2.append(node2[found])
+
+            # Pairs of children of a node that is paired with itself
+            inner = itself & ~leaf1
+            children1, children2 = self._child1[node1[inner]], self._child2[node1[inner]]
+
+            # Otherwise descend into the higher of both nodes
+            split1 = ~itself & ~leaf1 & (leaf2 | (self._height[node1] >= other._height[node2]))
+            split2 = ~itself & ~found & ~split1
+
+            node1, node2 = (
+                np.concatenate(
+                    (
+                        children1,
+                        children2,
+                        children1,
+                        self._child1[node1[split1]],
+                        self._child2[node1[split1]],
+                        node1[split2],
+                        node1[split2],
+                    )
+                ),
+                np.concatenate(
+                    (
+                        children1,
+                        children2,
+                        children2,
+                        node2[split1],
+                        node2[split1],
+                        other._child1[node2[split2]],
+                        other._child2[node2[split2]],
+                    )
+                ),
+            )
+        return np.concatenate(found1), np.concatenate(found2)
+
+    def tree_pairs(self, other: "AABBTree") -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of a body of this tree and a body of another tree whose
+        bounding boxes overlap, e.g. to test a tree of static bodies against
+        a tree of moving ones.
+
+        Args:
+            other (AABBTree): The other tree
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The indices i (into self.bodies) and
+                j (into other.bodies) of the bodies of every pair, sorted by i and then j
+        """
+        tight1, tight2 = self.update(), other.update()
+        leaf1, leaf2 = self._query(other)
+        i, j = self._body[leaf1], other._body[leaf2]
+        overlapping = _overlapping(tight1[i], tight2[j])
+        i, j = i[overlapping], j[overlapping]
+
+        order = np.lexsort((j, i))
+        return i[order], j[order]
+
+    @profiling.timed("pairs")
+    def candidate_pairs(
+        self, bodies: Optional[Sequence[_Body] | World] = None, bounding_circle: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of bodies whose bounding boxes overlap.
+        These are the candidates that the narrow phase has to check for collisions.
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            bounding_circle (bool): Only return pairs whose bounding circles
+                (Body.bounding_box_radius) overlap
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The indices (into bodies) i and j of the bodies
+                of every pair, with i < j, sorted by i and then j
+        """
+        if bodies and bodies is not self.bodies:
+            return AABBTree(bodies, self.margin).candidate_pairs(
+                bounding_circle=bounding_circle
+            )
+
+        tight = self.update()
+        leaf1, leaf2 = self._query(self)
+        i, j = self._body[leaf1], self._body[leaf2]
+        overlapping = _overlapping(tight[i], tight[j])
+        i, j = i[overlapping], j[overlapping]
+
+        n = len(tight)
+        keys = np.sort(np.minimum(i, j) * n + np.maximum(i, j))
+        i, j = keys // n, keys % n
+
+        if bounding_circle:
+            pos, radius = body_arrays(self.bodies)
+            i, j = bounding_circle_filter(pos, radius, i, j)
+        profiling.count("candidate_pairs", len(i))
+        return i, j
+
+    def pairs(
+        self, bodies: Optional[Sequence[_Body] | World] = None, bounding_circle: bool = False
+    ) -> Iterator[tuple[_Body, _Body]]:
+        """
+        Iterate over every pair of bodies whose bounding boxes overlap, without duplicates
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            bounding_circle (bool): Only yield pairs whose bounding circles overlap
+
+        Yields:
+            tuple[_Body, _Body]: The two bodies of a pair
+        """
+        if not bodies:
+            bodies = self.bodies
+        i, j = self.candidate_pairs(bodies, bounding_circle)
+        for index1, index2 in zip(i.tolist(), j.tolist()):
+            yield bodies[index1], bodies[index2]
+
+    def query(
+        self,
+        low: Sequence[float],
+        high: Sequence[float],
+        bodies: Optional[Sequence[_Body] | World] = None,
+    ) -> np.ndarray:
+        """
+        Every body whose bounding box overlaps a rectangle, e.g. the part of the world that
+        is visible on the screen. Only the subtrees that overlap the rectangle are visited.
+
+        Args:
+            low (Sequence[float]): The lowest x and y coordinates of the rectangle
+            high (Sequence[float]): The highest x and y coordinates of the rectangle
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+
+        Returns:
+            np.ndarray: The sorted indices (into bodies) of the bodies in the rectangle
+        """
+        if bodies and bodies is not self.bodies:
+            return AABBTree(bodies, self.margin).query(low, high)
+
+        tight = self.update()
+        if self._root == -1:
+            return np.zeros(0, dtype=np.int64)
+        box = np.array([[*low, *high]], dtype=float)
+
+        nodes = np.array([self._root])
+        found: list[np.ndarray] = []
+        while len(nodes):
+            nodes = nodes[_overlapping(self._aabb[nodes], box)]
+            is_leaf = self._child1[nodes] == -1
+            found.append(self._body[nodes[is_leaf]])
+            inner = nodes[~is_leaf]
+            nodes = np.concatenate((self._child1[inner], self._child2[inner]))
+
+        i = np.sort(np.concatenate(found))
+        return i[_overlapping(tight[i], box)]
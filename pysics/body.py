@@ -1,9 +1,24 @@
 """Bodies that follow the laws of physics"""
 
+from __future__ import annotations
 from dataclasses import dataclass
-import pygame
+from typing import TYPE_CHECKING, Optional
+import math
+import numpy as np
 from .coordinate_system import CoordSys
 from .math_core import Vec2D
+from .world import World
+
+if TYPE_CHECKING:
+    import pygame
+
+# The state of a body lives in the arrays of its World, at the row self._index
+# pylint: disable=protected-access
+
+
+def _rgba(col: tuple[int, ...]) -> tuple[int, ...]:
+    """Pad an RGB color to RGBA"""
+    return (*col, 255) if len(col) == 3 else tuple(col)
 
 
 @dataclass(init=False, repr=False)
@@ -17,6 +32,10 @@ class _Body:
         update_pos: Update the body's position using the Euler-Chromer method
     """
 
+    _is_ball = False
+    # The attributes stored in the World, printed by print_attrs
+    _world_attrs: tuple[str, ...] = ("pos", "vel", "accel", "m", "bounding_box_radius", "dt", "col")
+
     def __init__(
         self,
         coord_sys: CoordSys,
@@ -27,6 +46,7 @@ class _Body:
         accel_vec: tuple[float, float] = (0, 0),
         m: float = 1,
         col: tuple[int, ...] = (255, 255, 255, 255),
+        world: Optional[World] = None,
     ):
         """
         Args:
@@ -39,15 +59,114 @@ class _Body:
             accel_vec (tuple[float, float]): The acceleration of the body as a vector
             m (float): The mass of the body
             col (tuple[int, ...]): The color of the body (RGB or RGBA)
+            world (World): (optional) The World that stores the body's state.
+                If the argument is omitted, the body gets a World of its own.
         """
         self.coord_sys = coord_sys
-        self.bounding_box_radius = bounding_box_radius
-        self.pos = Vec2D(*pos_vec)
-        self.vel = Vec2D(*vel_vec)
-        self.accel = Vec2D(*accel_vec)
-        self.dt = dt
-        self.m = m
-        self.col = col
+        self._world: World
+        self._index: int
+        if world is None:
+            world = World(coord_sys, capacity=1)
+            world._private = True
+        world._append(
+            self,
+            (
+                pos_vec,
+                vel_vec,
+                accel_vec,
+                m,
+                bounding_box_radius,
+                dt,
+                _rgba(col),
+                self._is_ball,
+                0.0,
+                0.0,
+                0.0,
+                False,
+                False,
+                0,
+                -1,
+            ),
+        )
+
+    # All physical attributes live in the body's World. The properties below
+    # are views into the World's arrays, so the per-body API keeps working.
+    @property
+    def world(self) -> World:
+        """The World whose arrays store this body's state"""
+        return self._world
+
+    @property
+    def pos(self) -> Vec2D:
+        """The position of the body (a view into World.pos)"""
+        return Vec2D.from_buffer(self._world._pos[self._index])
+
+    @pos.setter
+    def pos(self, vec: Vec2D) -> None:
+        self._world._pos[self._index] = (vec.x, vec.y)
+
+    @property
+    def vel(self) -> Vec2D:
+        """The velocity of the body (a view into World.vel)"""
+        return Vec2D.from_buffer(self._world._vel[self._index])
+
+    @vel.setter
+    def vel(self, vec: Vec2D) -> None:
+        self._world._vel[self._index] = (vec.x, vec.y)
+
+    @property
+    def accel(self) -> Vec2D:
+        """The acceleration of the body (a view into World.accel)"""
+        return Vec2D.from_buffer(self._world._accel[self._index])
+
+    @accel.setter
+    def accel(self, vec: Vec2D) -> None:
+        self._world._accel[self._index] = (vec.x, vec.y)
+
+    @property
+    def m(self) -> float:
+        """The mass of the body"""
+        return float(self._world._m[self._index])
+
+    @m.setter
+    def m(self, value: float) -> None:
+        self._world._m[self._index] = value
+
+    @property
+    def bounding_box_radius(self) -> float:
+        """Half the sidelength of the smallest square that can contain the body"""
+        return float(self._world._radius[self._index])
+
+    @bounding_box_radius.setter
+    def bounding_box_radius(self, value: float) -> None:
+        self._world._radius[self._index] = value
+
+    @property
+    def dt(self) -> float:
+        """The time step for the Euler-Chromer method"""
+        return float(self._world._dt[self._index])
+
+    @dt.setter
+    def dt(self, value: float) -> None:
+        self._world._dt[self._index] = value
+
+    @property
+    def asleep(self) -> bool:
+        """Whether the body is asleep (see World.sleep_threshold)"""
+        return bool(self._world._asleep[self._index])
+
+    def wake(self) -> None:
+        """Wake up the body (and every body of its island) if it is asleep"""
+        self._world.wake([self._index])
+
+    @property
+    def col(self) -> tuple[int, ...]:
+        """The color of the body (RGBA)"""
+        return tuple(int(c) for c in self._world._col[self._index])
+
+    @col.setter
+    def col(self, value: tuple[int, ...]) -> None:
+        self._world._col[self._index] = _rgba(value)
 
     def __hash__(self):
         return hash(
@@ -79,8 +198,11 @@ class _Body:
 
     def print_attrs(self) -> None:
         """Print all attributes for debugging purposes"""
-        print(f"{'\n'*3}{self}\n")
-        for attr, value in self.__dict__.items():
+        print("\n" * 3 + f"{self}\n")
+        attrs = dict(self.__dict__)
+        for attr in self._world_attrs:
+            attrs[attr] = getattr(self, attr)
+        for attr, value in attrs.items():
             if isinstance(value, list):
                 print(f"{attr}:")
                 for item in value:
@@ -91,30 +213,68 @@ class _Body:
 
     def update_pos(self) -> None:
         """Calculate the body's new position based on position, velocity and acceleration"""
-        self.pos.components = self.pos.components + self.vel.components * 50 / self.dt
+        world, i = self._world, self._index
+        world._pos[i] = world._pos[i] + world._vel[i] * 50 / world._dt[i]
 
-        self.vel.components = self.vel.components + self.accel.components * 50 / self.dt
+        world._vel[i] = world._vel[i] + world._accel[i] * 50 / world._dt[i]
+        world._angle[i] += world._rot_vel[i] * 50 / world._dt[i]
+        world._rot_vel[i] += world._rot_accel[i] * 50 / world._dt[i]
+
+    def aabb(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The axis aligned bounding box (low x, low y, high x, high y),
+                the bounding square of the body's bounding box radius
+        """
+        pos, radius = self.pos.components, self.bounding_box_radius
+        return np.concatenate((pos - radius, pos + radius))
 
 
 class Ball(_Body):
     """The simplest shape for collisions: a ball"""
 
-    def __init__(self, coord_sys: CoordSys, r: float, dt: float, **kwargs):
+    _is_ball = True
+    _world_attrs = _Body._world_attrs + ("ccd",)
+
+    def __init__(self, coord_sys: CoordSys, r: float, dt: float, ccd: bool = False, **kwargs):
         """
         Args:
             coord_sys (CoordSys): The coordinate system that the body is in
             r (float): The radius of the ball
             dt (float): The time step for the Euler-Chromer method.
                 Ideally, the pygame frame rate should be used
+            ccd (bool): Sweep the path of the ball in World.step (continuous collision
+                detection), so it can't tunnel through other balls or the walls when it
+                moves fast. Costs more than the discrete collisions.
 
         Optional Args:
             pos_vec (tuple[float, float]): The position of the body as a vector
             vel_vec (tuple[float, float]): The velocity of the body as a vector
             accel_vec (tuple[float, float]): The acceleration of the body as a vector
             m (float): The mass of the body
+            col (tuple[int, ...]): The color of the body (RGB or RGBA)
+            world (World): The World that stores the ball's state
         """
         super().__init__(coord_sys=coord_sys, bounding_box_radius=r, dt=dt, **kwargs)
-        self.r = r
+        self.ccd = ccd
+
+    @property
+    def r(self) -> float:
+        """The radius of the ball (stored as its bounding box radius)"""
+        return float(self._world._radius[self._index])
+
+    @r.setter
+    def r(self, value: float) -> None:
+        self._world._radius[self._index] = value
+
+    @property
+    def ccd(self) -> bool:
+        """Whether the path of the ball is swept in World.step (see pysics.ccd)"""
+        return bool(self._world._ccd[self._index])
+
+    @ccd.setter
+    def ccd(self, value: bool) -> None:
+        self._world._ccd[self._index] = value
 
     def __hash__(self):
         return hash((super().__hash__(), self.r))
@@ -126,12 +286,9 @@ class Ball(_Body):
 
     def draw(self, screen: pygame.Surface) -> None:
         """Draw itself at it's position on the pygame screen"""
-        pygame.draw.circle(
-            screen,
-            self.col,
-            self.coord_sys.coord(*self.pos),
-            self.coord_sys.distance(self.r),
-        )
+        from .render import draw_ball  # pylint: disable=import-outside-toplevel
+
+        draw_ball(self, screen)
 
     def update_pos(self, wall_collision: bool = True) -> None:
         """
@@ -159,13 +316,16 @@ class Ball(_Body):
 class Polygon(_Body):
     """A more complex shape with collision and rotation"""
 
+    _world_attrs = _Body._world_attrs + ("angle", "rotational_vel", "rotational_accel")
+
     def __init__(
         self,
         coord_sys: CoordSys,
         dt: float,
-        vertices: tuple[tuple[int, int], ...],
+        vertices: tuple[tuple[float, float], ...],
         rotational_vel: float = 0,
         rotational_accel: float = 0,
+        angle: float = 0,
         **kwargs,
     ):
         """
@@ -173,21 +333,31 @@ class Polygon(_Body):
             coord_sys (CoordSys): The coordinate system that the body is in
             dt (float): The time step for the Euler-Chromer method.
                 Ideally, the pygame frame rate should be used
-            vertices (tuple[tuple[int, int], ...]): The vertices of the polygon
+            vertices (tuple[tuple[float, float], ...]): The vertices of the polygon
             rotational_vel (float): The rotational velocity of the polygon
             rotational_accel (float): The rotational acceleration of the polygon
+            angle (float): The orientation of the polygon in radians (counterclockwise),
+                the vertices are rotated by it around the position
 
         Optional Args:
             pos_vec (tuple[float, float]): The position of the body as a vector
             vel_vec (tuple[float, float]): The velocity of the body as a vector
             accel_vec (tuple[float, float]): The acceleration of the body as a vector
             m (float): The mass of the body
+            col (tuple[int, ...]): The color of the body (RGB or RGBA)
+            world (World): The World that stores the polygon's state
         """
         self.vertices: list[Vec2D] = []
         for vertex in vertices:
             self.vertices.append(Vec2D(*vertex))
-        self.rotational_vel = rotational_vel
-        self.rotational_accel = rotational_accel
+        self._shape_key: Optional[tuple[tuple[float, float], ...]] = None
+        self._shape: tuple[np.ndarray, np.ndarray] = (np.zeros((0, 2)), np.zeros((0, 2)))
+        self._world_shape_key: Optional[tuple] = None
+        self._world_shape: tuple[np.ndarray, np.ndarray, np.ndarray] = (
+            np.zeros((0, 2)),
+            np.zeros((0, 2)),
+            np.zeros(4),
+        )
 
         bounding_box_radius = max(vertex.magnitude for vertex in self.vertices)
         super().__init__(
@@ -196,6 +366,37 @@ class Polygon(_Body):
             dt=dt,
             **kwargs,
         )
+        self.angle = angle
+        self.rotational_vel = rotational_vel
+        self.rotational_accel = rotational_accel
+
+    # The orientation lives in the polygon's World, like the other physical attributes
+    @property
+    def angle(self) -> float:
+        """The orientation in radians (counterclockwise)"""
+        return float(self._world._angle[self._index])
+
+    @angle.setter
+    def angle(self, value: float) -> None:
+        self._world._angle[self._index] = value
+
+    @property
+    def rotational_vel(self) -> float:
+        """The rotational velocity, added to the angle like the velocity to the position"""
+        return float(self._world._rot_vel[self._index])
+
+    @rotational_vel.setter
+    def rotational_vel(self, value: float) -> None:
+        self._world._rot_vel[self._index] = value
+
+    @property
+    def rotational_accel(self) -> float:
+        """The rotational acceleration, added to the rotational velocity every step"""
+        return float(self._world._rot_accel[self._index])
+
+    @rotational_accel.setter
+    def rotational_accel(self, value: float) -> None:
+        self._world._rot_accel[self._index] = value
 
     def __hash__(self):
         return hash(
@@ -217,9 +418,73 @@ class Polygon(_Body):
             )
         return False
 
+    def local_shape(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The vertices and the outward unit normals of the edges (in the order of the edges
+        from vertex k to vertex k + 1, skipping edges without a length), relative to the
+        position of the polygon. Both are cached until the vertices change.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (K, 2) vertices and (<= K, 2) edge normals
+        """
+        key = tuple((vertex.x, vertex.y) for vertex in self.vertices)
+        if key != self._shape_key:
+            vertices = np.array(key, dtype=float).reshape(-1, 2)
+            edges = np.roll(vertices, -1, axis=0) - vertices
+            normals = np.column_stack((edges[:, 1], -edges[:, 0]))
+            # The normals point outwards for counterclockwise vertices
+            signed_area = np.sum(vertices[:, 0] * edges[:, 1] - vertices[:, 1] * edges[:, 0])
+            if signed_area < 0:
+                normals = -normals
+            length = np.hypot(normals[:, 0], normals[:, 1])
+            has_length = length > 0
+            normals = normals[has_length] / length[has_length, np.newaxis]
+            self._shape = (vertices, normals)
+            self._shape_key = key
+        return self._shape
+
+    def world_shape(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The vertices (rotated by the angle and moved to the position), the outward unit
+        normals of the edges (rotated by the angle) and the axis aligned bounding box of
+        the polygon. They are computed on demand and cached until the position, the angle
+        or the vertices change, so the broadphase, the collisions and the drawing of one
+        step share them.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: (K, 2) vertices, (<= K, 2) edge
+                normals and the bounding box (low x, low y, high x, high y)
+        """
+        world, i = self._world, self._index
+        vertices, normals = self.local_shape()
+        x, y = world._pos[i].tolist()
+        angle = float(world._angle[i])
+        key = (x, y, angle, self._shape_key)
+        if key != self._world_shape_key:
+            if angle:
+                cos, sin = math.cos(angle), math.sin(angle)
+                rotation = np.array(((cos, sin), (-sin, cos)))  # Transposed, for row vectors
+                vertices = vertices @ rotation
+                normals = normals @ rotation
+            vertices = vertices + (x, y)
+            if len(vertices):
+                aabb = np.concatenate((vertices.min(axis=0), vertices.max(axis=0)))
+            else:
+                aabb = np.array((x, y, x, y))
+            self._world_shape = (vertices, normals, aabb)
+            self._world_shape_key = key
+        return self._world_shape
+
+    def aabb(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The axis aligned bounding box (low x, low y, high x, high y)
+                of the rotated vertices
+        """
+        return self.world_shape()[2]
+
     def draw(self, screen: pygame.Surface) -> None:
         """Draw itself at it's position on the pygame screen"""
-        screen_vertices = []
-        for vertex in self.vertices:
-            screen_vertices.append(self.coord_sys.coord(*vertex))
-        pygame.draw.polygon(screen, self.col, screen_vertices)
+        from .render import draw_polygon  # pylint: disable=import-outside-toplevel
+
+        draw_polygon(self, screen)
@@ -0,0 +1,172 @@
+"""
+Continuous collision detection (CCD) for fast balls. Instead of only checking for overlaps
+after a step, the path of a ball during the step is swept: the time of impact (TOI) with
+other balls and with the walls of the World is calculated, the collision is resolved at
+that time and the rest of the step continues with the new velocities. This way a fast
+ball can't tunnel through another ball or a wall, even with a large time step.
+
+Only balls with Ball.ccd set are swept (against every other ball), as sweeping costs
+more than the discrete collisions of BallCollider.
+
+Every body moves along a straight line during a step, start + t * displacement for a
+time t from 0 to 1. After a collision, start is changed so that the line goes through
+the point of impact with the new displacement, and the end of the step is
+start + displacement again.
+"""
+
+from typing import Optional
+import numpy as np
+from . import profiling
+
+
+def time_of_impact(
+    offset: np.ndarray, relative_displacement: np.ndarray, reach: np.ndarray
+) -> np.ndarray:
+    """
+    The time at which two circles that move along straight lines start touching
+
+    Args:
+        offset (np.ndarray): (..., 2) position of the second circle relative to the first
+        relative_displacement (np.ndarray): (..., 2) displacement of the second circle
+            relative to the first (per unit of time)
+        reach (np.ndarray): (...) sum of the radii
+
+    Returns:
+        np.ndarray: (...) the time of impact (>= 0), inf if the circles never touch,
+            already overlap or move apart
+    """
+    a = np.einsum("...i,...i->...", relative_displacement, relative_displacement)
+    b = np.einsum("...i,...i->...", offset, relative_displacement)
+    c = np.einsum("...i,...i->...", offset, offset) - reach * reach
+    discriminant = b * b - a * c
+    # Only circles that are apart (c > 0) and approach each other (b < 0) can collide
+    hits = (c > 0) & (b < 0) & (discriminant >= 0)
+    toi = np.full(np.shape(c), np.inf)
+    toi[hits] = (-b[hits] - np.sqrt(discriminant[hits])) / a[hits]
+    return toi
+
+
+def wall_time_of_impact(
+    pos: np.ndarray, displacement: np.ndarray, r: np.ndarray, bounds: tuple[float, float]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The time at which balls inside the walls touch a wall
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the balls
+        displacement (np.ndarray): (N, 2) displacements of the balls (per unit of time)
+        r (np.ndarray): (N,) radii of the balls
+        bounds (tuple[float, float]): The width and the height of the World
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The earliest time of impact of every ball (inf if it
+            doesn't move towards a wall) and the axis of that wall (0 for x, 1 for y)
+    """
+    toi = np.full(pos.shape, np.inf)
+    lengths = np.array(bounds, dtype=float)
+    low_gap, high_gap = pos - r[:, np.newaxis], lengths - pos - r[:, np.newaxis]
+    with np.errstate(divide="ignore"):
+        towards_low = (displacement < 0) & (low_gap >= 0)
+        toi[towards_low] = low_gap[towards_low] / -displacement[towards_low]
+        towards_high = (displacement > 0) & (high_gap >= 0)
+        toi[towards_high] = high_gap[towards_high] / displacement[towards_high]
+    axis = np.argmin(toi, axis=1)
+    return toi[np.arange(len(pos)), axis], axis
+
+
+@profiling.timed("ccd")
+def sweep(
+    pos: np.ndarray,
+    vel: np.ndarray,
+    dt: np.ndarray,
+    m: np.ndarray,
+    r: np.ndarray,
+    is_ball: np.ndarray,
+    swept: np.ndarray,
+    bounds: Optional[tuple[float, float]] = None,
+    restitution: float = 1.0,
+    max_events: int = 16,
+) -> int:
+    """
+    Move every body by vel * 50 / dt (in place, like World.step), resolving the collisions
+    of the swept balls at their time of impact. The events are processed in the order of
+    time, until the end of the step or until max_events collisions were resolved (the
+    rest of the step isn't swept anymore).
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the bodies
+        vel (np.ndarray): (N, 2) velocities of the bodies, changed by the collisions
+        dt (np.ndarray): (N,) time steps of the bodies
+        m (np.ndarray): (N,) masses of the bodies
+        r (np.ndarray): (N,) radii of the bodies
+        is_ball (np.ndarray): (N,) True for balls, other bodies are moved but not swept
+        swept (np.ndarray): (N,) True for the balls whose path is swept
+        bounds (Optional[tuple[float, float]]): The width and the height of the World,
+            if the balls should bounce off its walls
+        restitution (float): 1 for fully elastic collisions, 0 for fully inelastic ones
+        max_events (int): The maximum number of collisions that are resolved
+
+    Returns:
+        int: The number of resolved collisions
+    """
+    dt = dt[:, np.newaxis]
+    displacement = vel * 50 / dt
+    swept_rows = np.flatnonzero(swept & is_ball)
+    others = np.flatnonzero(is_ball)
+    start = pos.copy()
+    now = 0.0
+    events = 0
+
+    while events < max_events and len(swept_rows):
+        current = start + now * displacement
+        remaining = 1.0 - now
+
+        # The earliest impact of every swept ball with another ball...
+        toi = time_of_impact(
+            current[others] - current[swept_rows, np.newaxis],
+            displacement[others] - displacement[swept_rows, np.newaxis],
+            r[others] + r[swept_rows, np.newaxis],
+        )
+        toi[others == swept_rows[:, np.newaxis]] = np.inf
+        partner = np.argmin(toi, axis=1)
+        ball_toi = toi[np.arange(len(swept_rows)), partner]
+
+        # ...and with a wall
+        if bounds is not None:
+            wall_toi, wall_axis = wall_time_of_impact(
+                current[swept_rows], displacement[swept_rows], r[swept_rows], bounds
+            )
+        else:
+            wall_toi = np.full(len(swept_rows), np.inf)
+            wall_axis = np.zeros(len(swept_rows), dtype=np.intp)
+
+        k = int(np.argmin(np.minimum(ball_toi, wall_toi)))
+        tau = min(ball_toi[k], wall_toi[k])
+        if tau > remaining:
+            break
+        now += tau
+        i = int(swept_rows[k])
+
+        if wall_toi[k] <= ball_toi[k]:
+            vel[i, wall_axis[k]] *= -1
+            changed = [i]
+        else:
+            j = int(others[partner[k]])
+            diff = (start[j] + now * displacement[j]) - (start[i] + now * displacement[i])
+            normal = diff / np.hypot(diff[0], diff[1])
+            relative_normal_vel = (vel[j] - vel[i]) @ normal
+            impulse = (1 + restitution) * relative_normal_vel / (m[i] + m[j])
+            vel[i] += normal * (impulse * m[j])
+            vel[j] -= normal * (impulse * m[i])
+            changed = [i, j]
+
+        # Continue the lines from the point of impact with the new velocities
+        for row in changed:
+            impact = start[row] + now * displacement[row]
+            displacement[row] = vel[row] * 50 / dt[row]
+            start[row] = impact - now * displacement[row]
+        events += 1
+
+    pos[:] = start + displacement
+    profiling.count("ccd_events", events)
+    return events
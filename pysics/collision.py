@@ -2,15 +2,58 @@
 Using the separating axes theorem (SAT), calculate whether two bodies are colliding
 (intersecting) and push them apart using the minimum translation vector (MTV) as well
 as each bodies velocity, acceleration and mass. Also considers rotation for polygons.
-Here is a great article about SAT: https://dyn4j.org/2010/01/sat/ 
+Here is a great article about SAT: https://dyn4j.org/2010/01/sat/
+
+Polygons are tested against polygons and balls: the candidate axes are the edge normals
+of the polygons (rotated by their angle and cached per step, see Polygon.world_shape)
+and, for a ball, the axis from the closest vertex to its center. Both shapes are
+projected onto all normals of one polygon with a single array operation, and the test
+returns before the next group of axes as soon as a separating axis shows up.
 """
 
+from typing import Iterable, Optional
 import numpy as np
-from .body import _Body, Ball, Polygon
+from . import profiling
+from .body import _Body, Polygon
 from .math_core import Vec2D
 
+# Polygons of the same World are looked up by their rows in its arrays
+# pylint: disable=protected-access
+
+
+def world_vertices(polygon: Polygon) -> np.ndarray:
+    """
+    Args:
+        polygon (Polygon): The polygon
+
+    Returns:
+        np.ndarray: The vertices of the polygon at its position and with its
+            orientation, shape (K, 2)
+    """
+    return polygon.world_shape()[0]
+
 
-def project_body_to_line(body: _Body, projection_vec: Vec2D) -> tuple[float, float, float]:
+def project_body(body: _Body, axes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Project a 2D body onto many 1D lines at once. Bodies other than polygons are
+    projected as circles with their bounding box radius (which is the radius of a Ball).
+
+    Args:
+        body (_Body): The body that should be projected
+        axes (np.ndarray): The lines the body should be projected onto, shape (M, 2)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The lowest and the highest projection
+            on every line, both of shape (M,)
+    """
+    if isinstance(body, Polygon):
+        projections = axes @ world_vertices(body).T
+        return projections.min(axis=1), projections.max(axis=1)
+    center = axes @ body.pos.components
+    return center - body.bounding_box_radius, center + body.bounding_box_radius
+
+
+def project_body_to_line(body: _Body, projection_vec: Vec2D) -> tuple[float, float]:
     """
     Project a 2D body onto a 1D line (technically a Vec2D).
 
@@ -19,29 +62,91 @@ def project_body_to_line(body: _Body, projection_vec: Vec2D) -> tuple[float, flo
         projection_vec (Vec2D): the line the body should be projected onto
 
     Returns:
-        tuple[float, float, float]: Projection on the line as:
-            line_angle, min_point_proj, max_point_proj
+        tuple[float, float]: Projection on the line as: min_point_proj, max_point_proj
     """
-    min_point_proj: float
-    max_point_proj: float
-    if isinstance(body, Polygon):
-        min_point_proj = np.dot(projection_vec.components, body.vertices[0].components)
-        max_point_proj = min_point_proj
-        for i in range(len(body.vertices) - 1):
-            point_proj: float = np.dot(projection_vec.components, body.vertices[i + 1].components)
-            if point_proj > max_point_proj:
-                max_point_proj = point_proj
-            elif point_proj < max_point_proj:
-                min_point_proj = point_proj
+    low, high = project_body(body, np.array([[projection_vec.x, projection_vec.y]]))
+    return float(low[0]), float(high[0])
+
+
+def _circle_axis(vertices: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """The axis from the vertex closest to the center of a circle to the center, (0 or 1, 2)"""
+    offsets = center - vertices
+    closest = offsets[np.argmin(np.einsum("ij,ij->i", offsets, offsets))]
+    length = np.hypot(closest[0], closest[1])
+    if length == 0:
+        return np.zeros((0, 2))
+    return (closest / length)[np.newaxis]
 
-    elif isinstance(body, Ball):
-        center_point_proj: float = np.dot(projection_vec.components, body.pos.components)
-        min_point_proj = center_point_proj - body.r
-        max_point_proj = center_point_proj + body.r
 
-    line_angle: float = Vec2D(1, 0).angle(projection_vec)
-    return (line_angle, min_point_proj, max_point_proj)
+def separating_axis_test(body1: _Body, body2: _Body) -> Optional[tuple[np.ndarray, float]]:
+    """
+    Test whether two bodies (balls and polygons) overlap, using the separating axes theorem
+
+    Args:
+        body1 (_Body): First body to check for overlap (e.g. body.Ball or body.Polygon)
+        body2 (_Body): Second body to check for overlap (e.g. body.Ball or body.Polygon)
 
+    Returns:
+        Optional[tuple[np.ndarray, float]]: None if the bodies don't overlap. Otherwise the
+            contact normal (a unit vector pointing from body1 to body2) and the depth of
+            the overlap along it: moving body2 by normal * depth separates the bodies.
+    """
+    pos1, pos2 = body1.pos.components, body2.pos.components
+    diff = pos2 - pos1
+    reach = body1.bounding_box_radius + body2.bounding_box_radius
+
+    # The bounding circles don't overlap, so the bodies can't either
+    if diff @ diff > reach * reach:
+        return None
+
+    # The vertices, normals and aabb of the polygons (None for balls)
+    shape1 = body1.world_shape() if isinstance(body1, Polygon) else None
+    shape2 = body2.world_shape() if isinstance(body2, Polygon) else None
+    if shape1 is None and shape2 is None:
+        distance = float(np.hypot(diff[0], diff[1]))
+        normal = diff / distance if distance > 0 else np.array([1.0, 0.0])
+        return normal, reach - distance
+
+    axis_groups = [shape[1] for shape in (shape1, shape2) if shape is not None]
+    if shape1 is None and shape2 is not None:
+        axis_groups.append(_circle_axis(shape2[0], pos1))
+    elif shape2 is None and shape1 is not None:
+        axis_groups.append(_circle_axis(shape1[0], pos2))
+    vertices = (
+        shape1[0] if shape1 is not None else None,
+        shape2[0] if shape2 is not None else None,
+    )
+
+    # Test one group of axes after the other (the normals of the first polygon first), so
+    # the test stops as soon as a separating axis is found
+    all_axes, all_forward, all_backward = [], [], []
+    for axes in axis_groups:
+        intervals = []
+        for body, body_vertices, pos in ((body1, vertices[0], pos1), (body2, vertices[1], pos2)):
+            if body_vertices is not None:
+                projections = axes @ body_vertices.T
+                intervals.append((projections.min(axis=1), projections.max(axis=1)))
+            else:
+                center = axes @ pos
+                intervals.append(
+                    (center - body.bounding_box_radius, center + body.bounding_box_radius)
+                )
+        (low1, high1), (low2, high2) = intervals
+        # Moving body2 along (against) an axis by forward (backward) separates the projections
+        forward, backward = high1 - low2, high2 - low1
+        if (np.minimum(forward, backward) < 0).any():
+            return None  # There is a separating axis
+        all_axes.append(axes)
+        all_forward.append(forward)
+        all_backward.append(backward)
+
+    axes, forward, backward = (
+        np.concatenate(all_axes), np.concatenate(all_forward), np.concatenate(all_backward)
+    )
+    overlap = np.minimum(forward, backward)
+    k = int(np.argmin(overlap))
+    normal = axes[k] if forward[k] <= backward[k] else -axes[k]
+    return normal, float(overlap[k])
 
 
 def calc_min_translation_vec(body1: _Body, body2: _Body) -> Vec2D:
@@ -53,37 +158,59 @@ def calc_min_translation_vec(body1: _Body, body2: _Body) -> Vec2D:
         body2 (_Body): Second body to check for overlap (e.g. body.Ball or body.Polygon)
 
     Returns:
-        Vec2D: The minimum translation vector (null vector if the bodies don't overlap)
+        Vec2D: The minimum translation vector (null vector if the bodies don't overlap).
+            Moving body2 by it (or body1 by its negative) separates the bodies.
     """
-    projections: list[tuple[float, float, float]] = []
-    if isinstance(body1, Ball):
-        projections.append(
-            project_body_to_line(
-                body1, (Vec2D(*(body2.pos.components - body1.pos.components)))
-            )
-        )
-    elif isinstance(body1, Polygon):
-        for vertex in body1.vertices:
-            projection_vec: Vec2D
-            projections.append(
-                project_body_to_line(
-                    body1, projection_vec
-                )
-        )
-
-    return Vec2D(0, 0)
+    contact = separating_axis_test(body1, body2)
+    if contact is None:
+        return Vec2D(0, 0)
+    normal, depth = contact
+    return Vec2D(normal[0] * depth, normal[1] * depth)
 
 
-def collide(spacial_map: dict[tuple[int, int], list[_Body]]) -> None:
+@profiling.timed("collide")
+def collide(body_pairs: Iterable[tuple[_Body, _Body]], restitution: float = 1.0) -> int:
     """
-    Calculates collisions between two bodies based on the spacial hash map.
+    Calculates collisions between pairs of bodies, e.g. the candidate pairs of a HashMap.
+    Overlapping bodies are pushed apart (each by half of the MTV), and bodies that move
+    towards each other get an impulse along the contact normal. Pairs of sleeping bodies
+    are skipped, and sleeping bodies that are touched wake up.
 
     Args:
-        spacial_map (dict[tuple[int, int], list[Body]]): The spacial hash map
-            of every body in their respective cell
+        body_pairs (Iterable[tuple[_Body, _Body]]): Every pair of bodies that might
+            collide, without duplicates (HashMap.pairs() should be used)
+        restitution (float): 1 for fully elastic collisions, 0 for fully inelastic ones
+
+    Returns:
+        int: The number of colliding pairs
     """
-    for cell in spacial_map.values():
-        for i, body1 in enumerate(cell):
-            for body2 in cell[i + 1 :]:
-                translation_vec: Vec2D = calc_min_translation_vec(body1, body2)
-                # TODO actual collision, based on velocities of the two bodies and the MTV
+    collisions = 0
+    for body1, body2 in body_pairs:
+        asleep1, asleep2 = body1.asleep, body2.asleep
+        if asleep1 and asleep2:
+            continue
+        contact = separating_axis_test(body1, body2)
+        if contact is None:
+            continue
+        collisions += 1
+        normal, depth = contact
+        if asleep1 or asleep2:
+            (body1 if asleep1 else body2).wake()
+        if body1._world is body2._world:
+            body1._world.add_contacts(np.array([body1._index]), np.array([body2._index]))
+
+        # Views into the bodies' World, changing them changes the bodies
+        pos1, pos2 = body1.pos.components, body2.pos.components
+        vel1, vel2 = body1.vel.components, body2.vel.components
+        pos1 -= normal * (depth / 2)
+        pos2 += normal * (depth / 2)
+
+        relative_normal_vel = (vel2 - vel1) @ normal
+        if relative_normal_vel < 0:
+            m1, m2 = body1.m, body2.m
+            impulse = (1 + restitution) * relative_normal_vel / (m1 + m2)
+            vel1 += normal * (impulse * m2)
+            vel2 -= normal * (impulse * m1)
+
+    profiling.count("collisions", collisions)
+    return collisions
@@ -0,0 +1,172 @@
+"""
+Sequential (Gauss-Seidel) resolution of many ball contacts, in conflict-free batches.
+
+resolve_ball_pairs calculates every contact from the state before the collisions and sums
+the responses, which is fast, but a ball in a stack (e.g. the rack of a billiard break)
+only passes on the impulse it had at the beginning of the step. Here the contact graph is
+colored instead: the contacts are split into batches in which no ball appears twice. A
+whole batch is resolved with one vectorized update, and every batch already sees the
+velocities that the earlier batches produced, so impulses travel through a stack within
+one step. Iterating over all batches several times brings the solution closer to
+resolving every contact at the same time.
+
+The contacts of a batch don't share any ball, so they can also be split into chunks that
+are resolved by a thread pool at the same time (numpy releases the GIL for most of the
+work on large arrays).
+
+Example usage:
+    colors = color_pairs(first, second, len(pos))
+    solve_contacts(pos, vel, m, r, first, second, colors, iterations=4)
+"""
+
+from concurrent.futures import Executor
+from typing import Optional
+import numpy as np
+from . import profiling
+
+
+def color_pairs(first: np.ndarray, second: np.ndarray, n: int) -> np.ndarray:
+    """
+    Color the contact graph: pairs with the same color don't share a body. Every round,
+    each body picks its pair with the highest priority (a fixed random permutation of
+    the pairs), and the pairs that were picked by both of their bodies get the next color.
+
+    Args:
+        first (np.ndarray): Index of the first body of every pair
+        second (np.ndarray): Index of the second body of every pair (not the first body)
+        n (int): The number of bodies
+
+    Returns:
+        np.ndarray: The color (0, 1, 2, ...) of every pair
+    """
+    colors = np.full(len(first), -1, dtype=np.int64)
+    # Random priorities break up chains of pairs, which would otherwise only lose one
+    # pair per round
+    priority = np.random.default_rng(0).permutation(len(first))
+    remaining = np.arange(len(first))
+    best = np.empty(n, dtype=np.int64)
+    color = 0
+    while len(remaining):
+        i, j, p = first[remaining], second[remaining], priority[remaining]
+        best[i] = len(first)
+        best[j] = len(first)
+        np.minimum.at(best, i, p)
+        np.minimum.at(best, j, p)
+        picked = (best[i] == p) & (best[j] == p)
+        colors[remaining[picked]] = color
+        remaining = remaining[~picked]
+        color += 1
+    return colors
+
+
+def _resolve_batch(
+    pos: np.ndarray,
+    vel: np.ndarray,
+    m: np.ndarray,
+    r: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    restitution: float,
+) -> np.ndarray:
+    """
+    Resolve pairs that don't share any ball (in place). Overlapping balls are pushed
+    apart, and balls that approach each other get an impulse along the contact normal.
+
+    Returns:
+        np.ndarray: Boolean mask of the pairs that are colliding
+    """
+    diff = pos[second] - pos[first]
+    distance = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+    colliding = distance <= r[first] + r[second]
+    first, second = first[colliding], second[colliding]
+    diff, distance = diff[colliding], distance[colliding]
+
+    # Balls at the exact same position are pushed apart along the x-axis
+    normal = np.empty_like(diff)
+    normal[:] = (1.0, 0.0)
+    apart = distance > 0
+    normal[apart] = diff[apart] / distance[apart, np.newaxis]
+
+    overlap = ((r[first] + r[second] - distance) / 2)[:, np.newaxis]
+    pos[first] -= normal * overlap
+    pos[second] += normal * overlap
+
+    relative_normal_vel = np.einsum("ij,ij->i", vel[second] - vel[first], normal)
+    # Balls that already move apart (e.g. after an earlier batch) keep their velocity
+    relative_normal_vel = np.minimum(relative_normal_vel, 0)
+    m1, m2 = m[first], m[second]
+    impulse = ((1 + restitution) * relative_normal_vel / (m1 + m2))[:, np.newaxis]
+    vel[first] += normal * (impulse * m2[:, np.newaxis])
+    vel[second] -= normal * (impulse * m1[:, np.newaxis])
+    return colliding
+
+
+@profiling.timed("solve_contacts")
+def solve_contacts(
+    pos: np.ndarray,
+    vel: np.ndarray,
+    m: np.ndarray,
+    r: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    colors: Optional[np.ndarray] = None,
+    restitution: float = 1.0,
+    iterations: int = 1,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 4096,
+) -> np.ndarray:
+    """
+    Resolve the collisions of many pairs of balls (in place), one batch of pairs without
+    shared balls after the other.
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the balls
+        vel (np.ndarray): (N, 2) velocities of the balls
+        m (np.ndarray): (N,) masses of the balls
+        r (np.ndarray): (N,) radii of the balls
+        first (np.ndarray): Index of the first ball of every candidate pair
+        second (np.ndarray): Index of the second ball of every candidate pair
+        colors (Optional[np.ndarray]): The batch of every pair, as returned by
+            color_pairs(). The pairs are colored if the argument is omitted.
+        restitution (float): 1 for fully elastic collisions, 0 for fully inelastic ones
+        iterations (int): How many times all batches are resolved
+        executor (Optional[Executor]): A thread pool which resolves the chunks of a
+            batch at the same time. Process pools can't be used, as the arrays are
+            changed in place.
+        chunk_size (int): The number of pairs per chunk for the executor
+
+    Returns:
+        np.ndarray: Boolean mask of the candidate pairs that collided in any iteration
+    """
+    if colors is None:
+        colors = color_pairs(first, second, len(pos))
+    colliding = np.zeros(len(first), dtype=bool)
+    if not len(first):
+        return colliding
+
+    # The pairs of every batch, in the order of the colors
+    order = np.argsort(colors, kind="stable")
+    bounds = np.searchsorted(colors[order], np.arange(int(colors.max()) + 2))
+    batches = [order[bounds[k] : bounds[k + 1]] for k in range(len(bounds) - 1)]
+    profiling.count("contact_batches", len(batches))
+
+    for _ in range(iterations):
+        for batch in batches:
+            if executor is None or len(batch) <= chunk_size:
+                chunks = [batch]
+                results = [
+                    _resolve_batch(pos, vel, m, r, first[batch], second[batch], restitution)
+                ]
+            else:
+                chunks = np.array_split(batch, -(-len(batch) // chunk_size))
+                futures = [
+                    executor.submit(
+                        _resolve_batch,
+                        pos, vel, m, r, first[chunk], second[chunk], restitution,
+                    )
+                    for chunk in chunks
+                ]
+                results = [future.result() for future in futures]
+            for chunk, chunk_colliding in zip(chunks, results):
+                colliding[chunk] |= chunk_colliding
+    return colliding
@@ -3,18 +3,31 @@ A dynamic coordinate system for defining positions more easily.
 Credits to @DanceMonkey276 on GitHub, <https://github.com/DanceMonkey276/>
 """
 
-import pygame
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+import numpy as np
+from numpy.typing import ArrayLike
+
+if TYPE_CHECKING:
+    import pygame
 
 
 class CoordSys:
-    """Apply a coordinate system to a pygame screen"""
+    """
+    Apply a coordinate system to a pygame screen.
+
+    The transform into screen coordinates is cached and only calculated again
+    when the size of the display (or of the coordinate system) changes.
+    """
 
     def __init__(
-        self, display: pygame.Surface, x_length: int = 1280, y_length: int = 720
+        self, display: pygame.Surface, x_length: float = 1280, y_length: float = 720
     ) -> None:
         self.display: pygame.Surface = display
-        self.x_tot: int = x_length
-        self.y_tot: int = y_length
+        self.x_tot: float = x_length
+        self.y_tot: float = y_length
+        self._cache_key: Optional[tuple] = None
+        self._cached_dimensions: tuple[float, float, float, float, float] = (1, 0, 0, 0, 0)
 
     def __repr__(self) -> str:
         return f"< Coordinate System ([0, {self.x_tot}], [0, {self.y_tot}]) >"
@@ -49,6 +62,21 @@ class CoordSys:
             (self.display.get_height() - self.y_tot * scale) / 2,  # y offset
         )
 
+    def _display_size(self) -> tuple[float, float]:
+        return self.display.get_size()
+
+    def _dimensions(self) -> tuple[float, float, float, float, float]:
+        """The result of _update_dimensions(), cached until the display is resized"""
+        key = (self._display_size(), self.x_tot, self.y_tot)
+        if key != self._cache_key:
+            self._cached_dimensions = self._update_dimensions()
+            self._cache_key = key
+        return self._cached_dimensions
+
+    def invalidate(self) -> None:
+        """Calculate the transform again the next time it is used"""
+        self._cache_key = None
+
     def distance(self, d: float) -> float:
         """
         Return the distance in the coordinate system as pixels on the pygame screen
@@ -59,7 +87,7 @@ class CoordSys:
         Returns:
             float: The distance in pixels on the pygame screen
         """
-        return self._update_dimensions()[0] * d
+        return self._dimensions()[0] * d
 
     def coord(self, x: float, y: float) -> tuple[float, float]:
         """
@@ -72,45 +100,78 @@ class CoordSys:
         Returns:
             Tuple[float, float]: The coordinate on the screen
         """
-        scale, _, h, x_off, y_off = self._update_dimensions()
+        scale, _, h, x_off, y_off = self._dimensions()
         return (
             scale * x + x_off,
             h - ((scale * y) + y_off),
         )
 
+    def distances(self, d: ArrayLike) -> np.ndarray:
+        """
+        Convert many distances at once, like distance()
+
+        Args:
+            d (ArrayLike): The distances which will be converted
+
+        Returns:
+            np.ndarray: The distances in pixels on the pygame screen
+        """
+        return self._dimensions()[0] * np.asarray(d, dtype=float)
+
+    def coords(self, points: ArrayLike) -> np.ndarray:
+        """
+        Convert many coordinates at once, like coord(),
+        e.g. the positions of all bodies: coord_sys.coords(world.pos)
+
+        Args:
+            points (ArrayLike): The coordinates which will be converted, shape (N, 2)
+
+        Returns:
+            np.ndarray: The coordinates on the screen, shape (N, 2)
+        """
+        scale, _, h, x_off, y_off = self._dimensions()
+        screen = np.asarray(points, dtype=float) * scale
+        screen[..., 0] += x_off
+        screen[..., 1] = h - (screen[..., 1] + y_off)
+        return screen
+
+    def visible_region(self) -> tuple[float, float, float, float]:
+        """
+        The part of the coordinate system that is on the pygame screen
+        (including the borders around it)
+
+        Returns:
+            tuple[float, float, float, float]: The lowest x and y and the
+                highest x and y coordinates on the screen
+        """
+        scale, w, h, x_off, y_off = self._dimensions()
+        return (-x_off / scale, -y_off / scale, (w - x_off) / scale, (h - y_off) / scale)
+
     def paint_borders(self) -> None:
         """Draw borders on the pygame screen to mark the coordinate system"""
-        _, w, h, x_off, y_off = self._update_dimensions()
-        # Draw the borders to the left and right
-        pygame.draw.rect(
-            self.display,
-            (0, 0, 0),
-            (0, 0, x_off, h),
-        )
-        pygame.draw.rect(
-            self.display,
-            (0, 0, 0),
-            (
-                w - x_off,
-                0,
-                x_off,
-                h,
-            ),
-        )
+        from .render import paint_borders  # pylint: disable=import-outside-toplevel
 
-        # Draw the borders to the top and bottom
-        pygame.draw.rect(
-            self.display,
-            (0, 0, 0),
-            (0, 0, w, y_off),
-        )
-        pygame.draw.rect(
-            self.display,
-            (0, 0, 0),
-            (
-                0,
-                h - y_off,
-                w,
-                y_off,
-            ),
-        )
+        paint_borders(self)
+
+
+class HeadlessCoordSys(CoordSys):
+    """
+    A coordinate system without a pygame screen, defined only by the extents of the world.
+    Screen coordinates are those of a virtual screen with the size of the world.
+    """
+
+    def __init__(self, x_length: float = 1280, y_length: float = 720) -> None:
+        # There is no display, every method that would use it is overridden
+        super().__init__(None, x_length, y_length)  # type: ignore[arg-type]
+
+    def __repr__(self) -> str:
+        return f"< Headless Coordinate System ([0, {self.x_tot}], [0, {self.y_tot}]) >"
+
+    def _display_size(self) -> tuple[float, float]:
+        return (self.x_tot, self.y_tot)
+
+    def _update_dimensions(self) -> tuple[float, float, float, float, float]:
+        return (1, self.x_tot, self.y_tot, 0, 0)
+
+    def paint_borders(self) -> None:
+        """There is no screen, so there is nothing to draw"""
@@ -0,0 +1,276 @@
+"""
+Many small, independent worlds of balls, stepped at once (e.g. for parameter sweeps).
+
+The bodies of K worlds are stored along an extra axis of the arrays: positions have the
+shape (K, N, 2), where N is the number of bodies of the largest world (smaller worlds are
+padded with inactive rows). Every world keeps its own size (walls) and bodies, and only
+bodies of the same world collide. A step of the ensemble costs about as much as a step of
+one world with K * N balls, instead of K steps of small worlds in a Python loop.
+
+Example usage:
+    worlds = [make_billiard(cue_speed) for cue_speed in np.linspace(5, 20, 5000)]
+    ensemble = pysics.Ensemble.from_worlds(worlds)
+    ensemble.step(600)
+    final_positions = ensemble.pos[:, :ensemble.n_bodies[0]]
+"""
+
+from __future__ import annotations
+from typing import Optional, Sequence
+import numpy as np
+from . import profiling
+from .body import Ball
+from .contact_solver import solve_contacts
+from .coordinate_system import HeadlessCoordSys
+from .hash_map import array_pairs, bounding_circle_filter
+from .temp_ball_collision import resolve_ball_pairs
+from .world import World
+
+# Up to this many bodies per world, every pair of a world is tested, without a broadphase
+BRUTE_FORCE_LIMIT = 32
+
+
+class Ensemble:
+    """
+    K independent worlds of balls in one set of (K, N, ...) arrays
+
+    Attributes:
+        bounds (np.ndarray): (K, 2) the width and the height of every world
+        pos, vel, accel (np.ndarray): (K, N, 2) the state of the bodies
+        m, radius, dt (np.ndarray): (K, N) the masses, radii and time steps of the bodies
+        active (np.ndarray): (K, N) False for the rows that pad the smaller worlds
+        worlds (Optional[list[World]]): The worlds the ensemble was created from
+
+    Methods:
+        from_worlds: Create an ensemble from World objects
+        collide: Resolve the collisions within every world
+        step: Run a number of steps (collisions and integration) of every world
+        world: The state of one world as a World object
+    """
+
+    def __init__(
+        self,
+        bounds: np.ndarray,
+        pos: np.ndarray,
+        vel: np.ndarray,
+        m: np.ndarray,
+        radius: np.ndarray,
+        dt: np.ndarray | float = 60,
+        accel: Optional[np.ndarray] = None,
+        active: Optional[np.ndarray] = None,
+        restitution: float = 1.0,
+        sequential: bool = False,
+        iterations: int = 1,
+    ):
+        """
+        Args:
+            bounds (np.ndarray): (K, 2) or (2,) the width and the height of the worlds
+            pos (np.ndarray): (K, N, 2) positions of the balls
+            vel (np.ndarray): (K, N, 2) velocities of the balls
+            m (np.ndarray): (K, N) masses of the balls (or anything that broadcasts)
+            radius (np.ndarray): (K, N) radii of the balls (or anything that broadcasts)
+            dt (np.ndarray | float): (K, N) time steps of the balls (see Body.dt)
+            accel (Optional[np.ndarray]): (K, N, 2) accelerations of the balls, 0 by default
+            active (Optional[np.ndarray]): (K, N) False for rows which are not a ball
+                (if the worlds have different numbers of balls). Every row is a ball
+                if the argument is omitted.
+            restitution (float): 1 for fully elastic collisions, 0 for fully inelastic ones
+            sequential (bool): Resolve the contacts in conflict-free batches, one after
+                the other (see BallCollider)
+            iterations (int): How many times the batches are resolved (only if sequential)
+        """
+        self.pos = np.array(pos, dtype=float)
+        if self.pos.ndim != 3 or self.pos.shape[2] != 2:
+            raise ValueError("The positions must have the shape (K, N, 2)")
+        shape = self.pos.shape[:2]
+        self.vel = np.array(np.broadcast_to(vel, shape + (2,)), dtype=float)
+        self.accel = np.zeros(shape + (2,)) if accel is None else np.array(
+            np.broadcast_to(accel, shape + (2,)), dtype=float
+        )
+        self.m = np.array(np.broadcast_to(m, shape), dtype=float)
+        self.radius = np.array(np.broadcast_to(radius, shape), dtype=float)
+        self.dt = np.array(np.broadcast_to(dt, shape), dtype=float)
+        self.active = np.ones(shape, dtype=bool) if active is None else np.array(
+            np.broadcast_to(active, shape), dtype=bool
+        )
+        self.bounds = np.array(np.broadcast_to(bounds, (shape[0], 2)), dtype=float)
+        self.restitution = restitution
+        self.sequential = sequential
+        self.iterations = iterations
+        self.worlds: Optional[list[World]] = None
+
+    @classmethod
+    def from_worlds(cls, worlds: Sequence[World], **kwargs) -> Ensemble:
+        """
+        Copy the balls of many worlds into one ensemble. The worlds are kept, so the
+        results can be written back into them (see Ensemble.world).
+
+        Args:
+            worlds (Sequence[World]): Worlds that only contain balls
+            **kwargs: The remaining arguments of Ensemble (e.g. restitution)
+
+        Returns:
+            Ensemble: The ensemble, world k of it is worlds[k]
+        """
+        if any(not world.is_ball.all() for world in worlds):
+            raise TypeError("All bodies must be pysics.body.Ball objects")
+        shape = (len(worlds), max((len(world) for world in worlds), default=0))
+        pos, vel, accel = np.zeros(shape + (2,)), np.zeros(shape + (2,)), np.zeros(shape + (2,))
+        m, radius, dt = np.ones(shape), np.zeros(shape), np.ones(shape)
+        active = np.zeros(shape, dtype=bool)
+        for k, world in enumerate(worlds):
+            n = len(world)
+            pos[k, :n], vel[k, :n], accel[k, :n] = world.pos, world.vel, world.accel
+            m[k, :n], radius[k, :n], dt[k, :n] = world.m, world.radius, world.dt
+            active[k, :n] = True
+        bounds = [(world.coord_sys.x_tot, world.coord_sys.y_tot) for world in worlds]
+        ensemble = cls(
+            np.array(bounds, dtype=float).reshape(-1, 2),
+            pos,
+            vel,
+            m,
+            radius,
+            dt,
+            accel=accel,
+            active=active,
+            **kwargs,
+        )
+        ensemble.worlds = list(worlds)
+        return ensemble
+
+    def __len__(self) -> int:
+        return self.pos.shape[0]
+
+    def __repr__(self) -> str:
+        return f"< Ensemble ({len(self)} worlds, up to {self.pos.shape[1]} bodies each) >"
+
+    @property
+    def n_bodies(self) -> np.ndarray:
+        """(K,) the number of balls of every world"""
+        return np.count_nonzero(self.active, axis=1)
+
+    def _candidate_pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The pairs of balls of the same world whose bounding circles overlap, as indices
+        into the flattened (K * N) arrays
+        """
+        n_worlds, n = self.active.shape
+        flat_pos = self.pos.reshape(-1, 2)
+        flat_radius = self.radius.reshape(-1)
+        active = self.active.reshape(-1)
+
+        if n <= BRUTE_FORCE_LIMIT:
+            # Every pair of every world
+            i, j = np.triu_indices(n, 1)
+            offsets = (np.arange(n_worlds) * n)[:, np.newaxis]
+            first, second = (i + offsets).reshape(-1), (j + offsets).reshape(-1)
+            both = active[first] & active[second]
+            return bounding_circle_filter(flat_pos, flat_radius, first[both], second[both])
+
+        # The worlds are placed next to each other (along the x-axis) for one hash map.
+        # Balls that left their world are clamped to its edge, so they can't reach the
+        # neighbouring world (the narrow phase still uses their real positions).
+        pad = 2 * float(self.radius.max(initial=0.0))
+        stride = float(self.bounds[:, 0].max(initial=0.0)) + 2 * pad
+        tiled = np.nan_to_num(self.pos, nan=0.0)
+        tiled = np.clip(tiled, -pad / 2, self.bounds[:, np.newaxis, :] + pad / 2)
+        tiled[..., 0] += (np.arange(n_worlds) * stride)[:, np.newaxis]
+        rows = np.flatnonzero(active)
+        radii = flat_radius[rows]
+        grid_size = 2 * float(np.percentile(radii, 90)) if len(rows) else 1.0
+        i, j = array_pairs(tiled.reshape(-1, 2)[rows], radii, grid_size or 1.0)
+        return bounding_circle_filter(flat_pos, flat_radius, rows[i], rows[j])
+
+    @profiling.timed("collide")
+    def collide(self) -> int:
+        """
+        Resolve the collisions of the balls within every world (like BallCollider.collide)
+
+        Returns:
+            int: The number of colliding pairs in all worlds
+        """
+        first, second = self._candidate_pairs()
+        pos, vel = self.pos.reshape(-1, 2), self.vel.reshape(-1, 2)
+        m, radius = self.m.reshape(-1), self.radius.reshape(-1)
+        if self.sequential:
+            colliding = solve_contacts(
+                pos,
+                vel,
+                m,
+                radius,
+                first,
+                second,
+                restitution=self.restitution,
+                iterations=self.iterations,
+            )
+        else:
+            colliding = resolve_ball_pairs(pos, vel, m, radius, first, second, self.restitution)
+        collisions = int(np.count_nonzero(colliding))
+        profiling.count("collisions", collisions)
+        return collisions
+
+    @profiling.timed("integrate")
+    def integrate(self, wall_collision: bool = True, seconds: Optional[float] = None) -> None:
+        """
+        Update the velocities and positions of every ball (like World.step)
+
+        Args:
+            wall_collision (bool): Whether the balls bounce off the walls of their world
+            seconds (Optional[float]): The simulated time of the step (see World.step)
+        """
+        dt = self.dt[..., np.newaxis] if seconds is None else 1 / seconds
+        active = self.active[..., np.newaxis]
+        self.vel += np.where(active, self.accel * 50 / dt, 0.0)
+        self.pos += np.where(active, self.vel * 50 / dt, 0.0)
+        if wall_collision:
+            r = self.radius[..., np.newaxis]
+            outside = (self.pos - r < 0) | (self.pos + r > self.bounds[:, np.newaxis, :])
+            self.vel[outside & active] *= -1
+
+    def step(
+        self, n_steps: int = 1, wall_collision: bool = True, seconds: Optional[float] = None
+    ) -> None:
+        """
+        Run a number of steps of every world, each the collisions and the integration
+
+        Args:
+            n_steps (int): The number of steps
+            wall_collision (bool): Whether the balls bounce off the walls of their world
+            seconds (Optional[float]): The simulated time of every step (see World.step)
+        """
+        for _ in range(n_steps):
+            self.collide()
+            self.integrate(wall_collision, seconds)
+
+    def world(self, k: int) -> World:
+        """
+        The state of one world as a World object. If the ensemble was created from
+        worlds, the state is written back into worlds[k], otherwise a new headless
+        World is created.
+
+        Args:
+            k (int): The index of the world
+
+        Returns:
+            World: The world with the current state of its balls
+        """
+        rows = np.flatnonzero(self.active[k])
+        if self.worlds is not None:
+            world = self.worlds[k]
+            world.pos[:], world.vel[:] = self.pos[k, rows], self.vel[k, rows]
+            return world
+
+        width, height = self.bounds[k].tolist()
+        coord_sys = HeadlessCoordSys(width, height)
+        world = World(coord_sys, capacity=max(len(rows), 1))
+        for row in rows.tolist():
+            Ball(
+                coord_sys,
+                r=float(self.radius[k, row]),
+                m=float(self.m[k, row]),
+                dt=float(self.dt[k, row]),
+                pos_vec=self.pos[k, row].tolist(),
+                vel_vec=self.vel[k, row].tolist(),
+                accel_vec=self.accel[k, row].tolist(),
+                world=world,
+            )
+        return world
@@ -1,38 +1,307 @@
 """Module for the creation of spacial hash maps"""
 
-from typing import Optional
+from dataclasses import dataclass
+from typing import Iterator, Optional, Sequence
 import numpy as np
+from . import profiling
 from .body import _Body
 from .math_core import Vec2D
+from .world import World, body_arrays
+
+# The broadphase reads the arrays of the World directly, without copying them per body
+# pylint: disable=protected-access
+
+
+def unique_pairs(i: np.ndarray, j: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Remove duplicate pairs of indices
+
+    Args:
+        i (np.ndarray): The first index of every pair
+        j (np.ndarray): The second index of every pair (i < j)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The unique pairs, sorted by i and then j
+    """
+    if len(i) == 0:
+        return i.astype(np.int64), j.astype(np.int64)
+    n = int(max(i.max(), j.max())) + 1
+    keys = np.sort(i.astype(np.int64) * n + j)
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return keys // n, keys % n
+
+
+def bounding_circle_filter(
+    pos: np.ndarray, radius: np.ndarray, i: np.ndarray, j: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Only keep the pairs whose bounding circles overlap
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the bodies
+        radius (np.ndarray): (N,) bounding box radii of the bodies
+        i (np.ndarray): The first index of every pair
+        j (np.ndarray): The second index of every pair
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The pairs whose bounding circles overlap
+    """
+    diff = pos[j] - pos[i]
+    reach = radius[i] + radius[j]
+    overlapping = np.einsum("ij,ij->i", diff, diff) <= reach * reach
+    return i[overlapping], j[overlapping]
+
+
+def box_filter(
+    pos: np.ndarray, radius: np.ndarray, low: Sequence[float], high: Sequence[float]
+) -> np.ndarray:
+    """
+    Find the bodies whose bounding boxes overlap a rectangle
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the bodies
+        radius (np.ndarray): (N,) bounding box radii of the bodies
+        low (Sequence[float]): The lowest x and y coordinates of the rectangle
+        high (Sequence[float]): The highest x and y coordinates of the rectangle
+
+    Returns:
+        np.ndarray: The sorted indices of the bodies that overlap the rectangle
+    """
+    radius = radius[:, np.newaxis]
+    return np.flatnonzero(
+        ((pos - radius <= high) & (pos + radius >= low)).all(axis=1)
+    )
+
+
+def _cell_ranges(pos: np.ndarray, radius: np.ndarray, grid_size: float) -> np.ndarray:
+    """
+    The first and last cell of every bounding box along each axis
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the bodies
+        radius (np.ndarray): (N,) bounding box radii of the bodies
+        grid_size (float): The sidelength of one cell of the grid
+
+    Returns:
+        np.ndarray: (N, 4) array of low x, low y, high x and high y cell coordinates
+    """
+    pos = np.nan_to_num(pos, nan=0.0)
+    low = np.floor((pos - radius[:, np.newaxis]) / grid_size)
+    high = np.floor((pos + radius[:, np.newaxis]) / grid_size)
+    return np.hstack((low, high)).astype(np.int64)
+
+
+def _sorted_entries(
+    ranges: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Create one entry for every cell of every body and sort the entries by cell
+
+    Args:
+        ranges (np.ndarray): The cell ranges of the bodies (see _cell_ranges)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The body index and the
+            x and y coordinates of the cell of every entry (sorted by cell) and the
+            offsets of the cells in the sorted entries
+    """
+    if not len(ranges):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, np.zeros(1, dtype=np.int64)
+    low = ranges[:, :2]
+    span = ranges[:, 2:] - low + 1
+    counts = span[:, 0] * span[:, 1]
+
+    # One entry per (body, cell) pair
+    body_idx = np.repeat(np.arange(len(ranges)), counts)
+    local = np.arange(len(body_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    span_x = span[body_idx, 0]
+    cell_x = low[body_idx, 0] + local % span_x
+    cell_y = low[body_idx, 1] + local // span_x
+
+    # Linearize the cell coordinates and sort the entries by cell
+    min_x, min_y = cell_x.min(), cell_y.min()
+    keys = (cell_y - min_y) * (cell_x.max() - min_x + 1) + (cell_x - min_x)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    starts = np.flatnonzero(np.diff(sorted_keys)) + 1
+    offsets = np.concatenate(([0], starts, [len(sorted_keys)]))
+    return body_idx[order], cell_x[order], cell_y[order], offsets
+
+
+def _cell_keys(cell_x: np.ndarray, cell_y: np.ndarray) -> np.ndarray:
+    """
+    One integer per cell, in the same order as the cells of _sorted_entries
+    (by y and then x), for cell coordinates below 2**30
+    """
+    return (cell_y.astype(np.int64) + 2**30) * 2**31 + (cell_x + 2**30)
+
+
+@dataclass
+class CellTable:
+    """
+    A spacial hash map in compressed sparse row (CSR) form. The bodies of the cell
+    cells[i] are bodies[indices[offsets[i] : offsets[i + 1]]], in the order of bodies.
+
+    Methods:
+        cell_bodies: The indices of the bodies in one cell
+        pairs: Every pair of bodies that share at least one cell, without duplicates
+        to_dict: Convert the table into the dictionary returned by HashMap.generate_map
+    """
+
+    cells: np.ndarray  # (K, 2) x and y coordinates of every non-empty cell
+    offsets: np.ndarray  # (K + 1,) start of every cell in indices
+    indices: np.ndarray  # (M,) indices into the list of bodies, grouped by cell
+    ranges: np.ndarray  # (N, 4) low x, low y, high x and high y cell of every body
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def cell_bodies(self, i: int) -> np.ndarray:
+        """
+        Args:
+            i (int): The index of the cell in self.cells
+
+        Returns:
+            np.ndarray: The indices of every body in that cell
+        """
+        return self.indices[self.offsets[i] : self.offsets[i + 1]]
+
+    def pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of bodies that share at least one cell. A pair that shares
+        several cells is only returned once.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The indices i and j of the bodies of every
+                pair, with i < j, sorted by i and then j
+        """
+        sizes = np.diff(self.offsets)
+        cell_of_entry = np.repeat(np.arange(len(sizes)), sizes)
+        # How many bodies come after every entry in its cell
+        entries_after = self.offsets[cell_of_entry + 1] - np.arange(len(self.indices)) - 1
+
+        first = np.repeat(np.arange(len(self.indices)), entries_after)
+        second = (
+            first
+            + 1
+            + np.arange(len(first))
+            - np.repeat(np.cumsum(entries_after) - entries_after, entries_after)
+        )
+        i, j = self.indices[first], self.indices[second]
+
+        # A pair is only kept in the first cell both bodies are in (the lower left
+        # corner of the overlap of their cell ranges), which removes the duplicates
+        cell = self.cells[cell_of_entry[first]]
+        owner = np.maximum(self.ranges[i, :2], self.ranges[j, :2])
+        keep = (cell == owner).all(axis=1)
+
+        # The indices in a cell are sorted, so i < j
+        n = len(self.ranges)
+        keys = np.sort(i[keep] * n + j[keep])
+        return keys // n, keys % n
+
+    def to_dict(self, bodies: Sequence[_Body] | World) -> dict[tuple[int, int], list[_Body]]:
+        """
+        Args:
+            bodies (Sequence[_Body]): The bodies the table was generated from
+
+        Returns:
+            dict[tuple[int, int], list[Body]]: The spacial hash map
+                of every body in their respective cell
+        """
+        body_list = list(bodies)
+        cell_bodies = [body_list[i] for i in self.indices.tolist()]
+        offsets = self.offsets.tolist()
+        return {
+            cell: cell_bodies[start:end]
+            for cell, start, end in zip(
+                map(tuple, self.cells.tolist()), offsets[:-1], offsets[1:]
+            )
+        }
 
 
 class HashMap:
     """
     Easily create hash maps for efficient collision detection.
+
+    In incremental mode, the hash map is kept between frames and only the bodies
+    whose cells changed are moved, instead of rebuilding the whole map every frame.
+
+    Methods:
+        get_spacial_cell: The cells a single body belongs to
+        generate_table: Build the hash map with array operations (CSR form)
+        generate_map: The hash map as a dictionary
+        candidate_pairs: The indices of every pair of bodies that share a cell
+        pairs: Iterate over every pair of bodies that share a cell
+        query: The indices of the bodies that overlap a rectangle
+        update: Move the bodies whose cells changed (incremental mode)
+        insert: Add a body to the hash map (incremental mode)
+        remove: Remove a body from the hash map (incremental mode)
+        tune: Pick the grid size with the lowest estimated cost
     """
-    def __init__(self, grid_size: int, bodies: list[_Body]):
+    def __init__(
+        self,
+        grid_size: Optional[float],
+        bodies: Sequence[_Body] | World,
+        incremental: bool = False,
+        auto_tune: bool = False,
+        tune_interval: int = 120,
+    ):
         """
         Args:
-            grid_size (int): The sidelength of one cell of the grid
-            bodies (list[Body]): The list of every body
+            grid_size (Optional[float]): The sidelength of one cell of the grid. If None,
+                the grid size is picked automatically (and auto_tune is turned on).
+            bodies (Sequence[Body]): The list of every body (or a World)
+            incremental (bool): Keep the hash map between frames and only update
+                the bodies that moved to other cells
+            auto_tune (bool): Pick the grid size again every tune_interval frames,
+                based on the size of the bodies and how many pairs have to be tested
+            tune_interval (int): How many frames to wait between tuning the grid size
         """
-        self.grid_size = grid_size
+        self.grid_size: float = grid_size if grid_size is not None else 0
         self.bodies = bodies
+        self.incremental = incremental
+        self.auto_tune = auto_tune or grid_size is None
+        self.tune_interval = tune_interval
+        self._frames_since_tune = 0
+
+        # Statistics of the last frame
+        self.bodies_per_cell: float = 0
+        self.pairs_tested: int = 0
+
+        # State of the incremental mode. Every tracked body has a slot, which
+        # is its index in _tracked and _ranges.
+        self._cells: dict[tuple[int, int], list[_Body]] = {}
+        self._tracked: list[_Body] = []
+        self._slots: dict[int, int] = {}  # id(body) -> slot
+        self._ranges = np.zeros((16, 4), dtype=np.int64)  # low x, low y, high x, high y
+        self._rows: Optional[np.ndarray] = None
+        self._world: Optional[World] = None
+        self._world_version_rows = -1
+        self._world_version = -1
+        self._bodies_version = -1
+        # The sorted cell keys of the sleeping bodies of a World and their rows
+        self._sleeping: Optional[tuple[tuple, np.ndarray, np.ndarray]] = None
+        if grid_size is None and len(bodies):
+            self.tune()
+        if incremental:
+            for body in bodies:
+                self.insert(body)
 
     def get_spacial_cell(
         self, pos_vec: Vec2D, bounding_box: float
     ) -> tuple[tuple[int, int], ...]:
         """
         Calculates which cells a body should belong to based on the smallest
-        possible square bounding box. Calculates all possible cells where the center,
-        the right, the top or the top-right part of the body is.
+        possible square bounding box. Returns every cell the bounding box overlaps,
+        no matter how many cells it spans.
 
         Args:
-            pos_x (float): x position of the body
-            pos_y (float): y position of the body
+            pos_vec (Vec2D): position of the body
             bounding_box (float): Half of a bodies smallest possible
                 encapsulating square's sidelength (Body.bounding_box_radius should be used)
-            grid_size (int): sidelength of one cell of the grid
 
         Returns:
             tuple[tuple[int, int],...]: A tuple of tuples of x and y coordinates of the cell
@@ -44,30 +313,165 @@ class HashMap:
         if np.isnan(pos_y):
             pos_y = 0
 
-        cell = (int(pos_x // self.grid_size), int(pos_y // self.grid_size))
-        cell_top = (int(pos_x // self.grid_size), int((pos_y + bounding_box) // self.grid_size))
-        cell_top_right = (int((pos_x + bounding_box) // self.grid_size), int(
-            pos_y // self.grid_size
-        ))
-        cell_right = (
-            int((pos_x + bounding_box) // self.grid_size),
-            int((pos_y + bounding_box) // self.grid_size),
+        return tuple(
+            (cell_x, cell_y)
+            for cell_x in range(
+                int((pos_x - bounding_box) // self.grid_size),
+                int((pos_x + bounding_box) // self.grid_size) + 1,
+            )
+            for cell_y in range(
+                int((pos_y - bounding_box) // self.grid_size),
+                int((pos_y + bounding_box) // self.grid_size) + 1,
+            )
         )
 
-        # Use set() in order not to return duplicate values
-        unique_cells: set[tuple[int, int]] = {
-            cell,
-            cell_top,
-            cell_top_right,
-            cell_right,
-        }
-        return tuple(unique_cells)
+    def _grid_cost(
+        self, pos: np.ndarray, radius: np.ndarray, grid_size: float
+    ) -> Optional[tuple[int, int]]:
+        """
+        Args:
+            pos (np.ndarray): (N, 2) positions of the bodies
+            radius (np.ndarray): (N,) bounding box radii of the bodies
+            grid_size (float): The grid size to estimate the cost for
+
+        Returns:
+            Optional[tuple[int, int]]: How many (body, cell) entries and how many pairs
+                would have to be processed, or None if the bodies would be spread
+                over far too many cells
+        """
+        ranges = _cell_ranges(pos, radius, grid_size)
+        span = ranges[:, 2:] - ranges[:, :2] + 1
+        entries = int((span[:, 0] * span[:, 1]).sum())
+        if entries > 16 * len(pos):
+            return None
+        sizes = np.diff(_sorted_entries(ranges)[3])
+        return entries, int((sizes * (sizes - 1) // 2).sum())
+
+    def tune(self, bodies: Optional[Sequence[_Body] | World] = None, min_gain: float = 0.2) -> bool:
+        """
+        Pick the grid size with the lowest estimated cost. The candidates are twice the
+        size of most bodies (the 90th percentile of the bounding box radii) and multiples
+        of the current grid size. The cost of a grid size is the number of (body, cell)
+        entries plus the number of pairs tested in the cells. If no grid size has been
+        picked yet and every candidate is far too small, twice the largest radius is used,
+        so the grid size is always positive after tuning a non-empty list of bodies.
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            min_gain (float): How much cheaper (relatively) a grid size has to be,
+                so that the bodies are put into new cells
+
+        Returns:
+            bool: Whether the grid size was changed
+        """
+        if not bodies:
+            bodies = self.bodies
+        self._frames_since_tune = 0
+        if not len(bodies):
+            return False
 
+        pos, radius = body_arrays(bodies)
+        # Points (a radius of 0) still need cells with a positive size
+        candidates = [
+            2 * float(np.percentile(radius, 90)) or 2 * float(radius.max()) or 1.0
+        ]
+        if self.grid_size > 0:
+            candidates += [self.grid_size * factor for factor in (0.5, 0.7, 1.4, 2)]
+        candidates = [size for size in candidates if size > 0]
+
+        current_cost = np.inf
+        if self.grid_size > 0:
+            cost = self._grid_cost(pos, radius, self.grid_size)
+            current_cost = sum(cost) if cost is not None else np.inf
+
+        best_size, best_cost = self.grid_size, current_cost
+        for size in candidates:
+            cost = self._grid_cost(pos, radius, size)
+            if cost is not None and sum(cost) < best_cost:
+                best_size, best_cost = size, sum(cost)
+        if best_size <= 0:
+            # Every candidate spreads the bodies over far too many cells (e.g. a few huge
+            # polygons among small balls). Every body covers at most 2x2 cells of this size.
+            best_size = 2 * float(radius.max()) or 1.0
+
+        if best_size == self.grid_size or best_cost > (1 - min_gain) * current_cost:
+            return False
+        self.grid_size = best_size
+        if self.incremental:
+            # Put every body into the cells of the new grid
+            self._cells = {}
+            for slot, body in enumerate(self._tracked):
+                self._ranges[slot] = _cell_ranges(
+                    body.pos.components[np.newaxis],
+                    np.array([body.bounding_box_radius]),
+                    self.grid_size,
+                )[0]
+                self._link(body, tuple(self._ranges[slot].tolist()))
+        return True
+
+    def _tick_tuning(self) -> None:
+        """Tune the grid size every tune_interval frames, if auto_tune is on"""
+        if not self.auto_tune:
+            return
+        self._frames_since_tune += 1
+        if self._frames_since_tune >= self.tune_interval or self.grid_size <= 0:
+            self.tune()
+
+    def generate_table(self, bodies: Optional[Sequence[_Body] | World] = None) -> CellTable:
+        """
+        Generate the spacial hash map of the bodies with array operations: the cell keys
+        of all bodies are computed at once and sorted, so that the bodies of each cell
+        are stored next to each other.
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+
+        Returns:
+            CellTable: The cells and the indices (into bodies) of the bodies in them
+        """
+        if not bodies:
+            bodies = self.bodies
+        if not len(bodies):
+            return CellTable(
+                np.zeros((0, 2), dtype=np.int64),
+                np.zeros(1, dtype=np.int64),
+                np.zeros(0, dtype=np.int64),
+                np.zeros((0, 4), dtype=np.int64),
+            )
+
+        if bodies is self.bodies:
+            self._tick_tuning()
+        return self._table(_cell_ranges(*body_arrays(bodies), self.grid_size))
+
+    def _table(self, ranges: np.ndarray) -> CellTable:
+        """The CellTable of bodies with the given cell ranges (and its statistics)"""
+        body_idx, cell_x, cell_y, offsets = _sorted_entries(ranges)
+
+        sizes = np.diff(offsets)
+        self.bodies_per_cell = len(body_idx) / max(len(sizes), 1)
+        self.pairs_tested = int((sizes * (sizes - 1) // 2).sum())
+        profiler = profiling.active()
+        if profiler is not None:
+            profiler.histogram("cell_occupancy", np.bincount(sizes))
+
+        first = offsets[:-1]
+        return CellTable(
+            np.column_stack((cell_x[first], cell_y[first])),
+            offsets,
+            body_idx,
+            ranges,
+        )
+
+    @profiling.timed("generate_map")
     def generate_map(
-        self, bodies: Optional[list[_Body]] = None
+        self, bodies: Optional[Sequence[_Body] | World] = None
     ) -> dict[tuple[int, int], list[_Body]]:
         """
-        Generate a dictionary of cells populated with balls
+        Generate a dictionary of cells populated with balls.
+        In incremental mode, the hash map is updated and returned directly,
+        so it must not be changed by the caller.
 
         Args:
             bodies (list[Body]): (optional) The list of every body.
@@ -77,17 +481,320 @@ class HashMap:
             dict[tuple[int, int], list[Body]]: The spacial hash map
                 of every body in their respective cell
         """
+        if self.incremental and (not bodies or bodies is self.bodies):
+            self.update()
+            return self._cells
         if not bodies:
             bodies = self.bodies
-        spacial_map: dict = {}
-        for body in bodies:
-            cells = self.get_spacial_cell(
-                body.pos,
-                body.bounding_box_radius,
-            )
-            for cell in cells:
-                if cell not in spacial_map:
-                    spacial_map[cell] = []
-                spacial_map[cell].append(body)
+        return self.generate_table(bodies).to_dict(bodies)
+
+    @profiling.timed("pairs")
+    def candidate_pairs(
+        self, bodies: Optional[Sequence[_Body] | World] = None, bounding_circle: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of bodies that share at least one cell, without duplicates.
+        These are the candidates that the narrow phase has to check for collisions.
+        If some bodies of a World are asleep, pairs of two sleeping bodies are left out:
+        only the awake bodies are put into cells, and they are looked up in the cells of
+        the sleeping bodies, which are kept until bodies fall asleep or wake up.
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            bounding_circle (bool): Only return pairs whose bounding circles
+                (Body.bounding_box_radius) overlap
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The indices (into bodies) i and j of the bodies
+                of every pair, with i < j, sorted by i and then j
+        """
+        if not bodies:
+            bodies = self.bodies
+        if not len(bodies):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        if self.incremental and bodies is self.bodies:
+            self.update()
+            # The cell ranges of the tracked bodies are up to date, so only the table
+            # has to be sorted (the slots of the bodies are mapped to their indices)
+            i, j = self._table(self._ranges[: len(self._tracked)]).pairs()
+            assert self._rows is not None
+            if isinstance(bodies, World):
+                index = self._rows
+            else:
+                world, rows = World.collect(bodies)
+                list_index = np.empty(world.capacity, dtype=np.int64)
+                list_index[rows] = np.arange(len(bodies))
+                index = list_index[self._rows]
+            i, j = index[i], index[j]
+            i, j = unique_pairs(np.minimum(i, j), np.maximum(i, j))
+        elif isinstance(bodies, World) and isinstance(bodies._awake_rows(), np.ndarray):
+            if bodies is self.bodies:
+                self._tick_tuning()
+            i, j = self._awake_pairs(bodies)
+        else:
+            i, j = self.generate_table(bodies).pairs()
+
+        if bounding_circle:
+            i, j = bounding_circle_filter(*body_arrays(bodies), i, j)
+        profiling.count("candidate_pairs", len(i))
+        return i, j
+
+    def _awake_pairs(self, world: World) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of bodies of a World that share a cell, with at least one awake body
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The rows i and j of the bodies of every pair,
+                with i < j, sorted by i and then j
+        """
+        key = (world._version, world._sleep_version, self.grid_size)
+        if self._sleeping is None or self._sleeping[0] != key:
+            asleep = np.flatnonzero(world.asleep)
+            ranges = _cell_ranges(world._pos[asleep], world._radius[asleep], self.grid_size)
+            body_idx, cell_x, cell_y, _ = _sorted_entries(ranges)
+            self._sleeping = (key, _cell_keys(cell_x, cell_y), asleep[body_idx])
+        _, sleeping_keys, sleeping_rows = self._sleeping
+
+        # Pairs of awake bodies (the awake rows are sorted, so i < j stays true)
+        awake = world._awake_rows()
+        assert isinstance(awake, np.ndarray)
+        if not len(awake):
+            # Every body sleeps, so there is nothing to collide
+            self.pairs_tested = 0
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        ranges = _cell_ranges(world._pos[awake], world._radius[awake], self.grid_size)
+        body_idx, cell_x, cell_y, offsets = _sorted_entries(ranges)
+        first = offsets[:-1]
+        table = CellTable(
+            np.column_stack((cell_x[first], cell_y[first])), offsets, body_idx, ranges
+        )
+        i, j = table.pairs()
+
+        # Pairs of an awake and a sleeping body: look up the cells of the awake bodies
+        cell_keys = _cell_keys(cell_x, cell_y)
+        start = np.searchsorted(sleeping_keys, cell_keys, side="left")
+        counts = np.searchsorted(sleeping_keys, cell_keys, side="right") - start
+        awake_rows = np.repeat(awake[body_idx], counts)
+        sleeping = sleeping_rows[
+            np.repeat(start, counts)
+            + np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+        ]
+
+        self.pairs_tested = len(i) + len(awake_rows)
+        return unique_pairs(
+            np.concatenate((awake[i], np.minimum(awake_rows, sleeping))),
+            np.concatenate((awake[j], np.maximum(awake_rows, sleeping))),
+        )
+
+    def pairs(
+        self, bodies: Optional[Sequence[_Body] | World] = None, bounding_circle: bool = False
+    ) -> Iterator[tuple[_Body, _Body]]:
+        """
+        Iterate over every pair of bodies that share at least one cell, without duplicates
 
-        return spacial_map
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            bounding_circle (bool): Only yield pairs whose bounding circles overlap
+
+        Yields:
+            tuple[_Body, _Body]: The two bodies of a pair
+        """
+        if not bodies:
+            bodies = self.bodies
+        i, j = self.candidate_pairs(bodies, bounding_circle)
+        for index1, index2 in zip(i.tolist(), j.tolist()):
+            yield bodies[index1], bodies[index2]
+
+    def query(
+        self,
+        low: Sequence[float],
+        high: Sequence[float],
+        bodies: Optional[Sequence[_Body] | World] = None,
+    ) -> np.ndarray:
+        """
+        Every body whose bounding box overlaps a rectangle, e.g. the part of the world that
+        is visible on the screen. In incremental mode, if the rectangle covers fewer cells
+        than the hash map has, only the bodies in those cells are checked.
+
+        Args:
+            low (Sequence[float]): The lowest x and y coordinates of the rectangle
+            high (Sequence[float]): The highest x and y coordinates of the rectangle
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+
+        Returns:
+            np.ndarray: The sorted indices (into bodies) of the bodies in the rectangle
+        """
+        if not bodies:
+            bodies = self.bodies
+        if not len(bodies):
+            return np.zeros(0, dtype=np.int64)
+
+        if self.incremental and bodies is self.bodies and isinstance(bodies, World):
+            self.update()
+            low_x, low_y = (int(c // self.grid_size) for c in low)
+            high_x, high_y = (int(c // self.grid_size) for c in high)
+            if (high_x - low_x + 1) * (high_y - low_y + 1) < len(self._cells):
+                indices = {
+                    body._index
+                    for cell_x in range(low_x, high_x + 1)
+                    for cell_y in range(low_y, high_y + 1)
+                    for body in self._cells.get((cell_x, cell_y), ())
+                }
+                candidates = np.array(sorted(indices), dtype=np.int64)
+                pos, radius = bodies._pos[candidates], bodies._radius[candidates]
+                return candidates[box_filter(pos, radius, low, high)]
+
+        return box_filter(*body_arrays(bodies), low, high)
+
+    def _link(self, body: _Body, cell_range: tuple[int, int, int, int]) -> None:
+        low_x, low_y, high_x, high_y = cell_range
+        for cell_x in range(low_x, high_x + 1):
+            for cell_y in range(low_y, high_y + 1):
+                cell = (cell_x, cell_y)
+                if cell not in self._cells:
+                    self._cells[cell] = []
+                self._cells[cell].append(body)
+
+    def _unlink(self, body: _Body, cell_range: tuple[int, int, int, int]) -> None:
+        low_x, low_y, high_x, high_y = cell_range
+        for cell_x in range(low_x, high_x + 1):
+            for cell_y in range(low_y, high_y + 1):
+                cell_bodies = self._cells[(cell_x, cell_y)]
+                for i, other in enumerate(cell_bodies):
+                    if other is body:
+                        del cell_bodies[i]
+                        break
+                if not cell_bodies:
+                    del self._cells[(cell_x, cell_y)]
+
+    def insert(self, body: _Body) -> None:
+        """
+        Add a body to the incremental hash map. This only updates the hash map,
+        the body should also be part of HashMap.bodies (a World does that on its own).
+
+        Args:
+            body (_Body): The body to add
+        """
+        if id(body) in self._slots:
+            return
+        if self.grid_size <= 0:
+            # No grid size was picked yet (auto-tuned map over an empty list of bodies)
+            self.tune(self.bodies if len(self.bodies) else [body])
+        slot = len(self._tracked)
+        if slot == len(self._ranges):
+            self._ranges = np.vstack((self._ranges, np.zeros_like(self._ranges)))
+        self._ranges[slot] = _cell_ranges(
+            body.pos.components[np.newaxis], np.array([body.bounding_box_radius]), self.grid_size
+        )[0]
+        self._link(body, tuple(self._ranges[slot].tolist()))
+        self._tracked.append(body)
+        self._slots[id(body)] = slot
+        self._rows = None
+        self._mark_synced()
+
+    def remove(self, body: _Body) -> None:
+        """
+        Remove a body from the incremental hash map. This only updates the hash map,
+        the body should also be removed from HashMap.bodies (a World does that on its own).
+
+        Args:
+            body (_Body): The body to remove
+        """
+        slot = self._slots.pop(id(body))
+        self._unlink(body, tuple(self._ranges[slot].tolist()))
+
+        # Move the last slot into the free one
+        last = len(self._tracked) - 1
+        if slot != last:
+            moved = self._tracked[last]
+            self._tracked[slot] = moved
+            self._ranges[slot] = self._ranges[last]
+            self._slots[id(moved)] = slot
+        self._tracked.pop()
+        self._rows = None
+        self._mark_synced()
+
+    def _mark_synced(self) -> None:
+        """Remember the state of HashMap.bodies, to notice when bodies are added or removed"""
+        if isinstance(self.bodies, World):
+            self._world_version = self.bodies._version
+        self._bodies_version = len(self.bodies)
+
+    def _sync(self) -> None:
+        """Insert or remove bodies, if HashMap.bodies has changed"""
+        if isinstance(self.bodies, World):
+            changed = self.bodies._version != self._world_version
+        else:
+            changed = len(self.bodies) != self._bodies_version
+        if not changed:
+            return
+
+        present = {id(body) for body in self.bodies}
+        for body in [body for body in self._tracked if id(body) not in present]:
+            self.remove(body)
+        for body in self.bodies:
+            if id(body) not in self._slots:
+                self.insert(body)
+        self._mark_synced()
+
+    def update(self) -> None:
+        """
+        Update the incremental hash map: the cells of all bodies are calculated with
+        array operations, but only the bodies whose cells changed are moved.
+        """
+        # Tune first, so new bodies are inserted with the grid size they will keep
+        self._tick_tuning()
+        self._sync()
+        if not self._tracked:
+            return
+
+        # The rows only change when bodies are added to or removed from their World
+        if (
+            self._rows is None
+            or self._world is None
+            or self._world._version != self._world_version_rows
+        ):
+            self._world, self._rows = World.collect(self._tracked)
+            self._world_version_rows = self._world._version
+        pos = self._world._pos[self._rows]
+        radius = self._world._radius[self._rows]
+
+        n = len(self._tracked)
+        new_ranges = _cell_ranges(pos, radius, self.grid_size)
+        moved = np.flatnonzero((new_ranges != self._ranges[:n]).any(axis=1))
+        for slot in moved.tolist():
+            body = self._tracked[slot]
+            self._unlink(body, tuple(self._ranges[slot].tolist()))
+            self._link(body, tuple(new_ranges[slot].tolist()))
+        self._ranges[moved] = new_ranges[moved]
+
+
+def array_pairs(
+    pos: np.ndarray, radius: np.ndarray, grid_size: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Every pair of bodies that share at least one cell, like HashMap.candidate_pairs,
+    for bodies that are only given as arrays (e.g. one region in pysics.parallel)
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the bodies
+        radius (np.ndarray): (N,) bounding box radii of the bodies
+        grid_size (float): The sidelength of one cell of the grid
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The indices i and j of the bodies of every pair,
+            with i < j, sorted by i and then j
+    """
+    if not len(pos):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    ranges = _cell_ranges(pos, radius, grid_size)
+    body_idx, cell_x, cell_y, offsets = _sorted_entries(ranges)
+    first = offsets[:-1]
+    return CellTable(
+        np.column_stack((cell_x[first], cell_y[first])), offsets, body_idx, ranges
+    ).pairs()
@@ -1,47 +1,125 @@
 """Useful math functions for linear algebra"""
 
 from __future__ import annotations
+import math
+from typing import Iterable, Iterator, Optional, overload
 import numpy as np
 
 
 class Vec2D:
     """
     2D vectors, for positions, rotations, velocities and accelerations of bodies.
+
+    The components are stored as two floats, x and y, and all operations use plain
+    float math, so working with single vectors doesn't allocate NumPy arrays.
+    The in-place operators (+=, -=, *=) change the vector itself.
     """
 
+    __slots__ = ("x", "y")
+
     def __init__(self, x: float, y: float):
         """
         Args:
             x (float): x component of the vector
             y (float): y component of the vector
         """
-        self.components = np.array([x, y])
+        self.x = float(x)
+        self.y = float(y)
+
+    @classmethod
+    def from_buffer(cls, buffer: np.ndarray) -> Vec2D:
+        """
+        Create a vector that shares its components with an existing array,
+        e.g. one row of a World's position array. Changing the vector changes the array.
+
+        Args:
+            buffer (np.ndarray): A float array of shape (2,)
+
+        Returns:
+            Vec2D: The vector backed by buffer
+        """
+        return _BufferVec2D(buffer)
+
+    @property
+    def components(self) -> np.ndarray:
+        """
+        The x and y components of the vector as an array. For vectors that are not
+        backed by a buffer, this is a new array whose item assignments are written
+        back to the vector (e.g. vec.components[0] -= 1), but it doesn't follow later
+        changes of the vector. Assigning to it sets both components.
+        """
+        return _Components.of(self)
+
+    @components.setter
+    def components(self, value) -> None:
+        self.x, self.y = float(value[0]), float(value[1])
 
     def __str__(self):
         return f"Vec2D: components: {self.components}, magnitude: {self.magnitude}"
 
+    def __repr__(self):
+        return f"Vec2D({self.x!r}, {self.y!r})"
+
     def __iter__(self):
         """
         Iterate over the magnitudes. Example usage (assuming vec is a Vec2D):
         sum(*vec) # does the same as
         sum(vec.components[0], vec.components[0])
         """
-        return iter(self.components)
+        yield self.x
+        yield self.y
 
     def __hash__(self):
-        return hash((self.components[0], self.components[1]))
+        return hash((self.x, self.y))
 
     def __eq__(self, other):
         if isinstance(other, Vec2D):
-            return self.components == other.components
+            return self.x == other.x and self.y == other.y
         return False
 
+    def __add__(self, other: Vec2D) -> Vec2D:
+        return Vec2D(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other: Vec2D) -> Vec2D:
+        return Vec2D(self.x - other.x, self.y - other.y)
+
+    def __mul__(self, scalar: float) -> Vec2D:
+        return Vec2D(self.x * scalar, self.y * scalar)
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> Vec2D:
+        return Vec2D(-self.x, -self.y)
+
+    def __iadd__(self, other: Vec2D) -> Vec2D:
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other: Vec2D) -> Vec2D:
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self, scalar: float) -> Vec2D:
+        self.x *= scalar
+        self.y *= scalar
+        return self
+
     @property
-    def magnitude(self):
+    def magnitude(self) -> float:
         """
         The self-updating magnitude of the vector
         """
-        return np.sqrt(np.sum(np.square(self.components)))
+        return math.hypot(self.x, self.y)
+
+    def dot(self, other_vec: Vec2D) -> float:
+        """The dot product of self and other_vec"""
+        return self.x * other_vec.x + self.y * other_vec.y
+
+    def cross(self, other_vec: Vec2D) -> float:
+        """The z component of the cross product of self and other_vec"""
+        return self.x * other_vec.y - self.y * other_vec.x
 
     def rotate(self, theta: float, deg: bool = False) -> None:
         """
@@ -52,13 +130,12 @@ class Vec2D:
             deg (bool): Whether or not to use degrees as unit. Default is radians.
         """
         if deg:
-            theta = theta * np.pi / 180
+            theta = theta * math.pi / 180
 
-        rot_matrix = np.array(
-            [[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]]
-        )
-
-        self.components = np.round(rot_matrix @ self.components, decimals=15)
+        cos, sin = math.cos(theta), math.sin(theta)
+        x, y = self.x, self.y
+        self.x = round(cos * x - sin * y, 15)
+        self.y = round(sin * x + cos * y, 15)
 
     def get_normal(self) -> Vec2D:
         """
@@ -67,7 +144,7 @@ class Vec2D:
         Returns:
             The normal vector to self
         """
-        return Vec2D(-self.components[1], self.components[0])
+        return Vec2D(-self.y, self.x)
 
     def add(self, *other_vec: Vec2D) -> None:
         """
@@ -77,34 +154,40 @@ class Vec2D:
             *other_vec (Vec2D): All the vectors that should be added to self.components
         """
         for vec in other_vec:
-            self.components += vec.components
+            self += vec
+
+    def _cos_angle(self, x: float, y: float, magnitude: float) -> float:
+        """The cosine of the angle between self and the vector (x, y), clipped to [-1, 1]"""
+        magnitudes_product = self.magnitude * magnitude
+        if magnitudes_product == 0:
+            return math.nan
+        return min(max((self.x * x + self.y * y) / magnitudes_product, -1.0), 1.0)
 
     def angle(self, other_vec: Vec2D, deg: bool = False) -> float:
         """
         Calculate the angle between self.components and other_vec.components
         Formats the output as degree if deg=True is specified, uses radian by default.
+        The angle is nan if one of the vectors has no length.
 
         Args:
             other_vec (Vec2D): The secondary vector which the angle should be taken from
             deg (bool): Whether or not to convert the result from radians to degrees
         """
-        dot_product = np.dot(self.components, other_vec.components)
-        magnitudes_product = self.magnitude * other_vec.magnitude
+        angle = math.acos(self._cos_angle(other_vec.x, other_vec.y, other_vec.magnitude))
 
         if deg:
-            return np.round(np.arccos(dot_product / magnitudes_product) * 180 / np.pi, decimals=14)
+            return round(angle * 180 / math.pi, 14)
 
-        return np.arccos(dot_product / magnitudes_product)
+        return angle
 
     def world_angle(self, deg: bool = False):
         """Calculate the angle relative to the x-axis (which i define to be the world angle)"""
-        if self.components[1] < 0:
-            if deg:
-                return self.angle(Vec2D(1, 0), deg)
-            return self.angle(Vec2D(1, 0))
+        angle = math.acos(self._cos_angle(1.0, 0.0, 1.0))
         if deg:
-            return 360 - self.angle(Vec2D(1, 0), deg)
-        return 2 * np.pi - self.angle(Vec2D(1, 0))
+            angle = round(angle * 180 / math.pi, 14)
+        if self.y < 0:
+            return angle
+        return (360 if deg else 2 * math.pi) - angle
 
     def normalize(self) -> Vec2D:
         """
@@ -113,6 +196,282 @@ class Vec2D:
         Returns:
             Vec2D: The normalized vector
         """
-        if self.magnitude == 0:
+        magnitude = self.magnitude
+        if magnitude == 0:
             return Vec2D(0, 0)
-        return Vec2D(*(self.components / self.magnitude))
+        return Vec2D(self.x / magnitude, self.y / magnitude)
+
+
+class _BufferVec2D(Vec2D):
+    """
+    A Vec2D whose components live in an array (see Vec2D.from_buffer),
+    e.g. the position of a body inside of its World
+    """
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self, buffer: np.ndarray):  # pylint: disable=super-init-not-called
+        self._buffer = buffer
+
+    @property  # type: ignore[override]
+    def x(self) -> float:
+        """x component of the vector"""
+        return float(self._buffer[0])
+
+    @x.setter
+    def x(self, value: float) -> None:
+        self._buffer[0] = value
+
+    @property  # type: ignore[override]
+    def y(self) -> float:
+        """y component of the vector"""
+        return float(self._buffer[1])
+
+    @y.setter
+    def y(self, value: float) -> None:
+        self._buffer[1] = value
+
+    @property
+    def components(self) -> np.ndarray:
+        """
+        The x and y components of the vector: the buffer itself, so changing it
+        changes the vector. Assigning to it copies the new values into the buffer.
+        """
+        return self._buffer
+
+    @components.setter
+    def components(self, value) -> None:
+        self._buffer[:] = value
+
+    def __iadd__(self, other: Vec2D) -> Vec2D:
+        self._buffer += (other.x, other.y)
+        return self
+
+    def __isub__(self, other: Vec2D) -> Vec2D:
+        self._buffer -= (other.x, other.y)
+        return self
+
+    def __imul__(self, scalar: float) -> Vec2D:
+        self._buffer *= scalar
+        return self
+
+
+class _Components(np.ndarray):
+    """
+    The components of a plain Vec2D (see Vec2D.components). Setting items of the array,
+    or of a view of it, also sets the components of the vector.
+    """
+
+    _vec: Optional[Vec2D]
+    _root: Optional[np.ndarray]
+
+    @classmethod
+    def of(cls, vec: Vec2D) -> _Components:
+        """A new array with the components of vec, which writes its items back to vec"""
+        array = np.array((vec.x, vec.y)).view(cls)
+        array._vec, array._root = vec, array
+        return array
+
+    def __array_finalize__(self, obj) -> None:
+        self._vec = getattr(obj, "_vec", None)
+        self._root = getattr(obj, "_root", None)
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        root = self._root
+        # Results of operations (e.g. components * 2) don't share the memory of the vector
+        if self._vec is not None and root is not None and np.may_share_memory(self, root):
+            self._vec.x, self._vec.y = float(root[0]), float(root[1])
+
+
+class Vec2DArray:
+    """
+    Many 2D vectors in one (N, 2) float array, with the operations of Vec2D
+    applied to all of them at once.
+
+    Creating a Vec2DArray from a float array doesn't copy it, e.g.
+    Vec2DArray(world.pos) is a view into the positions of a World's bodies,
+    and the in-place operations (rotate, +=, -=, *=) change the array itself.
+    """
+
+    __slots__ = ("components",)
+
+    def __init__(self, components):
+        """
+        Args:
+            components (ArrayLike): The vectors, with shape (N, 2)
+        """
+        components = np.asarray(components, dtype=float)
+        if components.size == 0:
+            components = components.reshape(0, 2)
+        if components.ndim != 2 or components.shape[1] != 2:
+            raise ValueError(
+                f"Expected an array of shape (N, 2), got shape {components.shape}"
+            )
+        self.components: np.ndarray = components
+
+    @classmethod
+    def from_vectors(cls, vectors: Iterable[Vec2D]) -> Vec2DArray:
+        """
+        Args:
+            vectors (Iterable[Vec2D]): The vectors to copy
+
+        Returns:
+            Vec2DArray: A new array of the vectors
+        """
+        return cls([(vec.x, vec.y) for vec in vectors])
+
+    def __str__(self):
+        return f"Vec2DArray: {len(self)} vectors\n{self.components}"
+
+    def __repr__(self):
+        return f"Vec2DArray({self.components.tolist()!r})"
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def __iter__(self) -> Iterator[Vec2D]:
+        """Iterate over the vectors, as views into the array"""
+        for row in self.components:
+            yield Vec2D.from_buffer(row)
+
+    @overload
+    def __getitem__(self, index: int) -> Vec2D: ...
+
+    @overload
+    def __getitem__(self, index: slice | np.ndarray) -> Vec2DArray: ...
+
+    def __getitem__(self, index):
+        """A vector (for an integer index) or a Vec2DArray of the selected vectors"""
+        if isinstance(index, (int, np.integer)):
+            return Vec2D.from_buffer(self.components[index])
+        return Vec2DArray(self.components[index])
+
+    @staticmethod
+    def _other(other: Vec2DArray | Vec2D) -> np.ndarray:
+        """The components of other, ready to be broadcast against an (N, 2) array"""
+        if isinstance(other, Vec2DArray):
+            return other.components
+        return np.array((other.x, other.y))
+
+    def __add__(self, other: Vec2DArray | Vec2D) -> Vec2DArray:
+        return Vec2DArray(self.components + self._other(other))
+
+    def __sub__(self, other: Vec2DArray | Vec2D) -> Vec2DArray:
+        return Vec2DArray(self.components - self._other(other))
+
+    def __mul__(self, scalar) -> Vec2DArray:
+        """Scale the vectors by a scalar or by one factor per vector"""
+        return Vec2DArray(self.components * self._factors(scalar))
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> Vec2DArray:
+        return Vec2DArray(-self.components)
+
+    def __iadd__(self, other: Vec2DArray | Vec2D) -> Vec2DArray:
+        self.components += self._other(other)
+        return self
+
+    def __isub__(self, other: Vec2DArray | Vec2D) -> Vec2DArray:
+        self.components -= self._other(other)
+        return self
+
+    def __imul__(self, scalar) -> Vec2DArray:
+        self.components *= self._factors(scalar)
+        return self
+
+    @staticmethod
+    def _factors(scalar) -> np.ndarray:
+        """A scalar, or one factor per vector as an (N, 1) array"""
+        scalar = np.asarray(scalar, dtype=float)
+        return scalar[:, np.newaxis] if scalar.ndim == 1 else scalar
+
+    @property
+    def x(self) -> np.ndarray:
+        """The x components (a view)"""
+        return self.components[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        """The y components (a view)"""
+        return self.components[:, 1]
+
+    @property
+    def magnitude(self) -> np.ndarray:
+        """The magnitudes of the vectors, shape (N,)"""
+        return np.hypot(self.components[:, 0], self.components[:, 1])
+
+    def dot(self, other_vec: Vec2DArray | Vec2D) -> np.ndarray:
+        """
+        The dot products with other_vec, shape (N,).
+        other_vec is either one vector for all of them or a Vec2DArray of the same length.
+        """
+        other = self._other(other_vec)
+        return self.components[:, 0] * other[..., 0] + self.components[:, 1] * other[..., 1]
+
+    def cross(self, other_vec: Vec2DArray | Vec2D) -> np.ndarray:
+        """The z components of the cross products with other_vec, shape (N,)"""
+        other = self._other(other_vec)
+        return self.components[:, 0] * other[..., 1] - self.components[:, 1] * other[..., 0]
+
+    def rotate(self, theta, deg: bool = False) -> None:
+        """
+        Rotate every vector by theta radians / degrees (in place)
+
+        Args:
+            theta (float | np.ndarray): One angle for all vectors, or one angle per vector
+            deg (bool): Whether or not to use degrees as unit. Default is radians.
+        """
+        theta = np.asarray(theta, dtype=float)
+        if deg:
+            theta = theta * np.pi / 180
+
+        cos, sin = np.cos(theta), np.sin(theta)
+        x, y = self.components[:, 0].copy(), self.components[:, 1].copy()
+        self.components[:, 0] = np.round(cos * x - sin * y, decimals=15)
+        self.components[:, 1] = np.round(sin * x + cos * y, decimals=15)
+
+    def get_normal(self) -> Vec2DArray:
+        """
+        Returns:
+            Vec2DArray: The normal vectors (a PI/2 rotation of every vector)
+        """
+        return Vec2DArray(np.column_stack((-self.components[:, 1], self.components[:, 0])))
+
+    def normalize(self) -> Vec2DArray:
+        """
+        Returns:
+            Vec2DArray: The unit vectors. Vectors without a length stay (0, 0).
+        """
+        magnitude = self.magnitude
+        unit = np.zeros_like(self.components)
+        nonzero = magnitude > 0
+        unit[nonzero] = self.components[nonzero] / magnitude[nonzero, np.newaxis]
+        return Vec2DArray(unit)
+
+    def angle(self, other_vec: Vec2DArray | Vec2D, deg: bool = False) -> np.ndarray:
+        """
+        The angles between the vectors and other_vec, shape (N,).
+        The angle is nan where one of the vectors has no length.
+
+        Args:
+            other_vec (Vec2DArray | Vec2D): One vector for all of them,
+                or a Vec2DArray of the same length
+            deg (bool): Whether or not to convert the result from radians to degrees
+        """
+        other = self._other(other_vec)
+        magnitudes_product = self.magnitude * np.hypot(other[..., 0], other[..., 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cos = np.clip(self.dot(other_vec) / magnitudes_product, -1.0, 1.0)
+        angle = np.where(magnitudes_product == 0, np.nan, np.arccos(cos))
+
+        if deg:
+            return np.round(angle * 180 / np.pi, decimals=14)
+
+        return angle
+
+    def world_angle(self, deg: bool = False) -> np.ndarray:
+        """The angles relative to the x-axis, like Vec2D.world_angle, shape (N,)"""
+        angle = self.angle(Vec2D(1, 0), deg)
+        return np.where(self.components[:, 1] < 0, angle, (360 if deg else 2 * np.pi) - angle)
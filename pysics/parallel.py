@@ -0,0 +1,322 @@
+"""
+Multi-core stepping of large worlds of balls. The world is split into vertical strips
+(regions) with about the same number of bodies, and the broadphase, narrow phase and
+integration of every region run in a pool of processes. The arrays of the World are moved
+into shared memory, so the processes read and write them without copying.
+
+A body belongs to the region that contains its center. Bodies near the border of a region
+are ghosts (the halo) in the neighbouring region: they take part in its collisions, but
+only the region they belong to integrates them. Every colliding pair is resolved by the
+region of its first body, and the responses for ghosts are sent back to the main process,
+which adds them up.
+
+A step has two phases, and every phase is run by all regions at once:
+    1. collide: find the colliding pairs and sum up their responses (like BallCollider)
+    2. integrate: apply the responses and update the bodies (like World.step)
+
+Example usage:
+    with pysics.ParallelStepper(world, workers=16) as stepper:
+        stepper.step(600)
+"""
+
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Optional
+import numpy as np
+from . import profiling
+from .hash_map import array_pairs, bounding_circle_filter
+from .temp_ball_collision import resolve_ball_pairs
+from .world import World
+
+# name -> (shared memory name, shape, dtype) of every shared array
+_Spec = dict[str, tuple[str, tuple[int, ...], str]]
+
+# The World arrays that the regions use
+_WORLD_ARRAYS = ("_pos", "_vel", "_accel", "_m", "_radius", "_dt")
+
+# The shared memory blocks a worker process is attached to, by their name
+_attached: dict[str, tuple[SharedMemory, np.ndarray]] = {}
+
+
+def _attach(spec: _Spec) -> dict[str, np.ndarray]:
+    """The shared arrays in a worker process, attaching to new blocks as needed"""
+    current = {block for block, _, _ in spec.values()}
+    for block in [block for block in _attached if block not in current]:
+        _attached.pop(block)[0].close()
+
+    arrays = {}
+    for name, (block, shape, dtype) in spec.items():
+        if block not in _attached:
+            shm = SharedMemory(name=block)
+            _attached[block] = (shm, np.ndarray(shape, dtype, buffer=shm.buf))
+        arrays[name] = _attached[block][1]
+    return arrays
+
+
+def _run(function: Callable[..., Any], spec: _Spec, n: int, args: tuple) -> Any:
+    """Run the task of a region in a worker process"""
+    return function(_attach(spec), n, *args)
+
+
+def _collide_region(
+    arrays: dict[str, np.ndarray],
+    n: int,
+    region: int,
+    low: float,
+    high: float,
+    halo: float,
+    grid_size: float,
+    restitution: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Resolve the collisions of the pairs whose first body belongs to the region. The
+    responses of the region's bodies are stored in the shared delta arrays.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, int]: The rows of the ghosts that were
+            hit, their position and velocity changes and the number of colliding pairs
+    """
+    pos, vel = arrays["_pos"][:n], arrays["_vel"][:n]
+    x = np.nan_to_num(pos[:, 0], nan=0.0)
+    local = np.flatnonzero((x >= low - halo) & (x < high + halo))
+    owned = (x[local] >= low) & (x[local] < high)
+    arrays["region"][local[owned]] = region
+
+    local_pos, local_vel, local_r = pos[local], vel[local], arrays["_radius"][local]
+    i, j = array_pairs(local_pos, local_r, grid_size)
+    i, j = bounding_circle_filter(local_pos, local_r, i, j)
+    # local is sorted, so i < j also holds for the rows
+    keep = owned[i]
+    i, j = i[keep], j[keep]
+
+    new_pos, new_vel = local_pos.copy(), local_vel.copy()
+    colliding = resolve_ball_pairs(
+        new_pos, new_vel, arrays["_m"][local], local_r, i, j, restitution
+    )
+    dpos, dvel = new_pos - local_pos, new_vel - local_vel
+    arrays["dpos"][local[owned]] = dpos[owned]
+    arrays["dvel"][local[owned]] = dvel[owned]
+
+    hit_ghosts = ~owned & ((dpos != 0) | (dvel != 0)).any(axis=1)
+    return (
+        local[hit_ghosts],
+        dpos[hit_ghosts],
+        dvel[hit_ghosts],
+        int(np.count_nonzero(colliding)),
+    )
+
+
+def _integrate_region(
+    arrays: dict[str, np.ndarray],
+    n: int,
+    region: int,
+    seconds: Optional[float],
+    bounds: Optional[tuple[float, float]],
+) -> None:
+    """Apply the collision responses to the bodies of the region and integrate them"""
+    rows = np.flatnonzero(arrays["region"][:n] == region)
+    dpos, dvel = arrays["dpos"], arrays["dvel"]
+    pos = arrays["_pos"][rows] + dpos[rows]
+    vel = arrays["_vel"][rows] + dvel[rows]
+    dpos[rows] = 0
+    dvel[rows] = 0
+    if seconds is None:
+        dt = arrays["_dt"][rows, np.newaxis]
+    else:
+        dt = np.full((len(rows), 1), 1 / seconds)
+
+    vel += arrays["_accel"][rows] * 50 / dt
+    pos += vel * 50 / dt
+    if bounds is not None:
+        r = arrays["_radius"][rows]
+        for axis, length in enumerate(bounds):
+            outside = (pos[:, axis] - r < 0) | (pos[:, axis] + r > length)
+            vel[outside, axis] *= -1
+    arrays["_pos"][rows] = pos
+    arrays["_vel"][rows] = vel
+
+
+class ParallelStepper:
+    """
+    Steps a World of balls (collisions and integration) on several processes at once.
+    A step gives the same results as BallCollider.collide() followed by World.step(),
+    up to the rounding of the summed responses.
+
+    While the stepper is open, the arrays of the World live in shared memory. The World
+    can be used as usual in between the steps (e.g. for drawing, or to add bodies).
+    Rotation, continuous collision detection and sleeping bodies are not supported.
+
+    Methods:
+        step: Run a number of steps
+        close: Stop the processes and move the arrays of the World out of shared memory
+    """
+
+    def __init__(
+        self,
+        world: World,
+        workers: Optional[int] = None,
+        regions: Optional[int] = None,
+        grid_size: Optional[float] = None,
+        restitution: float = 1.0,
+        rebalance_interval: int = 30,
+    ):
+        """
+        Args:
+            world (World): The world of balls
+            workers (Optional[int]): The number of processes, one per CPU by default.
+                With one worker, the regions are stepped in this process.
+            regions (Optional[int]): The number of strips, one per worker by default
+            grid_size (Optional[float]): The grid size of the hash maps of the regions.
+                Twice the size of most balls (the 90th percentile of their radii)
+                if the argument is omitted.
+            restitution (float): 1 for fully elastic collisions, 0 for fully inelastic ones
+            rebalance_interval (int): Every how many steps the borders of the regions are
+                moved, so every region has about the same number of bodies
+        """
+        self.world = world
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.regions = regions if regions is not None else self.workers
+        self.grid_size = grid_size
+        self.restitution = restitution
+        self.rebalance_interval = rebalance_interval
+
+        self._blocks: dict[str, tuple[SharedMemory, np.ndarray]] = {}
+        self._edges = np.array([-np.inf, np.inf])
+        self._region_grid_size = 1.0
+        self._steps_since_rebalance = rebalance_interval
+        self._executor: Optional[ProcessPoolExecutor] = (
+            ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        )
+
+    def __repr__(self) -> str:
+        return f"< ParallelStepper ({self.workers} workers, {self.regions} regions) >"
+
+    def __enter__(self) -> ParallelStepper:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _allocate(self, name: str, array: np.ndarray) -> np.ndarray:
+        """Copy an array into a new shared memory block, replacing the old block"""
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared: np.ndarray = np.ndarray(array.shape, array.dtype, buffer=shm.buf)
+        shared[:] = array
+        self._release(name)
+        self._blocks[name] = (shm, shared)
+        return shared
+
+    def _release(self, name: str) -> None:
+        if name not in self._blocks:
+            return
+        shm, _ = self._blocks.pop(name)
+        try:
+            shm.close()
+        except BufferError:
+            pass  # Someone still has a view of the array, it is freed with the view
+        shm.unlink()
+
+    def _share(self) -> _Spec:
+        """Move the arrays of the World into shared memory (again, if the World grew)"""
+        world = self.world
+        for name in _WORLD_ARRAYS:
+            array = getattr(world, name)
+            if name not in self._blocks or self._blocks[name][1] is not array:
+                setattr(world, name, self._allocate(name, array))
+        if "dpos" not in self._blocks or len(self._blocks["dpos"][1]) != world.capacity:
+            self._allocate("dpos", np.zeros((world.capacity, 2)))
+            self._allocate("dvel", np.zeros((world.capacity, 2)))
+            self._allocate("region", np.full(world.capacity, -1, dtype=np.int64))
+        return {
+            name: (shm.name, shared.shape, shared.dtype.str)
+            for name, (shm, shared) in self._blocks.items()
+        }
+
+    def _rebalance(self) -> None:
+        """Move the borders of the regions to quantiles of the x coordinates"""
+        self._steps_since_rebalance += 1
+        if self._steps_since_rebalance < self.rebalance_interval:
+            return
+        self._steps_since_rebalance = 0
+        world = self.world
+        x = np.nan_to_num(world.pos[:, 0], nan=0.0)
+        edges = np.quantile(x, np.linspace(0, 1, self.regions + 1))
+        edges[0], edges[-1] = -np.inf, np.inf
+        self._edges = edges
+        if self.grid_size is not None:
+            self._region_grid_size = self.grid_size
+        else:
+            self._region_grid_size = 2 * float(np.percentile(world.radius, 90)) or 1.0
+
+    def _map(self, function: Callable[..., Any], spec: _Spec, n: int, tasks: list) -> list:
+        """Run the task of every region, in the pool or (with one worker) in this process"""
+        if self._executor is None:
+            arrays = {name: shared for name, (_, shared) in self._blocks.items()}
+            return [function(arrays, n, *args) for args in tasks]
+        return list(self._executor.map(_run, repeat(function), repeat(spec), repeat(n), tasks))
+
+    def step(
+        self, n_steps: int = 1, wall_collision: bool = True, seconds: Optional[float] = None
+    ) -> None:
+        """
+        Run a number of steps, each the collisions of all balls and the integration
+
+        Args:
+            n_steps (int): The number of steps
+            wall_collision (bool): Whether the balls bounce off the walls
+            seconds (Optional[float]): The simulated time of every step (see World.step)
+        """
+        world = self.world
+        n = len(world)
+        if not n:
+            return
+        if not world.is_ball.all():
+            raise TypeError("All bodies must be pysics.body.Ball objects")
+        if world.ccd.any() or world.sleep_threshold is not None:
+            raise ValueError("Continuous collision detection and sleeping bodies are not supported")
+
+        spec = self._share()
+        bounds = (world.coord_sys.x_tot, world.coord_sys.y_tot) if wall_collision else None
+        dpos, dvel = self._blocks["dpos"][1], self._blocks["dvel"][1]
+        # Two balls can only collide if their centers are closer than twice the largest radius
+        halo = 2 * float(world.radius.max())
+        for _ in range(n_steps):
+            self._rebalance()
+            edges = self._edges.tolist()
+            with profiling.phase("collide"):
+                results = self._map(
+                    _collide_region,
+                    spec,
+                    n,
+                    [
+                        (k, edges[k], edges[k + 1], halo, self._region_grid_size, self.restitution)
+                        for k in range(self.regions)
+                    ],
+                )
+                collisions = 0
+                for rows, ghost_dpos, ghost_dvel, count in results:
+                    np.add.at(dpos, rows, ghost_dpos)
+                    np.add.at(dvel, rows, ghost_dvel)
+                    collisions += count
+                profiling.count("collisions", collisions)
+            with profiling.phase("integrate"):
+                self._map(
+                    _integrate_region,
+                    spec,
+                    n,
+                    [(k, seconds, bounds) for k in range(self.regions)],
+                )
+
+    def close(self) -> None:
+        """Stop the processes and move the arrays of the World back into normal memory"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for name in _WORLD_ARRAYS:
+            if name in self._blocks and getattr(self.world, name) is self._blocks[name][1]:
+                setattr(self.world, name, self._blocks[name][1].copy())
+        for name in list(self._blocks):
+            self._release(name)
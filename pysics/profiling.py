@@ -0,0 +1,250 @@
+"""
+Low overhead instrumentation of the engine phases (hash map, pair generation, collisions,
+integration and drawing). Nothing is measured until a Profiler is enabled; while it is
+disabled, every instrumented function only pays for one check of a global variable.
+
+Example usage:
+    profiler = pysics.profiling.enable(pysics.Profiler(dump_interval=120))
+    while running:
+        ...
+        with pysics.profiling.phase("draw"):
+            for ball in world:
+                ball.draw(screen)
+        profiler.end_frame()
+"""
+
+from __future__ import annotations
+import gc
+import json
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Callable, ContextManager, Optional, TypeVar
+import numpy as np
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+# The enabled profiler, None while profiling is disabled
+_profiler: Optional[Profiler] = None
+_NO_PHASE = nullcontext()
+
+
+class _Phase:
+    """
+    Context manager that adds the time spent inside of it to a phase.
+    If a phase is entered again before it is exited (e.g. by a recursive call),
+    only the outermost entry is measured.
+    """
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+        self.depth = 0
+
+    def __enter__(self) -> None:
+        if self.depth == 0:
+            self.start = time.perf_counter()
+        self.depth += 1
+
+    def __exit__(self, *exc_info) -> None:
+        self.depth -= 1
+        if self.depth == 0:
+            frame = self.profiler._frame_times
+            frame[self.name] = frame.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class Profiler:
+    """
+    Rolling statistics of the engine phases over the last frames: the time spent in
+    every phase, counters (e.g. candidate pairs and collisions), the cell occupancy
+    histogram of the last hash map, the change of the number of allocated memory blocks
+    (which is about 0 at a steady state, however much a frame allocates temporarily) and
+    the garbage collections per frame.
+    Phases can be nested, e.g. the time of "collide" includes "pairs".
+
+    Methods:
+        phase: Context manager which measures the time of a phase
+        count: Add to a counter of the current frame
+        histogram: Store a histogram of the current frame
+        end_frame: Finish the current frame (and dump the summary if it's time to)
+        summary: The statistics of the last frames
+    """
+
+    def __init__(
+        self,
+        window: int = 120,
+        dump_interval: Optional[int] = None,
+        dump: Optional[Callable[[dict], None]] = None,
+    ):
+        """
+        Args:
+            window (int): Over how many frames the statistics are calculated
+            dump_interval (Optional[int]): Dump the summary every dump_interval frames.
+                No summary is dumped if the argument is omitted.
+            dump (Optional[Callable[[dict], None]]): Called with the summary when it is
+                dumped. The summary is printed as JSON if the argument is omitted.
+        """
+        self.window = window
+        self.dump_interval = dump_interval
+        self.dump = dump if dump is not None else Profiler._print_summary
+        self.frames = 0
+
+        self._phases: dict[str, _Phase] = {}
+        self._frame_times: dict[str, float] = {}
+        self._frame_counts: dict[str, float] = {}
+        self.histograms: dict[str, np.ndarray] = {}
+
+        self.times: dict[str, deque[float]] = {}
+        self.counts: dict[str, deque[float]] = {}
+        self.net_allocated_blocks: deque[int] = deque(maxlen=window)
+        self.garbage_collections: deque[int] = deque(maxlen=window)
+        self._blocks = sys.getallocatedblocks()
+        self._collections = self._total_collections()
+
+    @staticmethod
+    def _total_collections() -> int:
+        return sum(generation["collections"] for generation in gc.get_stats())
+
+    @staticmethod
+    def _print_summary(summary: dict) -> None:
+        print(json.dumps(summary))
+
+    def phase(self, name: str) -> ContextManager[None]:
+        """
+        Args:
+            name (str): The name of the phase
+
+        Returns:
+            ContextManager[None]: Measures the time spent inside of it
+        """
+        if name not in self._phases:
+            self._phases[name] = _Phase(self, name)
+        return self._phases[name]
+
+    def count(self, name: str, value: float) -> None:
+        """Add value to the counter name of the current frame"""
+        self._frame_counts[name] = self._frame_counts.get(name, 0) + value
+
+    def histogram(self, name: str, values: np.ndarray) -> None:
+        """Store the histogram name of the current frame (replacing older ones)"""
+        self.histograms[name] = values
+
+    def end_frame(self) -> None:
+        """Move the measurements of the current frame into the rolling statistics"""
+        for name in self._frame_times:
+            self.times.setdefault(name, deque(maxlen=self.window))
+        for name, times in self.times.items():
+            times.append(self._frame_times.get(name, 0.0))
+        for name in self._frame_counts:
+            self.counts.setdefault(name, deque(maxlen=self.window))
+        for name, values in self.counts.items():
+            values.append(self._frame_counts.get(name, 0))
+        self._frame_times = {}
+        self._frame_counts = {}
+
+        blocks = sys.getallocatedblocks()
+        collections = self._total_collections()
+        self.net_allocated_blocks.append(blocks - self._blocks)
+        self.garbage_collections.append(collections - self._collections)
+        self._blocks, self._collections = blocks, collections
+
+        self.frames += 1
+        if self.dump_interval and self.frames % self.dump_interval == 0:
+            self.dump(self.summary())
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: The mean, maximum and last time (in milliseconds) of every phase, the
+                mean and last value of every counter, the histograms and the mean change of
+                the allocated memory blocks and garbage collections per frame
+        """
+        return {
+            "frames": self.frames,
+            "phases_ms": {
+                name: {
+                    "mean": 1000 * float(np.mean(times)),
+                    "max": 1000 * max(times),
+                    "last": 1000 * times[-1],
+                }
+                for name, times in self.times.items()
+                if times
+            },
+            "counts": {
+                name: {"mean": float(np.mean(values)), "last": values[-1]}
+                for name, values in self.counts.items()
+                if values
+            },
+            "histograms": {name: values.tolist() for name, values in self.histograms.items()},
+            "memory": {
+                "net_allocated_blocks_per_frame": (
+                    float(np.mean(self.net_allocated_blocks))
+                    if self.net_allocated_blocks
+                    else 0.0
+                ),
+                "gc_collections_per_frame": (
+                    float(np.mean(self.garbage_collections))
+                    if self.garbage_collections
+                    else 0.0
+                ),
+            },
+        }
+
+
+def enable(profiler: Optional[Profiler] = None) -> Profiler:
+    """
+    Start measuring the engine phases
+
+    Args:
+        profiler (Optional[Profiler]): The profiler to use. A new one is
+            created if the argument is omitted.
+
+    Returns:
+        Profiler: The enabled profiler
+    """
+    global _profiler  # pylint: disable=global-statement
+    _profiler = profiler if profiler is not None else Profiler()
+    return _profiler
+
+
+def disable() -> None:
+    """Stop measuring the engine phases"""
+    global _profiler  # pylint: disable=global-statement
+    _profiler = None
+
+
+def active() -> Optional[Profiler]:
+    """The enabled profiler, or None while profiling is disabled"""
+    return _profiler
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Measure the time of a phase, if profiling is enabled"""
+    if _profiler is None:
+        return _NO_PHASE
+    return _profiler.phase(name)
+
+
+def count(name: str, value: float) -> None:
+    """Add value to a counter of the current frame, if profiling is enabled"""
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+def timed(name: str) -> Callable[[_F], _F]:
+    """Decorator that measures every call of a function as the phase name"""
+
+    def decorator(function: _F) -> _F:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+            with _profiler.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
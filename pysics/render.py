@@ -0,0 +1,433 @@
+"""
+Drawing of bodies and coordinate systems on a pygame screen. This is the only part of
+pysics that needs pygame, it is only imported when something is drawn.
+"""
+
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Protocol, Sequence, Union
+import numpy as np
+import pygame
+from .body import _Body, Ball, Polygon
+from .coordinate_system import CoordSys
+from .world import World
+
+# The renderer draws straight from the arrays of the World
+# pylint: disable=protected-access
+
+
+def draw_ball(ball: Ball, screen: pygame.Surface) -> None:
+    """Draw a ball at it's position on the pygame screen"""
+    pygame.draw.circle(
+        screen,
+        ball.col,
+        ball.coord_sys.coord(*ball.pos),
+        ball.coord_sys.distance(ball.r),
+    )
+
+
+def draw_polygon(polygon: Polygon, screen: pygame.Surface) -> None:
+    """Draw a polygon at it's position (and with it's orientation) on the pygame screen"""
+    vertices, _, _ = polygon.world_shape()
+    pygame.draw.polygon(screen, polygon.col, polygon.coord_sys.coords(vertices).tolist())
+
+
+def paint_borders(coord_sys: CoordSys) -> None:
+    """Draw borders on the pygame screen to mark the coordinate system"""
+    _, w, h, x_off, y_off = coord_sys._dimensions()
+    # Draw the borders to the left and right
+    pygame.draw.rect(
+        coord_sys.display,
+        (0, 0, 0),
+        (0, 0, x_off, h),
+    )
+    pygame.draw.rect(
+        coord_sys.display,
+        (0, 0, 0),
+        (
+            w - x_off,
+            0,
+            x_off,
+            h,
+        ),
+    )
+
+    # Draw the borders to the top and bottom
+    pygame.draw.rect(
+        coord_sys.display,
+        (0, 0, 0),
+        (0, 0, w, y_off),
+    )
+    pygame.draw.rect(
+        coord_sys.display,
+        (0, 0, 0),
+        (
+            0,
+            h - y_off,
+            w,
+            y_off,
+        ),
+    )
+
+
+class SpatialIndex(Protocol):  # pylint: disable=too-few-public-methods
+    """A broadphase that can find the bodies in a rectangle (HashMap, SweepAndPrune, AABBTree)"""
+
+    def query(self, low: Sequence[float], high: Sequence[float]) -> np.ndarray: ...
+
+
+class _Layout(NamedTuple):
+    """Where the bodies of one frame are drawn on the screen"""
+
+    world: World
+    positions: np.ndarray  # indices (into the drawn bodies) of the laid out bodies
+    rows: np.ndarray  # their rows in world
+    is_ball: np.ndarray
+    rects: np.ndarray  # (N, 4) x, y, width and height on the screen
+    visible: np.ndarray
+    col: np.ndarray
+    polygons: dict[int, list]  # layout index -> screen vertices of every polygon
+
+
+class Renderer:
+    """
+    Draw many bodies at once. Balls are pre-rendered as sprites, which are kept in a
+    least recently used cache keyed by (radius in pixels, color), and all balls are
+    drawn with a single Surface.blits() call. The screen positions of all bodies are
+    calculated with one CoordSys.coords() call. Bodies that are not on the screen
+    are skipped, and a spatial index (HashMap, SweepAndPrune or AABBTree)
+    can be used to find the visible ones.
+
+    draw_dirty() only redraws the parts of the screen where bodies moved, and returns
+    them for pygame.display.update(rects), so mostly resting scenes are cheap to draw:
+        while running:
+            ...
+            pygame.display.update(renderer.draw_dirty(screen, world, background))
+
+    Methods:
+        draw: Draw bodies on the pygame screen
+        draw_dirty: Only redraw the regions of the screen that changed
+        clear_cache: Forget every sprite and reset the cache statistics
+        stats: The cache statistics
+    """
+
+    def __init__(self, cache_size: int = 256, tile_size: int = 32, max_dirty_share: float = 0.5):
+        """
+        Args:
+            cache_size (int): How many sprites are kept at most
+            tile_size (int): draw_dirty() tracks changes in square tiles of this many pixels
+            max_dirty_share (float): If a larger share of the tiles changed,
+                draw_dirty() redraws the whole screen
+        """
+        self.cache_size = cache_size
+        self.tile_size = tile_size
+        self.max_dirty_share = max_dirty_share
+        self._sprites: OrderedDict[tuple[int, tuple[int, ...]], pygame.Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # The state of the last draw_dirty() call: a key and where every body was drawn
+        self._last: Optional[tuple] = None
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of balls that were drawn with a cached sprite"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float]:
+        """
+        Returns:
+            dict[str, float]: The number of cache hits, misses, sprites and the hit rate
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sprites": len(self._sprites),
+            "hit_rate": self.hit_rate,
+        }
+
+    def clear_cache(self) -> None:
+        """Forget every sprite and reset the cache statistics"""
+        self._sprites.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _sprite(self, radius: int, col: tuple[int, ...]) -> pygame.Surface:
+        """The sprite of a ball, rendered if it is not cached"""
+        key = (radius, col)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        sprite = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, col, (radius, radius), radius)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.cache_size:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def _layout(
+        self, screen: pygame.Surface, bodies: Sequence[_Body] | World, index: Optional[SpatialIndex]
+    ) -> _Layout:
+        """
+        Calculate where the bodies are drawn. With an index, only the balls it finds
+        in the visible region are laid out (polygons always are).
+        """
+        world, rows = World.collect(bodies)
+        coord_sys = bodies[0].coord_sys
+        # All rows of the World, in order: use views instead of copies
+        whole_world = rows is None and index is None
+        if index is not None:
+            if rows is None:
+                rows = np.arange(len(world))
+            low_x, low_y, high_x, high_y = coord_sys.visible_region()
+            in_view = index.query((low_x, low_y), (high_x, high_y))
+            positions = np.union1d(in_view, np.flatnonzero(~world._is_ball[rows]))
+            rows = rows[positions]
+        elif rows is None:
+            positions = rows = np.arange(len(world))
+        else:
+            positions = np.arange(len(rows))
+
+        def take(array: np.ndarray) -> np.ndarray:
+            return array[: len(world)] if whole_world else array[rows]
+
+        is_ball = take(world._is_ball)
+        radius = np.rint(coord_sys.distances(take(world._radius))).astype(np.int64)
+        rects = np.empty((len(rows), 4), dtype=np.int64)
+        rects[:, :2] = np.rint(coord_sys.coords(take(world._pos)) - radius[:, np.newaxis])
+        rects[:, 2] = rects[:, 3] = 2 * radius
+
+        # The (cached) world-space vertices of all polygons are converted at once
+        polygons: dict[int, list] = {}
+        polygon_indices = np.flatnonzero(~is_ball).tolist()
+        if polygon_indices:
+            shapes = [
+                world.bodies[row].world_shape()[0] for row in rows[polygon_indices].tolist()
+            ]
+            vertices = coord_sys.coords(np.concatenate(shapes))
+            ends = np.cumsum([len(shape) for shape in shapes])
+            for k, shape_vertices in zip(polygon_indices, np.split(vertices, ends[:-1])):
+                polygons[k] = shape_vertices.tolist()
+                low = np.floor(shape_vertices.min(axis=0))
+                high = np.ceil(shape_vertices.max(axis=0)) + 1
+                rects[k] = (*low, *(high - low))
+
+        width, height = screen.get_size()
+        visible = (
+            (rects[:, 2] > 0)
+            & (rects[:, 0] < width)
+            & (rects[:, 1] < height)
+            & (rects[:, 0] + rects[:, 2] > 0)
+            & (rects[:, 1] + rects[:, 3] > 0)
+        )
+        return _Layout(
+            world, positions, rows, is_ball, rects, visible, take(world._col), polygons
+        )
+
+    def _draw(self, screen: pygame.Surface, layout: _Layout, selected: np.ndarray) -> None:
+        """Draw the selected bodies of a layout, the balls with one Surface.blits() call"""
+        balls = np.flatnonzero(selected & layout.is_ball)
+        if len(balls):
+            radius = layout.rects[balls, 2] // 2
+            col = layout.col[balls]
+
+            # Look every (radius, color) combination up only once
+            keys = (radius << 32) | col.view(np.uint32)[:, 0]
+            unique_keys, first, inverse, counts = np.unique(
+                keys, return_index=True, return_inverse=True, return_counts=True
+            )
+            sprites = np.empty(len(unique_keys), dtype=object)
+            for k, (index, count) in enumerate(zip(first.tolist(), counts.tolist())):
+                key = (int(radius[index]), tuple(col[index].tolist()))
+                if key in self._sprites:
+                    self.hits += count
+                else:
+                    self.misses += 1
+                    self.hits += count - 1
+                sprites[k] = self._sprite(*key)
+
+            screen.blits(
+                list(zip(sprites[inverse].tolist(), layout.rects[balls, :2].tolist())),
+                doreturn=False,
+            )
+
+        for k, vertices in layout.polygons.items():
+            if selected[k]:
+                pygame.draw.polygon(screen, tuple(layout.col[k].tolist()), vertices)
+
+    def draw(
+        self,
+        screen: pygame.Surface,
+        bodies: Sequence[_Body] | World,
+        index: Optional[SpatialIndex] = None,
+    ) -> None:
+        """
+        Draw every body that is on the pygame screen. All bodies are drawn in the
+        coordinate system of the first one.
+
+        Args:
+            screen (pygame.Surface): The screen to draw on
+            bodies (Sequence[_Body]): The bodies, e.g. a World
+            index (Optional[SpatialIndex]): (optional) A broadphase of the same bodies,
+                used to find the balls in the visible part of the coordinate system.
+                Only these balls are laid out, which pays off for large worlds that
+                are mostly off the screen.
+        """
+        if not len(bodies):
+            return
+        layout = self._layout(screen, bodies, index)
+        self._draw(screen, layout, layout.visible)
+
+    @staticmethod
+    def _fill(
+        screen: pygame.Surface,
+        background: Union[pygame.Surface, pygame.Color, str, tuple],
+        rect: pygame.Rect,
+    ) -> None:
+        if isinstance(background, pygame.Surface):
+            screen.blit(background, rect, rect)
+        else:
+            screen.fill(background, rect)
+
+    def _redraw(
+        self,
+        screen: pygame.Surface,
+        layout: _Layout,
+        background: Union[pygame.Surface, pygame.Color, str, tuple],
+    ) -> list[pygame.Rect]:
+        """Draw the whole screen again"""
+        self._fill(screen, background, screen.get_rect())
+        self._draw(screen, layout, layout.visible)
+        return [screen.get_rect()]
+
+    def _dirty_tiles(self, size: tuple[int, int], rects: np.ndarray) -> np.ndarray:
+        """Mark every tile that one of the rectangles (on the screen) touches"""
+        width, height = size
+        columns, rows = -(-width // self.tile_size), -(-height // self.tile_size)
+        x0 = np.clip(rects[:, 0], 0, width - 1) // self.tile_size
+        y0 = np.clip(rects[:, 1], 0, height - 1) // self.tile_size
+        x1 = np.clip(rects[:, 0] + rects[:, 2] - 1, 0, width - 1) // self.tile_size
+        y1 = np.clip(rects[:, 1] + rects[:, 3] - 1, 0, height - 1) // self.tile_size
+
+        # Mark the corners of every rectangle, the prefix sums fill them in
+        marks = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+        np.add.at(marks, (y0, x0), 1)
+        np.add.at(marks, (y0, x1 + 1), -1)
+        np.add.at(marks, (y1 + 1, x0), -1)
+        np.add.at(marks, (y1 + 1, x1 + 1), 1)
+        return marks.cumsum(axis=0).cumsum(axis=1)[:rows, :columns] > 0
+
+    def _regions(self, tiles: np.ndarray, screen_rect: pygame.Rect) -> list[pygame.Rect]:
+        """Merge the marked tiles into rectangles: runs of tiles, stacked over several rows"""
+        size = self.tile_size
+        regions = []
+        open_runs: dict[tuple[int, int], int] = {}  # (first, end) column -> first row
+
+        def close(run: tuple[int, int], first_row: int, end_row: int) -> None:
+            rect = pygame.Rect(
+                run[0] * size,
+                first_row * size,
+                (run[1] - run[0]) * size,
+                (end_row - first_row) * size,
+            )
+            regions.append(rect.clip(screen_rect))
+
+        for row, marked in enumerate(tiles):
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], marked, [0])).astype(np.int8)))
+            runs = set(zip(edges[::2].tolist(), edges[1::2].tolist()))
+            for run in [run for run in open_runs if run not in runs]:
+                close(run, open_runs.pop(run), row)
+            for run in runs:
+                open_runs.setdefault(run, row)
+        for run, first_row in open_runs.items():
+            close(run, first_row, len(tiles))
+        return regions
+
+    def draw_dirty(
+        self,
+        screen: pygame.Surface,
+        bodies: Sequence[_Body] | World,
+        background: Union[pygame.Surface, pygame.Color, str, tuple],
+        index: Optional[SpatialIndex] = None,
+    ) -> list[pygame.Rect]:
+        """
+        Only draw the regions of the screen where bodies moved, appeared or disappeared
+        since the last call: they are filled with the background and every body in them is
+        drawn again. The screen must not be changed in between, so the background
+        (including e.g. borders) is drawn by this method as well.
+
+        Args:
+            screen (pygame.Surface): The screen to draw on
+            bodies (Sequence[_Body]): The bodies, e.g. a World
+            background (pygame.Surface | ColorValue): A surface of the size of the
+                screen, or a color
+            index (Optional[SpatialIndex]): (optional) A broadphase of the same bodies,
+                used to find the balls in the visible part of the coordinate system
+
+        Returns:
+            list[pygame.Rect]: The regions that changed, for pygame.display.update()
+        """
+        if not len(bodies):
+            self._last = None
+            self._fill(screen, background, screen.get_rect())
+            return [screen.get_rect()]
+
+        layout = self._layout(screen, bodies, index)
+        n = len(bodies)
+        rects = np.zeros((n, 4), dtype=np.int64)
+        rects[layout.positions] = layout.rects
+        visible = np.zeros(n, dtype=bool)
+        visible[layout.positions] = layout.visible
+        col = np.zeros((n, 4), dtype=np.uint8)
+        col[layout.positions] = layout.col
+        polygons = {int(layout.positions[k]): vertices for k, vertices in layout.polygons.items()}
+
+        key = (
+            id(screen),
+            screen.get_size(),
+            id(bodies),
+            n,
+            id(layout.world),
+            layout.world._version,
+            background if not isinstance(background, pygame.Surface) else id(background),
+        )
+        last = self._last
+        self._last = (key, rects, visible, col, polygons)
+        if last is None or last[0] != key:
+            return self._redraw(screen, layout, background)
+
+        _, last_rects, last_visible, last_col, last_polygons = last
+        moved = (rects != last_rects).any(axis=1) | (col != last_col).any(axis=1)
+        moved |= visible != last_visible
+        for k, vertices in polygons.items():
+            if last_polygons.get(k) != vertices:
+                moved[k] = True
+        changed = np.vstack((last_rects[moved & last_visible], rects[moved & visible]))
+        if not len(changed):
+            return []
+
+        tiles = self._dirty_tiles(screen.get_size(), changed)
+        if tiles.mean() > self.max_dirty_share:
+            return self._redraw(screen, layout, background)
+
+        regions = self._regions(tiles, screen.get_rect())
+        clip = screen.get_clip()
+        for region in regions:
+            screen.set_clip(region)
+            self._fill(screen, background, region)
+            x, y, w, h = region
+            layout_rects = layout.rects
+            self._draw(
+                screen,
+                layout,
+                layout.visible
+                & (layout_rects[:, 0] < x + w)
+                & (layout_rects[:, 0] + layout_rects[:, 2] > x)
+                & (layout_rects[:, 1] < y + h)
+                & (layout_rects[:, 1] + layout_rects[:, 3] > y),
+            )
+        screen.set_clip(clip)
+        return regions
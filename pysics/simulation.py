@@ -0,0 +1,169 @@
+"""
+Fixed time step simulation, independent of the frame rate of the display.
+
+Every physics step simulates the same amount of time (1 / rate seconds), split into
+substeps. Simulation.advance() runs as many steps as fit into the time that passed since
+the last frame, and Simulation.interpolated() blends the last two steps for drawing, so
+the movement stays smooth when the physics and the display run at different rates.
+Headless runs call Simulation.step() directly and run as fast as the CPU allows.
+
+Example usage:
+    simulation = pysics.Simulation(world, ball_collider, rate=120, substeps=2)
+    while running:
+        simulation.advance(clock.tick(60) / 1000)
+        with simulation.interpolated():
+            renderer.draw(screen, world)
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Iterator, Optional, Protocol
+import numpy as np
+from .world import World
+
+# The broadphase is rebuilt when the version of the World (its set of bodies) changes
+# pylint: disable=protected-access
+
+
+class Collider(Protocol):  # pylint: disable=too-few-public-methods
+    """Anything that resolves the collisions of a World once per step, e.g. BallCollider"""
+
+    def collide(self) -> object: ...
+
+
+class Simulation:
+    """
+    Steps a World (and its collisions) with a fixed time step
+
+    Methods:
+        step: Run a number of fixed steps
+        advance: Run the steps that fit into the time that passed
+        interpolated: Context manager which blends the state of the last two steps
+    """
+
+    def __init__(
+        self,
+        world: World,
+        collider: Optional[Collider] = None,
+        rate: float = 60,
+        substeps: int = 1,
+        wall_collision: bool = True,
+        max_steps: int = 8,
+    ):
+        """
+        Args:
+            world (World): The world that is simulated. The time step of its bodies
+                (Body.dt) is not used, every body moves by the fixed time step.
+            collider (Optional[Collider]): Resolves the collisions before every substep,
+                e.g. a BallCollider. No collisions are calculated if it is omitted.
+            rate (float): The number of steps per simulated second
+            substeps (int): Into how many substeps every step is split. More substeps are
+                more accurate (e.g. for fast bodies), but cost more.
+            wall_collision (bool): Whether the balls bounce off the walls
+            max_steps (int): The maximum number of steps that advance() runs at once. If
+                the physics can't keep up, the rest of the time is dropped (the
+                simulation runs slower than real time instead of falling further behind).
+        """
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+        if substeps < 1:
+            raise ValueError("There must be at least one substep")
+        self.world = world
+        self.collider = collider
+        self.rate = rate
+        self.substeps = substeps
+        self.wall_collision = wall_collision
+        self.max_steps = max_steps
+
+        # The simulated time in seconds
+        self.time = 0.0
+        # Time that passed, but wasn't simulated yet (less than one step)
+        self.accumulator = 0.0
+        # The state before the last step, for the interpolation
+        self._previous: Optional[tuple[int, np.ndarray, np.ndarray]] = None
+
+    def __repr__(self) -> str:
+        return f"< Simulation ({self.rate} steps/s, {self.substeps} substeps, {self.world!r}) >"
+
+    @property
+    def step_seconds(self) -> float:
+        """The simulated time of one step"""
+        return 1 / self.rate
+
+    @property
+    def alpha(self) -> float:
+        """How far the time of the display is between the last and the next step (0 to 1)"""
+        return min(self.accumulator * self.rate, 1.0)
+
+    def step(self, n_steps: int = 1) -> None:
+        """
+        Run a number of fixed steps, as fast as possible (e.g. for headless simulations)
+
+        Args:
+            n_steps (int): The number of steps
+        """
+        world = self.world
+        seconds = self.step_seconds / self.substeps
+        for k in range(n_steps):
+            if k == n_steps - 1:
+                self._previous = (
+                    world._version,
+                    world.pos.copy(),
+                    world.angle.copy(),
+                )
+            for _ in range(self.substeps):
+                if self.collider is not None and len(world):
+                    self.collider.collide()
+                world.step(wall_collision=self.wall_collision, seconds=seconds)
+        self.time += n_steps * self.step_seconds
+
+    def advance(self, seconds: float) -> int:
+        """
+        Run the steps that fit into the time that passed (e.g. since the last frame).
+        The rest of the time is kept for the next call.
+
+        Args:
+            seconds (float): The time that passed, e.g. clock.tick() / 1000
+
+        Returns:
+            int: The number of steps that were run
+        """
+        self.accumulator += seconds
+        n_steps = int(self.accumulator * self.rate)
+        if n_steps > self.max_steps:
+            n_steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= n_steps * self.step_seconds
+        if n_steps:
+            self.step(n_steps)
+        return n_steps
+
+    @contextmanager
+    def interpolated(self) -> Iterator[World]:
+        """
+        Temporarily move every body to where it is at the time of the display, between
+        the last two steps (see Simulation.alpha), e.g. for drawing. The state of the last
+        step is restored afterwards. Nothing is interpolated before the first step or
+        after bodies were added or removed.
+
+        Returns:
+            Iterator[World]: The world with the interpolated positions and angles
+        """
+        world = self.world
+        previous = self._previous
+        if previous is None or previous[0] != world._version:
+            yield world
+            return
+
+        _, previous_pos, previous_angle = previous
+        pos, angle = world.pos, world.angle
+        current_pos, current_angle = pos.copy(), angle.copy()
+        alpha = self.alpha
+        pos += (alpha - 1) * (current_pos - previous_pos)
+        angle += (alpha - 1) * (current_angle - previous_angle)
+        try:
+            yield world
+        finally:
+            pos[:] = current_pos
+            angle[:] = current_angle
@@ -0,0 +1,155 @@
+"""
+Sweep and prune broadphase: an alternative to the spacial hash map, which doesn't need
+a grid size and handles bodies of very different sizes or dense clusters well.
+"""
+
+from typing import Iterator, Optional, Sequence
+import numpy as np
+from . import profiling
+from .body import _Body
+from .hash_map import bounding_circle_filter, box_filter
+from .world import World, body_aabbs, body_arrays
+
+
+class SweepAndPrune:
+    """
+    Find candidate pairs by sorting the bounding boxes of all bodies along an axis and
+    sweeping over the sorted intervals. The order of the intervals is kept between frames,
+    as most bodies keep their place in it. Sorting the previous order again with an
+    adaptive (timsort) sort is then close to O(N), just like insertion sort would be.
+
+    Methods:
+        candidate_pairs: The indices of every pair of bodies whose bounding boxes overlap
+        pairs: Iterate over every pair of bodies whose bounding boxes overlap
+        query: The indices of the bodies that overlap a rectangle
+    """
+
+    def __init__(self, bodies: Sequence[_Body] | World, axis: Optional[int] = None):
+        """
+        Args:
+            bodies (Sequence[Body]): The list of every body (or a World)
+            axis (Optional[int]): The axis to sweep along (0 for x, 1 for y). If the
+                argument is omitted, the axis along which the bodies are spread out
+                the most is used, which is checked every frame.
+        """
+        self.bodies = bodies
+        self.axis = axis
+        # The sorted order of the intervals along both axes, from the last frame
+        self._orders: list[Optional[np.ndarray]] = [None, None]
+
+    def _sorted_order(self, axis: int, low: np.ndarray) -> np.ndarray:
+        """Update the order of the interval starts along an axis"""
+        order = self._orders[axis]
+        if order is None or len(order) != len(low):
+            order = np.argsort(low, kind="stable")
+        else:
+            order = order[np.argsort(low[order], kind="stable")]
+        self._orders[axis] = order
+        return order
+
+    @profiling.timed("pairs")
+    def candidate_pairs(
+        self, bodies: Optional[Sequence[_Body] | World] = None, bounding_circle: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every pair of bodies whose bounding boxes overlap along both axes.
+        These are the candidates that the narrow phase has to check for collisions.
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            bounding_circle (bool): Only return pairs whose bounding circles
+                (Body.bounding_box_radius) overlap
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The indices (into bodies) i and j of the bodies
+                of every pair, with i < j, sorted by i and then j
+        """
+        if not bodies:
+            bodies = self.bodies
+        if not len(bodies):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        pos, radius = body_arrays(bodies)
+        pos = np.nan_to_num(pos, nan=0.0)
+        # Bounding squares for balls, the boxes of the rotated vertices for polygons
+        boxes = np.nan_to_num(body_aabbs(bodies), nan=0.0)
+        low, high = boxes[:, :2], boxes[:, 2:]
+
+        axis = self.axis
+        if axis is None:
+            axis = int(np.argmax(pos.max(axis=0) - pos.min(axis=0)))
+        other = 1 - axis
+
+        # Sweep: every interval overlaps the following ones, until one starts after it ends
+        order = self._sorted_order(axis, low[:, axis])
+        sorted_low = low[order, axis]
+        end = np.searchsorted(sorted_low, high[order, axis], side="right")
+        following = end - np.arange(len(order)) - 1
+
+        first = np.repeat(np.arange(len(order)), following)
+        second = (
+            first
+            + 1
+            + np.arange(len(first))
+            - np.repeat(np.cumsum(following) - following, following)
+        )
+        i, j = order[first], order[second]
+
+        # Prune the pairs that don't overlap along the other axis
+        overlapping = (low[i, other] <= high[j, other]) & (low[j, other] <= high[i, other])
+        i, j = i[overlapping], j[overlapping]
+
+        n = len(order)
+        keys = np.sort(np.minimum(i, j).astype(np.int64) * n + np.maximum(i, j))
+        i, j = keys // n, keys % n
+
+        if bounding_circle:
+            i, j = bounding_circle_filter(pos, radius, i, j)
+        profiling.count("candidate_pairs", len(i))
+        return i, j
+
+    def pairs(
+        self, bodies: Optional[Sequence[_Body] | World] = None, bounding_circle: bool = False
+    ) -> Iterator[tuple[_Body, _Body]]:
+        """
+        Iterate over every pair of bodies whose bounding boxes overlap, without duplicates
+
+        Args:
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+            bounding_circle (bool): Only yield pairs whose bounding circles overlap
+
+        Yields:
+            tuple[_Body, _Body]: The two bodies of a pair
+        """
+        if not bodies:
+            bodies = self.bodies
+        i, j = self.candidate_pairs(bodies, bounding_circle)
+        for index1, index2 in zip(i.tolist(), j.tolist()):
+            yield bodies[index1], bodies[index2]
+
+    def query(
+        self,
+        low: Sequence[float],
+        high: Sequence[float],
+        bodies: Optional[Sequence[_Body] | World] = None,
+    ) -> np.ndarray:
+        """
+        Every body whose bounding box overlaps a rectangle, e.g. the part of the world
+        that is visible on the screen
+
+        Args:
+            low (Sequence[float]): The lowest x and y coordinates of the rectangle
+            high (Sequence[float]): The highest x and y coordinates of the rectangle
+            bodies (Sequence[Body]): (optional) The list of every body.
+                If the argument is omitted, the original list of bodies will be used.
+
+        Returns:
+            np.ndarray: The sorted indices (into bodies) of the bodies in the rectangle
+        """
+        if not bodies:
+            bodies = self.bodies
+        if not len(bodies):
+            return np.zeros(0, dtype=np.int64)
+        return box_filter(*body_arrays(bodies), low, high)
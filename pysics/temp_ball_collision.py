@@ -6,23 +6,123 @@ IMPORTANT: The list of bodies may only include balls. If it contains any other b
 the program will crash. This is intentional, as other collisions are not yet implemented.
 """
 
+from concurrent.futures import Executor
+from typing import Optional
 import numpy as np
+from . import profiling
+from .contact_solver import solve_contacts
 from .hash_map import HashMap
+from .sweep_and_prune import SweepAndPrune
+from .aabb_tree import AABBTree
 from .math_core import Vec2D
-from .body import _Body, Ball
+from .body import Ball
+from .world import World
+
+# The ball solvers resolve whole worlds in their arrays
+# pylint: disable=protected-access
+
+
+def resolve_ball_pairs(
+    pos: np.ndarray,
+    vel: np.ndarray,
+    m: np.ndarray,
+    r: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    restitution: float = 1.0,
+) -> np.ndarray:
+    """
+    Calculate the collisions of many pairs of balls at once and apply them to pos and vel
+    (in place). The velocity changes and overlap corrections of all pairs are calculated
+    from the state before the collisions and summed up, so a ball that collides with
+    several other balls gets the response of every collision. Only balls that move towards
+    each other get an impulse, overlapping balls that already move apart are only pushed
+    apart. The summed responses conserve momentum, but not the energy of a ball that hits
+    several balls at the same time (see pysics.contact_solver for that).
+
+    Args:
+        pos (np.ndarray): (N, 2) positions of the balls
+        vel (np.ndarray): (N, 2) velocities of the balls
+        m (np.ndarray): (N,) masses of the balls
+        r (np.ndarray): (N,) radii of the balls
+        first (np.ndarray): Index of the first ball of every candidate pair
+        second (np.ndarray): Index of the second ball of every candidate pair
+        restitution (float): 1 for fully elastic collisions, 0 for fully inelastic ones
+
+    Returns:
+        np.ndarray: Boolean mask of the candidate pairs that are colliding
+    """
+    diff = pos[second] - pos[first]
+    distance = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+    colliding = distance <= r[first] + r[second]
+
+    first, second = first[colliding], second[colliding]
+    diff, distance = diff[colliding], distance[colliding]
+    if len(first) == 0:
+        return colliding
+
+    # Balls at the exact same position are pushed apart along the x-axis
+    normal = np.empty_like(diff)
+    normal[:] = (1.0, 0.0)
+    apart = distance > 0
+    normal[apart] = diff[apart] / distance[apart, np.newaxis]
+
+    # Velocity of the second ball relative to the first one, along the normal
+    relative_normal_vel = np.einsum("ij,ij->i", vel[second] - vel[first], normal)
+    # Balls that already move apart only get separated, their velocity is kept
+    relative_normal_vel = np.minimum(relative_normal_vel, 0)
+    m1, m2 = m[first], m[second]
+    impulse = (1 + restitution) * relative_normal_vel / (m1 + m2)
+
+    # Separate balls to prevent overlap
+    overlap = (r[first] + r[second] - distance) / 2
+
+    n = len(pos)
+    for axis in range(2):
+        vel[:, axis] += np.bincount(
+            first, impulse * m2 * normal[:, axis], minlength=n
+        ) - np.bincount(second, impulse * m1 * normal[:, axis], minlength=n)
+        pos[:, axis] += np.bincount(
+            second, overlap * normal[:, axis], minlength=n
+        ) - np.bincount(first, overlap * normal[:, axis], minlength=n)
+
+    return colliding
 
 
 class BallCollider:
     """
-    Simple, fully elastic ball-to-ball collision
+    Simple ball-to-ball collision, fully elastic by default
 
     Args:
         balls_hasher (HashMap): The HashMap instance which calculates the hash cells for
             all the balls. That HashMap instance may only include Balls in it's bodies attribute.
+            Any other broadphase with a candidate_pairs() method, like SweepAndPrune
+            or AABBTree, can be used as well.
+        restitution (float): 1 for fully elastic collisions (default),
+            0 for fully inelastic ones
+        sequential (bool): Resolve the contacts in conflict-free batches, one after the
+            other (see pysics.contact_solver), so impulses travel through stacks of balls
+            within one step. Otherwise (default) the responses of all contacts are
+            calculated from the state before the collisions and summed up, which loses
+            energy when a ball hits several balls at the same time (e.g. a billiard break).
+        iterations (int): How many times the batches are resolved (only if sequential)
+        executor (Optional[Executor]): A thread pool which resolves large batches in
+            chunks at the same time (only if sequential)
     """
 
-    def __init__(self, balls_hasher: HashMap):
+    def __init__(
+        self,
+        balls_hasher: HashMap | SweepAndPrune | AABBTree,
+        restitution: float = 1.0,
+        sequential: bool = False,
+        iterations: int = 1,
+        executor: Optional[Executor] = None,
+    ):
         self.hasher = balls_hasher
+        self.restitution = restitution
+        self.sequential = sequential
+        self.iterations = iterations
+        self.executor = executor
 
     def calculate_resulting_velocity(
         self, colliding_ball: Ball, secondary_ball: Ball
@@ -91,33 +191,62 @@ class BallCollider:
 
         return colliding_ball.vel, secondary_ball.vel
 
+    def _resolve(
+        self,
+        pos: np.ndarray,
+        vel: np.ndarray,
+        m: np.ndarray,
+        r: np.ndarray,
+        first: np.ndarray,
+        second: np.ndarray,
+    ) -> np.ndarray:
+        """Resolve the candidate pairs with the chosen solver, returns the colliding ones"""
+        if self.sequential:
+            return solve_contacts(
+                pos,
+                vel,
+                m,
+                r,
+                first,
+                second,
+                restitution=self.restitution,
+                iterations=self.iterations,
+                executor=self.executor,
+            )
+        return resolve_ball_pairs(pos, vel, m, r, first, second, self.restitution)
+
+    @profiling.timed("collide")
     def collide(self):
         """
-        Use the above functions to calculate the resulting velocity vector of the balls
-        after the collision.
+        Calculate the collisions of all the balls at once and apply
+        the resulting velocities and overlap corrections.
         """
-        hash_map: dict[tuple[int, int], list[_Body]] = self.hasher.generate_map()
-
-        # Collision response. Key of the dict is the ball and the value is
-        # it's new velocity vector
-        # This is necessary because if I try to change the velocity of the balls
-        # before calculating all the new velocities, some of the velocities will be incorrect
-        collision_response: dict[Ball, Vec2D] = {}
-
-        if not all(
-            isinstance(body, Ball) for cells in hash_map.values() for body in cells
-        ):
+        bodies = self.hasher.bodies
+        if not len(bodies):
+            return
+        world, rows = World.collect(bodies)
+        is_ball = world.is_ball if rows is None else world._is_ball[rows]
+        if not is_ball.all():
             raise TypeError("All bodies must be pysics.body.Ball objects")
 
-        # Calculate the new velocity vectors and add them to the collision_response dict
-        for cell in hash_map.values():
-            balls: list[Ball] = [body for body in cell if isinstance(body, Ball)]
-            for i, ball1 in enumerate(balls):
-                for ball2 in balls[i + 1 :]:
-                    new_vel1, new_vel2 = self.calculate_resulting_velocity(ball1, ball2)
-                    collision_response[ball1] = new_vel1
-                    collision_response[ball2] = new_vel2
-
-        # Perform the collision responses, by iterating over the collision_response dict
-        for ball, res_vel in collision_response.items():
-            ball.vel = res_vel
+        # Every pair of balls is only checked once, no matter how many cells they share.
+        # The bounding circles of balls are the balls themselves, so only
+        # colliding pairs are returned.
+        first, second = self.hasher.candidate_pairs(bounding_circle=True)
+        # Pairs of sleeping balls are skipped, sleeping balls that are touched wake up
+        first, second = world.awake_pairs(rows, first, second)
+
+        if rows is None:
+            colliding = self._resolve(
+                world.pos, world.vel, world.m, world.radius, first, second
+            )
+            world.add_contacts(first[colliding], second[colliding])
+        else:
+            pos, vel = world._pos[rows], world._vel[rows]
+            colliding = self._resolve(
+                pos, vel, world._m[rows], world._radius[rows], first, second
+            )
+            world._pos[rows] = pos
+            world._vel[rows] = vel
+            world.add_contacts(rows[first[colliding]], rows[second[colliding]])
+        profiling.count("collisions", int(np.count_nonzero(colliding)))
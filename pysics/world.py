@@ -0,0 +1,635 @@
+"""
+Contiguous storage for the state of many bodies (structure of arrays)
+"""
+
+from __future__ import annotations
+import operator
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence, Union
+import numpy as np
+from . import ccd, profiling
+from .coordinate_system import CoordSys
+
+if TYPE_CHECKING:
+    from .body import _Body
+
+# The World hands out its rows to the bodies (_Body._index, _Body._world)
+# pylint: disable=protected-access
+
+# How many lists of bodies every World remembers the rows of (see World.collect)
+_COLLECTED_LISTS = 8
+
+
+class World:
+    """
+    Stores position, velocity, acceleration, mass, radius, time step, color and
+    orientation (angle, rotational velocity and acceleration) of every body in one
+    NumPy array per attribute. Bodies (Ball, Polygon) are only
+    lightweight handles into these arrays, so whole-world operations can be run as
+    single array operations on e.g. World.pos or World.vel.
+
+    A World can be used like a list of bodies, e.g. it can be passed to a HashMap.
+
+    Bodies that barely move for a while can go to sleep (if a sleep threshold is set):
+    they are not integrated and the collisions between sleeping bodies are skipped. Bodies
+    that touch each other fall asleep together, as an island, once all of them are slow
+    enough, and the whole island wakes up as soon as one of its bodies is touched or gets
+    a velocity.
+
+    Methods:
+        add: Move bodies (and their current state) into this world
+        remove: Remove a body from this world, keeping its state
+        step: Update the position of every body at once
+        wake: Wake up the islands of sleeping bodies
+    """
+
+    def __init__(
+        self,
+        coord_sys: CoordSys,
+        capacity: int = 64,
+        sleep_threshold: Optional[float] = None,
+        sleep_steps: int = 60,
+    ):
+        """
+        Args:
+            coord_sys (CoordSys): The coordinate system that the bodies are in
+            capacity (int): How many bodies fit into the world before the arrays
+                have to be reallocated. The world grows automatically.
+            sleep_threshold (Optional[float]): Bodies whose speed (including the speed of
+                their rotation at the bounding box radius) stays below this threshold
+                fall asleep. Bodies never sleep if the argument is omitted.
+            sleep_steps (int): For how many steps a body has to stay below the
+                threshold before it falls asleep
+        """
+        self.coord_sys = coord_sys
+        self.sleep_threshold = sleep_threshold
+        self.sleep_steps = sleep_steps
+        self.bodies: list[_Body] = []
+        # True for the one-body worlds of bodies that were created without a world
+        self._private = False
+        # Changes whenever bodies are added or removed (or move to another row)
+        self._version = 0
+        # Changes whenever bodies fall asleep or wake up
+        self._sleep_version = 0
+        self._awake: tuple[tuple[int, int], Union[np.ndarray, slice]] = ((-1, -1), slice(None))
+        # The contacts of the current step as pairs of rows (see World.add_contacts)
+        self._contacts: list[tuple[np.ndarray, np.ndarray]] = []
+        self._next_island = 0
+        # id(list) -> (the bodies of the list, _version, their rows), see World.collect
+        self._collected: dict[int, tuple[tuple[_Body, ...], int, np.ndarray]] = {}
+
+        capacity = max(capacity, 1)
+        self._pos = np.zeros((capacity, 2))
+        self._vel = np.zeros((capacity, 2))
+        self._accel = np.zeros((capacity, 2))
+        self._m = np.ones(capacity)
+        self._radius = np.zeros(capacity)
+        self._dt = np.ones(capacity)
+        self._col = np.full((capacity, 4), 255, dtype=np.uint8)
+        self._is_ball = np.zeros(capacity, dtype=bool)
+        self._angle = np.zeros(capacity)
+        self._rot_vel = np.zeros(capacity)
+        self._rot_accel = np.zeros(capacity)
+        self._ccd = np.zeros(capacity, dtype=bool)
+        self._asleep = np.zeros(capacity, dtype=bool)
+        self._sleep_timer = np.zeros(capacity, dtype=np.int64)  # steps below the threshold
+        self._island = np.full(capacity, -1, dtype=np.int64)  # -1 while awake
+
+    def __repr__(self) -> str:
+        return f"< World ({len(self.bodies)} bodies, {self.coord_sys!r}) >"
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    def __iter__(self) -> Iterator[_Body]:
+        return iter(self.bodies)
+
+    def __getitem__(self, index: int) -> _Body:
+        return self.bodies[index]
+
+    def __contains__(self, body: object) -> bool:
+        return getattr(body, "_world", None) is self
+
+    @property
+    def capacity(self) -> int:
+        """How many bodies fit into the currently allocated arrays"""
+        return self._pos.shape[0]
+
+    # Views of the used part of the storage. Writing to them changes the bodies.
+    @property
+    def pos(self) -> np.ndarray:
+        """(N, 2) array of all positions"""
+        return self._pos[: len(self.bodies)]
+
+    @property
+    def vel(self) -> np.ndarray:
+        """(N, 2) array of all velocities"""
+        return self._vel[: len(self.bodies)]
+
+    @property
+    def accel(self) -> np.ndarray:
+        """(N, 2) array of all accelerations"""
+        return self._accel[: len(self.bodies)]
+
+    @property
+    def m(self) -> np.ndarray:
+        """(N,) array of all masses"""
+        return self._m[: len(self.bodies)]
+
+    @property
+    def radius(self) -> np.ndarray:
+        """(N,) array of all bounding box radii (the radius for balls)"""
+        return self._radius[: len(self.bodies)]
+
+    @property
+    def dt(self) -> np.ndarray:
+        """(N,) array of all time steps"""
+        return self._dt[: len(self.bodies)]
+
+    @property
+    def col(self) -> np.ndarray:
+        """(N, 4) array of all RGBA colors"""
+        return self._col[: len(self.bodies)]
+
+    @property
+    def is_ball(self) -> np.ndarray:
+        """(N,) boolean array, True where the body is a Ball"""
+        return self._is_ball[: len(self.bodies)]
+
+    @property
+    def angle(self) -> np.ndarray:
+        """(N,) array of all orientations, in radians"""
+        return self._angle[: len(self.bodies)]
+
+    @property
+    def rotational_vel(self) -> np.ndarray:
+        """(N,) array of all rotational velocities"""
+        return self._rot_vel[: len(self.bodies)]
+
+    @property
+    def rotational_accel(self) -> np.ndarray:
+        """(N,) array of all rotational accelerations"""
+        return self._rot_accel[: len(self.bodies)]
+
+    @property
+    def ccd(self) -> np.ndarray:
+        """(N,) boolean array, True where the path of the ball is swept (see pysics.ccd)"""
+        return self._ccd[: len(self.bodies)]
+
+    @property
+    def asleep(self) -> np.ndarray:
+        """(N,) boolean array, True where the body is asleep"""
+        return self._asleep[: len(self.bodies)]
+
+    def _arrays(self) -> tuple[np.ndarray, ...]:
+        return (
+            self._pos,
+            self._vel,
+            self._accel,
+            self._m,
+            self._radius,
+            self._dt,
+            self._col,
+            self._is_ball,
+            self._angle,
+            self._rot_vel,
+            self._rot_accel,
+            self._ccd,
+            self._asleep,
+            self._sleep_timer,
+            self._island,
+        )
+
+    def _grow(self) -> None:
+        """Double the capacity of every array"""
+        n = len(self.bodies)
+        new_capacity = 2 * self.capacity
+        for name, array in zip(
+            (
+                "_pos",
+                "_vel",
+                "_accel",
+                "_m",
+                "_radius",
+                "_dt",
+                "_col",
+                "_is_ball",
+                "_angle",
+                "_rot_vel",
+                "_rot_accel",
+                "_ccd",
+                "_asleep",
+                "_sleep_timer",
+                "_island",
+            ),
+            self._arrays(),
+        ):
+            grown = np.empty((new_capacity, *array.shape[1:]), dtype=array.dtype)
+            grown[:n] = array[:n]
+            setattr(self, name, grown)
+
+    def _append(self, body: _Body, row: tuple) -> int:
+        """
+        Add a body to the end of the storage
+
+        Args:
+            body (_Body): The body handle, which will point to the new row
+            row (tuple): One value per array, in the order of World._arrays()
+
+        Returns:
+            int: The index of the new row
+        """
+        index = len(self.bodies)
+        if index == self.capacity:
+            self._grow()
+        for array, value in zip(self._arrays(), row):
+            array[index] = value
+        self.bodies.append(body)
+        body._world = self
+        body._index = index
+        self._version += 1
+        return index
+
+    def _row(self, index: int) -> tuple:
+        return tuple(array[index].copy() for array in self._arrays())
+
+    def _pop(self, index: int) -> None:
+        """
+        Remove a row by moving the last row into its place (O(1)).
+        The body handle of the removed row is not touched.
+        """
+        last = len(self.bodies) - 1
+        if index != last:
+            for array in self._arrays():
+                array[index] = array[last]
+            moved = self.bodies[last]
+            self.bodies[index] = moved
+            moved._index = index
+        self.bodies.pop()
+        self._version += 1
+
+    def add(self, *bodies: _Body) -> None:
+        """
+        Move bodies into this world. Their current state is copied over and they
+        are removed from the world they were in before.
+
+        Args:
+            *bodies (_Body): The bodies to add
+        """
+        for body in bodies:
+            if body._world is self:
+                continue
+            old_world, old_index = body._world, body._index
+            index = self._append(body, old_world._row(old_index))
+            old_world._pop(old_index)
+            # The islands of the old world mean nothing here
+            self._asleep[index] = False
+            self._sleep_timer[index] = 0
+            self._island[index] = -1
+
+    def remove(self, body: _Body) -> None:
+        """
+        Remove a body from this world. The body keeps its state and
+        can still be used on its own (or added to another world).
+
+        Args:
+            body (_Body): The body to remove
+        """
+        if body._world is not self:
+            raise ValueError(f"{body} is not part of {self}")
+        private_world = World(body.coord_sys, capacity=1)
+        private_world._private = True
+        private_world.add(body)
+
+    @staticmethod
+    def collect(bodies: Sequence[_Body] | World) -> tuple[World, Optional[np.ndarray]]:
+        """
+        Find the World that stores all the given bodies, so they can be processed
+        with array operations.
+
+        Bodies which were created without a world (each of them is alone in a private
+        World) are moved into the World of the other bodies, or into a new World if none
+        of them has one. They stay there afterwards: Body._world and Body._index change,
+        their state is kept.
+
+        The rows of a list are cached by the World, so collecting the same list again
+        (e.g. once per frame) only compares its bodies with the cached ones (without a
+        Python loop). The rows are calculated again whenever bodies were added to or
+        removed from the World, or the list doesn't hold the same bodies in the same
+        order anymore.
+
+        Args:
+            bodies (Sequence[_Body]): A World or a (non-empty) list of bodies
+
+        Returns:
+            tuple[World, Optional[np.ndarray]]: The World and the row of every body
+                in it (None if bodies is the World itself)
+        """
+        if isinstance(bodies, World):
+            return bodies, None
+        if not bodies:
+            raise ValueError("No bodies to collect")
+
+        world = bodies[0]._world
+        cached = world._collected.get(id(bodies))
+        if (
+            cached is not None
+            and cached[1] == world._version
+            and len(cached[0]) == len(bodies)
+            and all(map(operator.is_, cached[0], bodies))
+        ):
+            return world, cached[2]
+
+        if any(body._world is not world for body in bodies):
+            shared = [body._world for body in bodies if not body._world._private]
+            if any(other is not shared[0] for other in shared):
+                raise ValueError("The bodies belong to different worlds")
+            world = shared[0] if shared else World(bodies[0].coord_sys, len(bodies))
+            world.add(*bodies)
+
+        rows = np.fromiter((body._index for body in bodies), dtype=np.intp, count=len(bodies))
+        rows.flags.writeable = False  # shared by every caller until the cache is dropped
+        if len(world._collected) >= _COLLECTED_LISTS:
+            del world._collected[next(iter(world._collected))]
+        world._collected[id(bodies)] = (tuple(bodies), world._version, rows)
+        return world, rows
+
+    @profiling.timed("integrate")
+    def step(
+        self,
+        wall_collision: bool = True,
+        reference: bool = False,
+        seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Update the position and orientation of every body with a few array operations,
+        using the semi-implicit Euler (Euler-Chromer) method: the velocity is updated first
+        and the new velocity is used to update the position. Balls bounce off the walls of
+        the World's coordinate system. The paths of balls with Ball.ccd set are swept,
+        so they collide with other balls and the walls at the right time within the step.
+        Sleeping bodies are skipped.
+
+        Args:
+            wall_collision (bool): Whether collision with the walls should
+                be performed or not.
+            reference (bool): Update the position first and the velocity second, exactly
+                like calling update_pos() on every body does. The results are identical
+                (bit for bit) to the per-body method.
+            seconds (Optional[float]): The simulated time of the step, the same for every
+                body (see pysics.Simulation). If the argument is omitted, every body is
+                moved by one of its frames (1 / Body.dt seconds).
+        """
+        self._wake_moved()
+        rows = self._awake_rows()
+        pos, vel, accel = self._pos[rows], self._vel[rows], self._accel[rows]
+        angle, rot_vel, rot_accel = self._angle[rows], self._rot_vel[rows], self._rot_accel[rows]
+        if seconds is None:
+            dt = self._dt[rows, np.newaxis]
+        else:
+            dt = np.full((len(pos), 1), 1 / seconds)
+
+        if reference:
+            self._move(rows, pos, vel, dt[:, 0], seconds, wall_collision)
+            vel += accel * 50 / dt
+            angle += rot_vel * 50 / dt[:, 0]
+            rot_vel += rot_accel * 50 / dt[:, 0]
+        else:
+            vel += accel * 50 / dt
+            self._move(rows, pos, vel, dt[:, 0], seconds, wall_collision)
+            rot_vel += rot_accel * 50 / dt[:, 0]
+            angle += rot_vel * 50 / dt[:, 0]
+
+        if wall_collision:
+            r = self._radius[rows]
+            is_ball = self._is_ball[rows]
+            for axis, length in enumerate((self.coord_sys.x_tot, self.coord_sys.y_tot)):
+                outside = (pos[:, axis] - r < 0) | (pos[:, axis] + r > length)
+                vel[outside & is_ball, axis] *= -1
+
+        if isinstance(rows, np.ndarray):
+            # The awake bodies were copied out of the arrays
+            self._pos[rows], self._vel[rows] = pos, vel
+            self._angle[rows], self._rot_vel[rows] = angle, rot_vel
+        if self.sleep_threshold is not None:
+            self._fall_asleep(rows, vel, rot_vel)
+        self._contacts = []
+        profiling.count("awake_bodies", len(pos))
+
+    def _move(
+        self,
+        rows: Union[np.ndarray, slice],
+        pos: np.ndarray,
+        vel: np.ndarray,
+        dt: np.ndarray,
+        seconds: Optional[float],
+        wall_collision: bool,
+    ) -> None:
+        """Move the awake bodies by their velocity, sweeping the paths of the CCD balls"""
+        swept = self._ccd[rows]
+        if not swept.any():
+            pos += vel * 50 / dt[:, np.newaxis]
+            return
+
+        bounds = (self.coord_sys.x_tot, self.coord_sys.y_tot) if wall_collision else None
+        n = len(self.bodies)
+        if isinstance(rows, slice):
+            ccd.sweep(
+                pos, vel, dt, self._m[rows], self._radius[rows], self._is_ball[rows], swept, bounds
+            )
+            return
+
+        # Sleeping balls are obstacles for the swept balls, so every body is swept.
+        # They don't move (their velocity is zero) until they are hit, and the bodies
+        # that were hit wake up in the next step.
+        self._pos[rows], self._vel[rows] = pos, vel
+        all_dt = self._dt[:n].copy() if seconds is None else np.full(n, 1 / seconds)
+        all_dt[rows] = dt
+        ccd.sweep(
+            self._pos[:n],
+            self._vel[:n],
+            all_dt,
+            self._m[:n],
+            self._radius[:n],
+            self._is_ball[:n],
+            self._ccd[:n] & ~self._asleep[:n],
+            bounds,
+        )
+        pos[:], vel[:] = self._pos[rows], self._vel[rows]
+
+    def _awake_rows(self) -> Union[np.ndarray, slice]:
+        """The rows of the awake bodies, a slice of every row while no body sleeps"""
+        key = (self._version, self._sleep_version)
+        if self._awake[0] != key:
+            n = len(self.bodies)
+            asleep = self._asleep[:n]
+            rows: Union[np.ndarray, slice] = (
+                np.flatnonzero(~asleep) if asleep.any() else slice(None, n)
+            )
+            self._awake = (key, rows)
+        return self._awake[1]
+
+    def _wake_moved(self) -> None:
+        """Wake up the islands of sleeping bodies that got a velocity (e.g. from a CCD ball)"""
+        if isinstance(self._awake_rows(), slice):
+            return
+        n = len(self.bodies)
+        vel = self._vel[:n]
+        moved = self._asleep[:n] & ((vel[:, 0] != 0) | (vel[:, 1] != 0) | (self._rot_vel[:n] != 0))
+        if moved.any():
+            self.wake(np.flatnonzero(moved))
+
+    def _fall_asleep(
+        self, rows: Union[np.ndarray, slice], vel: np.ndarray, rot_vel: np.ndarray
+    ) -> None:
+        """Count the steps the awake bodies were slow for and put the quiet islands to sleep"""
+        assert self.sleep_threshold is not None
+        speed = np.hypot(vel[:, 0], vel[:, 1]) + np.abs(rot_vel) * self._radius[rows]
+        timer = np.where(speed <= self.sleep_threshold, self._sleep_timer[rows] + 1, 0)
+        self._sleep_timer[rows] = timer
+        ready = timer >= self.sleep_steps
+        if not ready.any():
+            return
+
+        # An island only falls asleep if all of its bodies are ready to. The islands are
+        # only built from the awake bodies and their contacts with each other.
+        awake = np.arange(len(self.bodies))[rows]
+        if self._contacts:
+            first, second = (np.concatenate(pairs) for pairs in zip(*self._contacts))
+            local1 = np.minimum(np.searchsorted(awake, first), len(awake) - 1)
+            local2 = np.minimum(np.searchsorted(awake, second), len(awake) - 1)
+            valid = (awake[local1] == first) & (awake[local2] == second)
+            labels = islands(len(awake), local1[valid], local2[valid])
+        else:
+            labels = np.arange(len(awake))
+        blocked = np.zeros(len(awake), dtype=bool)
+        blocked[labels[~ready]] = True
+        sleeping = np.flatnonzero(ready & ~blocked[labels])
+        if not len(sleeping):
+            return
+
+        sleepers = awake[sleeping]
+        self._asleep[sleepers] = True
+        self._vel[sleepers] = 0
+        self._rot_vel[sleepers] = 0
+        self._island[sleepers] = self._next_island + labels[sleeping]
+        self._next_island += len(awake)
+        self._sleep_version += 1
+
+    def wake(self, rows: Union[Sequence[int], np.ndarray]) -> None:
+        """
+        Wake up sleeping bodies and every body of their islands
+
+        Args:
+            rows (Union[Sequence[int], np.ndarray]): The rows of the bodies (Body._index)
+        """
+        n = len(self.bodies)
+        island = self._island[:n]
+        woken = self._asleep[:n] & np.isin(island, island[np.asarray(rows, dtype=np.intp)])
+        if not woken.any():
+            return
+        self._asleep[:n][woken] = False
+        self._sleep_timer[:n][woken] = 0
+        island[woken] = -1
+        self._sleep_version += 1
+
+    def add_contacts(self, first: np.ndarray, second: np.ndarray) -> None:
+        """
+        Tell the world which bodies touch each other in the current step (colliders call
+        this), so bodies that touch fall asleep together. Only needed if bodies can sleep.
+
+        Args:
+            first (np.ndarray): The rows of the first body of every contact
+            second (np.ndarray): The rows of the second body of every contact
+        """
+        if self.sleep_threshold is not None and len(first):
+            self._contacts.append((np.asarray(first), np.asarray(second)))
+
+    def awake_pairs(
+        self, rows: Optional[np.ndarray], first: np.ndarray, second: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Remove the candidate pairs whose bodies are both asleep (they don't have to be
+        tested) and wake up the sleeping bodies that might be touched by an awake one
+
+        Args:
+            rows (Optional[np.ndarray]): The row of every body that the pairs index into
+                (None if they index into the whole world, see World.collect)
+            first (np.ndarray): The index of the first body of every candidate pair
+            second (np.ndarray): The index of the second body of every candidate pair
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The pairs with at least one awake body
+        """
+        if isinstance(self._awake_rows(), slice):
+            return first, second
+        asleep = self.asleep if rows is None else self._asleep[rows]
+        asleep1, asleep2 = asleep[first], asleep[second]
+        touched = asleep1 != asleep2
+        if touched.any():
+            sleeping = np.where(asleep1[touched], first[touched], second[touched])
+            self.wake(sleeping if rows is None else rows[sleeping])
+        keep = ~(asleep1 & asleep2)
+        return first[keep], second[keep]
+
+
+def islands(n: int, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Group bodies that touch each other (directly or through other bodies) into islands,
+    the connected components of the contact graph
+
+    Args:
+        n (int): The number of bodies
+        first (np.ndarray): The first body of every contact
+        second (np.ndarray): The second body of every contact
+
+    Returns:
+        np.ndarray: (n,) the island of every body, the lowest index of its bodies
+    """
+    labels = np.arange(n)
+    while len(first):
+        # Every body takes the lowest label of its contacts, then the labels of the
+        # labels are followed (pointer jumping) until they don't change anymore
+        lowest = np.minimum(labels[first], labels[second])
+        new = labels.copy()
+        np.minimum.at(new, first, lowest)
+        np.minimum.at(new, second, lowest)
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    return labels
+
+
+def body_arrays(bodies: Sequence[_Body] | World) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The positions and bounding box radii of the bodies, in the order of bodies
+
+    Args:
+        bodies (Sequence[_Body]): A World or a (non-empty) list of bodies
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (N, 2) positions and (N,) bounding box radii
+    """
+    world, rows = World.collect(bodies)
+    if rows is None:
+        return world.pos, world.radius
+    return world._pos[rows], world._radius[rows]
+
+
+def body_aabbs(bodies: Sequence[_Body] | World) -> np.ndarray:
+    """
+    The axis aligned bounding boxes of the bodies, in the order of bodies: the bounding
+    squares of balls and the exact boxes of polygons (see Polygon.world_shape)
+
+    Args:
+        bodies (Sequence[_Body]): A World or a (non-empty) list of bodies
+
+    Returns:
+        np.ndarray: (N, 4) array of low x, low y, high x and high y
+    """
+    world, rows = World.collect(bodies)
+    pos, radius = body_arrays(bodies)
+    is_ball = world.is_ball if rows is None else world._is_ball[rows]
+    aabb = np.hstack((pos - radius[:, np.newaxis], pos + radius[:, np.newaxis]))
+    for k in np.flatnonzero(~is_ball).tolist():
+        aabb[k] = bodies[k].aabb()
+    return aabb